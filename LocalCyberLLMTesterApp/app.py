@@ -9,9 +9,12 @@ import sqlite3
 import json
 import time
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any
+import hashlib
 import os
 import sys
+import threading
+import uuid
 
 # Add the utils directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
@@ -19,6 +22,27 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 from database_manager import DatabaseManager
 from ollama_client import OllamaClient
 from prompt_templates import PromptTemplates
+from health_monitor import get_health_monitor
+from model_pull import get_pull_manager
+from backend_pool import STRATEGIES, get_backend_pool, parse_backend_specs
+from context_builder import ContextBuilder, llm_summarizer
+from model_residency import get_residency_manager
+from embeddings import create_embedder
+from semantic_cache import DEFAULT_THRESHOLD, get_semantic_cache
+from vector_index import get_conversation_index
+from metrics import get_registry, start_exporters_from_env
+from tracing import get_tracer
+from log_setup import configure_logging
+from structured_output import IncrementalJSONParser, get_schema, records_key, schema_instructions, schema_name_for_use_case
+from alert_triage import DEFAULT_BATCH_TOKENS, DEFAULT_TRIAGE_DIR, DEFAULT_WORKERS, PRIORITIES, USE_CASE_KEY, TriageJob
+from log_summarizer import DEFAULT_CHUNK_TOKENS, DEFAULT_SUMMARY_DIR, LogSummarizer, render_markdown
+from log_summarizer import DEFAULT_WORKERS as DEFAULT_SUMMARY_WORKERS, USE_CASE_KEY as SUMMARY_USE_CASE_KEY
+from yara_validator import DEFAULT_CORPUS_DIR, YaraValidator, extract_rules
+from file_ingest import ATTACHMENT_BUDGET_RATIO, DEFAULT_INGEST_DIR, attachment_prompt, ingest_file
+from yara_validator import DEFAULT_WORKERS as DEFAULT_YARA_WORKERS, USE_CASE_KEY as YARA_USE_CASE_KEY
+
+# Logging goes through a background queue so request handling never waits on log I/O
+configure_logging()
 
 # Page configuration
 st.set_page_config(
@@ -76,12 +100,27 @@ st.markdown("""
 
 class TrendCybertronApp:
     def __init__(self):
-        self.db_manager = DatabaseManager()
+        self.conversation_index = get_conversation_index()
+        self.db_manager = DatabaseManager(vector_index=self.conversation_index)
+        # Index conversations saved before this process started (runs once, in the background)
+        self.conversation_index.sync_async(self.db_manager)
         self.ollama_client = OllamaClient()
         self.prompt_templates = PromptTemplates()
+        self.health_monitor = get_health_monitor()
+        self.backend_pool = get_backend_pool()
+        self.residency = get_residency_manager()
+        self.pull_manager = get_pull_manager(self.health_monitor)
+        self.ollama_client.semantic_cache = get_semantic_cache()
+        # The pool generates through its own client; without the cache there, pool mode never hits it
+        self.backend_pool.client.semantic_cache = self.ollama_client.semantic_cache
+        # Prometheus endpoint / textfile, when enabled through environment variables
+        start_exporters_from_env()
         
     def initialize_session_state(self):
         """Initialize session state variables"""
+        if 'session_id' not in st.session_state:
+            # Identifies this browser session for fair queueing across analysts
+            st.session_state.session_id = uuid.uuid4().hex
         if 'messages' not in st.session_state:
             st.session_state.messages = {}
         if 'current_tab' not in st.session_state:
@@ -97,6 +136,36 @@ class TrendCybertronApp:
             st.session_state.temperature = 0.7
         if 'max_tokens' not in st.session_state:
             st.session_state.max_tokens = 2000
+        if 'context_budget' not in st.session_state:
+            st.session_state.context_budget = 4096
+        if 'summarize_with_model' not in st.session_state:
+            st.session_state.summarize_with_model = False
+        if 'context_state' not in st.session_state:
+            # Per-tab rolling summary of turns that no longer fit the context budget
+            st.session_state.context_state = {}
+        if 'semantic_cache' not in st.session_state:
+            st.session_state.semantic_cache = {
+                'enabled': False,
+                'threshold': DEFAULT_THRESHOLD,
+                'embedder': 'Backend'
+            }
+        if 'backend_pool' not in st.session_state:
+            backends = self.backend_pool.backends()
+            st.session_state.backend_pool = {
+                'enabled': bool(backends),
+                'backends': "\n".join(f"{b.provider}@{b.host}:{b.port}" for b in backends),
+                'strategy': self.backend_pool.strategy,
+                # Per session; TREND_CYBERTRON_HEDGING only sets the starting value
+                'hedging': self.backend_pool.hedging.enabled,
+                'hedge_budget': self.backend_pool.hedging.budget
+            }
+            # The pool already runs this list, so the first render does not reconfigure it
+            st.session_state.backend_pool['applied'] = (st.session_state.backend_pool['backends'],
+                                                        self.backend_pool.strategy)
+        if 'tracing' not in st.session_state:
+            # Per session; TREND_CYBERTRON_TRACE / _PROFILE_RATE only set the starting values
+            tracer = get_tracer()
+            st.session_state.tracing = {'enabled': tracer.enabled, 'profile_rate': tracer.profile_rate}
 
     def render_header(self):
         """Render the main header"""
@@ -125,30 +194,36 @@ class TrendCybertronApp:
                 host = st.text_input("Host", value=st.session_state.ollama_config['host'])
                 port = st.text_input("Port", value=st.session_state.ollama_config['port'])
                 
-                # Model selection
-                try:
-                    models = self.ollama_client.list_models(host, port)
-                    if models:
-                        model_names = [model['name'] for model in models]
-                        # Prefer Trend Cybertron model if available
-                        if 'llama-trendcybertron-primus-merged' in model_names:
-                            default_index = model_names.index('llama-trendcybertron-primus-merged')
-                        else:
-                            default_index = 0
-                        selected_model = st.selectbox(
-                            "Model", 
-                            model_names,
-                            index=default_index
-                        )
+                # Model selection (from the health monitor's cached model list)
+                self.health_monitor.add_endpoint(provider, host, port)
+                status = self.health_monitor.get_status(provider, host, port)
+                model_names = status['models']
+                if model_names:
+                    # Prefer Trend Cybertron model if available
+                    if 'llama-trendcybertron-primus-merged' in model_names:
+                        default_index = model_names.index('llama-trendcybertron-primus-merged')
                     else:
-                        st.warning("⚠️ No models found. Please pull a model first:")
-                        st.code("ollama pull llama3.2:3b")
-                        selected_model = st.text_input(
-                            "Enter model name manually:", 
-                            value="llama3.2:3b"
-                        )
-                except Exception as e:
-                    st.error(f"Error loading models: {e}")
+                        default_index = 0
+                    selected_model = st.selectbox(
+                        "Model", 
+                        model_names,
+                        index=default_index
+                    )
+                elif status['status'] == 'unknown':
+                    st.info("⏳ Checking Ollama connection...")
+                    selected_model = st.text_input(
+                        "Enter model name manually:", 
+                        value=st.session_state.ollama_config['model']
+                    )
+                elif status['status'] == 'healthy':
+                    st.warning("⚠️ No models found. Please pull a model first:")
+                    st.code("ollama pull llama3.2:3b")
+                    selected_model = st.text_input(
+                        "Enter model name manually:", 
+                        value="llama3.2:3b"
+                    )
+                else:
+                    st.error(f"Error loading models: {status['error']}")
                     st.info("Please ensure Ollama is running and try again.")
                     selected_model = st.text_input(
                         "Enter model name manually:", 
@@ -159,24 +234,30 @@ class TrendCybertronApp:
                 host = st.text_input("Host", value="localhost")
                 port = st.text_input("Port", value="1234")
                 
-                # Model selection for LM Studio
-                try:
-                    models = self.ollama_client.list_lmstudio_models(host, port)
-                    if models:
-                        model_names = [model['id'] for model in models]
-                        selected_model = st.selectbox(
-                            "Model", 
-                            model_names,
-                            index=0
-                        )
-                    else:
-                        st.warning("⚠️ No models found. Please load a model in LM Studio first.")
-                        selected_model = st.text_input(
-                            "Enter model name manually:", 
-                            value=""
-                        )
-                except Exception as e:
-                    st.error(f"Error loading models: {e}")
+                # Model selection for LM Studio (from the health monitor's cached model list)
+                self.health_monitor.add_endpoint(provider, host, port)
+                status = self.health_monitor.get_status(provider, host, port)
+                model_names = status['models']
+                if model_names:
+                    selected_model = st.selectbox(
+                        "Model", 
+                        model_names,
+                        index=0
+                    )
+                elif status['status'] == 'unknown':
+                    st.info("⏳ Checking LM Studio connection...")
+                    selected_model = st.text_input(
+                        "Enter model name manually:", 
+                        value=""
+                    )
+                elif status['status'] == 'healthy':
+                    st.warning("⚠️ No models found. Please load a model in LM Studio first.")
+                    selected_model = st.text_input(
+                        "Enter model name manually:", 
+                        value=""
+                    )
+                else:
+                    st.error(f"Error loading models: {status['error']}")
                     st.info("Please ensure LM Studio is running and try again.")
                     selected_model = st.text_input(
                         "Enter model name manually:", 
@@ -211,28 +292,38 @@ class TrendCybertronApp:
                 help="Maximum number of tokens to generate (up to 8000 for longer responses)."
             )
             
-            # Connection test
+            st.session_state.context_budget = st.slider(
+                "Context Budget (tokens)",
+                min_value=1024,
+                max_value=32768,
+                value=st.session_state.context_budget,
+                step=512,
+                help="Maximum prompt size for multi-turn chats. Older turns are summarized to stay within it."
+            )
+            
+            st.session_state.summarize_with_model = st.checkbox(
+                "Summarize older turns with the model",
+                value=st.session_state.summarize_with_model,
+                help="Use the model for rolling summaries instead of a fast extractive summary (adds a model call when turns are dropped)."
+            )
+            
+            self.render_semantic_cache_settings(provider, host, port)
+            
+            self.render_backend_pool_settings(provider, host, port)
+            
+            # Connection test (probes run in the background; we only show cached state)
             st.markdown("### 🔍 Connection Test")
             if st.button("Test Connection"):
-                with st.spinner("Testing connection..."):
-                    try:
-                        if provider == "Ollama":
-                            response = self.ollama_client.test_connection(host, port)
-                        else:  # LM Studio
-                            response = self.ollama_client.test_lmstudio_connection(host, port)
-                        
-                        if response:
-                            st.success("✅ Connection successful!")
-                        else:
-                            st.error("❌ Connection failed!")
-                    except Exception as e:
-                        st.error(f"❌ Connection error: {e}")
+                self.health_monitor.request_probe(provider, host, port)
+                st.info("🔄 Probe requested. Status refreshes on the next interaction.")
+            self.render_backend_status(self.health_monitor.get_status(provider, host, port))
             
             # Clear conversations
             st.markdown("### 🗑️ Data Management")
             if st.button("Clear All Conversations"):
                 self.db_manager.clear_all_conversations()
                 st.session_state.messages = {}
+                st.session_state.context_state = {}
                 st.success("All conversations cleared!")
             
             # Export conversations
@@ -244,6 +335,557 @@ class TrendCybertronApp:
                     file_name=f"trend_cybertron_conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                     mime="application/json"
                 )
+            
+            self.render_ioc_lookup()
+            
+            self.render_trace_panel()
+
+    def render_ioc_lookup(self):
+        """Render the IOC lookup over every saved conversation"""
+        st.markdown("### 🧬 IOC Lookup")
+        query = st.text_input("IP, domain, URL, hash or CVE", key="ioc_query",
+                              help="Defanged values such as 10[.]0[.]0[.]1 or hxxp://evil[.]com work too")
+        if query.strip():
+            rows = self.db_manager.find_conversations_by_ioc(query)
+            if not rows:
+                st.caption("No conversation mentions this indicator.")
+            for row in rows[:20]:
+                st.markdown(f"**{row['tab_name']}** · {row['timestamp']} · {row['ioc_type']} in {row['ioc_source']}")
+                st.caption(row['user_message'][:200])
+            if len(rows) > 20:
+                st.caption(f"{len(rows) - 20} more conversations not shown")
+        if st.button("Index IOCs in Saved Conversations", help="Needed once for conversations saved before IOC indexing"):
+            with st.spinner("Extracting IOCs..."):
+                stats = self.db_manager.backfill_iocs()
+            st.success(f"Scanned {stats['conversations']} conversations ({stats['mb_per_second']} MB/s), "
+                       f"{stats['iocs']} new IOC mentions indexed")
+
+    def render_trace_panel(self):
+        """Render tracing controls and the span breakdown of the previous rerun"""
+        st.markdown("### ⏱️ Performance Tracing")
+        tracing = st.session_state.tracing
+        tracing['enabled'] = st.checkbox(
+            "Trace reruns",
+            value=tracing['enabled'],
+            help="Time render, model and database calls on every rerun of this session "
+                 "(applies from the next interaction)."
+        )
+        if not tracing['enabled']:
+            return
+        tracing['profile_rate'] = st.slider(
+            "cProfile sample rate",
+            min_value=0.0,
+            max_value=1.0,
+            value=float(tracing['profile_rate']),
+            step=0.05,
+            help="Fraction of traced reruns that also run under cProfile (adds noticeable overhead)."
+        )
+        
+        trace = st.session_state.get('last_trace')
+        if trace is None:
+            st.caption("Interact with the app to capture a trace.")
+            return
+        with st.expander(f"Last rerun breakdown ({trace.root.duration * 1000:.0f} ms)", expanded=False):
+            breakdown = sorted(trace.breakdown().items(), key=lambda item: item[1], reverse=True)
+            st.caption(" · ".join(f"{category} {seconds * 1000:.0f} ms" for category, seconds in breakdown))
+            st.dataframe(trace.slowest(), hide_index=True)
+            stamp = datetime.fromtimestamp(trace.wall_time).strftime('%Y%m%d_%H%M%S')
+            st.download_button(
+                label="Download trace (JSON)",
+                data=json.dumps(trace.to_dict(), indent=2),
+                file_name=f"trend_cybertron_trace_{stamp}.json",
+                mime="application/json"
+            )
+            st.download_button(
+                label="Download Chrome trace",
+                data=json.dumps(trace.to_chrome_trace()),
+                file_name=f"trend_cybertron_chrome_trace_{stamp}.json",
+                mime="application/json"
+            )
+            if trace.profile:
+                st.code(trace.profile, language="text")
+
+    def render_backend_pool_settings(self, provider: str, host: str, port: str):
+        """Render the multi-backend routing settings"""
+        st.markdown("### 🖧 Backend Pool")
+        pool_config = st.session_state.backend_pool
+        pool_config['enabled'] = st.checkbox(
+            "Route across multiple backends",
+            value=pool_config['enabled'],
+            help="Load balance requests across several Ollama/LM Studio hosts with automatic failover"
+        )
+        if not pool_config['enabled']:
+            return
+        
+        pool_config['backends'] = st.text_area(
+            "Backends (one per line)",
+            value=pool_config['backends'] or f"{provider}@{host}:{port}",
+            help="host:port, Ollama@host:port or LM Studio@host:port"
+        )
+        pool_config['strategy'] = st.selectbox(
+            "Routing strategy",
+            STRATEGIES,
+            index=STRATEGIES.index(pool_config['strategy'])
+        )
+        pool_config['hedging'] = st.checkbox(
+            "Hedge slow requests",
+            value=pool_config['hedging'],
+            help="When a request has no first token after the model's p95 time to first token, "
+                 "also send it to the next backend and keep whichever answers first"
+        )
+        if pool_config['hedging']:
+            pool_config['hedge_budget'] = st.slider(
+                "Hedge budget",
+                min_value=0.01,
+                max_value=0.20,
+                value=pool_config['hedge_budget'],
+                step=0.01,
+                help="Largest fraction of requests that may be sent twice"
+            )
+        # Hedging is passed per request (see generate); the backend list and strategy belong to the
+        # shared pool, so they are only applied when this session changes them
+        requested = (pool_config['backends'], pool_config['strategy'])
+        if requested != pool_config.get('applied'):
+            try:
+                backends = parse_backend_specs(pool_config['backends'], default_provider=provider)
+                self.backend_pool.configure(backends, pool_config['strategy'])
+            except (ValueError, KeyError) as e:
+                st.error(f"Invalid backend list: {e}")
+                return
+            pool_config['applied'] = requested
+        
+        for info in self.backend_pool.get_pool_status():
+            icon = {"healthy": "🟢", "unhealthy": "🔴"}.get(info['status'], "⚪")
+            latency = f" · {info['ewma_latency'] * 1000:.0f} ms" if info['ewma_latency'] else ""
+            st.caption(f"{icon} {info['name']} · {info['outstanding']} in flight{latency}")
+        
+        stats = self.backend_pool.get_hedge_stats()
+        if pool_config['hedging'] and stats['requests']:
+            details = (f"🪃 Hedged {stats['hedge_rate']:.1%} of {stats['requests']} requests · "
+                       f"{stats['hedge_wins']} won by the hedge")
+            if stats['p99_ttft'] is not None:
+                details += (f" · p99 first token {stats['p99_ttft']:.2f}s "
+                            f"(≥{stats['p99_ttft_unhedged']:.2f}s without hedging)")
+            st.caption(details)
+
+    def render_semantic_cache_settings(self, provider: str, host: str, port: str):
+        """Render the opt-in semantic cache controls"""
+        settings = st.session_state.semantic_cache
+        settings['enabled'] = st.checkbox(
+            "Semantic cache",
+            value=settings['enabled'],
+            help="Answer near-duplicate single-turn prompts from earlier answers in the same tab, model and system prompt."
+        )
+        if not settings['enabled']:
+            return
+        settings['threshold'] = st.slider(
+            "Cache similarity threshold",
+            min_value=0.80,
+            max_value=0.99,
+            value=settings['threshold'],
+            step=0.01,
+            help="Cosine similarity a new prompt needs to reuse a cached answer. Higher is stricter."
+        )
+        embedders = ["Backend", "Local hashing"]
+        settings['embedder'] = st.selectbox(
+            "Cache embeddings",
+            embedders,
+            index=embedders.index(settings['embedder']),
+            help="Backend uses the provider's embeddings endpoint (e.g. nomic-embed-text); local hashing needs no model."
+        )
+        # Kept in this session's state and passed per request; the cache itself is shared by every session
+        settings['embedder_provider'] = provider if settings['embedder'] == "Backend" else "hashing"
+        settings['embedder_host'], settings['embedder_port'] = host, port
+        if st.button("Clear Semantic Cache"):
+            self.ollama_client.semantic_cache.clear()
+            st.success("Semantic cache cleared!")
+
+    def build_context(self, tab_name: str, system_prompt: str, prompt: str, model: str) -> Dict[str, Any]:
+        """Build the token-budgeted multi-turn messages for a new prompt in a tab"""
+        # The new prompt has already been appended to the tab's history
+        history = st.session_state.messages[tab_name][:-1]
+        if not history:
+            history = self.db_manager.get_session_turns(tab_name, st.session_state.session_id)
+        
+        summarizer = None
+        if st.session_state.summarize_with_model:
+            summarizer = llm_summarizer(lambda prompt, max_tokens: self.generate(
+                prompt=prompt,
+                system_prompt=None,
+                model=model,
+                temperature=0.2,
+                max_tokens=max_tokens
+            ))
+        builder = ContextBuilder(token_budget=st.session_state.context_budget, summarizer=summarizer)
+        state = st.session_state.context_state.setdefault(tab_name, {})
+        return builder.build(system_prompt, history, prompt, state)
+
+    def render_context_info(self, context: Dict[str, Any]):
+        """Render how the conversation history was fitted into the context budget"""
+        details = f"🧵 ~{context['prompt_tokens']} prompt tokens · {context['kept_turns']} earlier messages"
+        if context['summarized']:
+            details += " + rolling summary"
+        if context['over_budget']:
+            details += " · ⚠️ prompt alone exceeds the context budget"
+        st.caption(details)
+
+    def generate(self, prompt: str, system_prompt: str, model: str,
+                 temperature: float, max_tokens: int,
+                 messages: List[Dict[str, str]] = None,
+                 tab_name: str = None,
+                 output_schema: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Generate a response through the backend pool or the configured single backend"""
+        # Show the queue position while waiting for a backend slot
+        queue_notice = st.empty()
+        on_queued = lambda position: queue_notice.info(f"⏳ Backend busy - you are #{position} in the queue")
+        # The semantic cache is scoped per tab; no tab means no caching
+        cache_options = self.cache_options(tab_name)
+        
+        pool_config = st.session_state.backend_pool
+        if pool_config['enabled'] and self.backend_pool.backends():
+            response_data = self.backend_pool.generate_response(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                session_id=st.session_state.session_id,
+                on_queued=on_queued,
+                messages=messages,
+                output_schema=output_schema,
+                hedge=pool_config['hedging'],
+                hedge_budget=pool_config['hedge_budget'],
+                **cache_options
+            )
+        else:
+            response_data = self.ollama_client.generate_response(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                model=model,
+                host=st.session_state.ollama_config['host'],
+                port=st.session_state.ollama_config['port'],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                provider=st.session_state.ollama_config.get('provider', 'Ollama'),
+                session_id=st.session_state.session_id,
+                on_queued=on_queued,
+                messages=messages,
+                output_schema=output_schema,
+                **cache_options
+            )
+        queue_notice.empty()
+        return response_data
+
+    def stream_structured(self, prompt: str, system_prompt: str, model: str,
+                          temperature: float, max_tokens: int, schema: Dict[str, Any],
+                          messages: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Stream a structured answer, adding each record to a live table as soon as the model closes it"""
+        config = st.session_state.ollama_config
+        provider, host, port = config.get('provider', 'Ollama'), config['host'], config['port']
+        if st.session_state.backend_pool['enabled'] and self.backend_pool.backends():
+            # Streams go to the best backend, as in the API; failover and hedging need a whole response
+            candidates = self.backend_pool.candidates(model)
+            if not candidates:
+                error = f"No backend in the pool can serve model {model}"
+                return {'response': f"Error: {error}", 'error': error}
+            provider, host, port = candidates[0].provider, candidates[0].host, candidates[0].port
+        
+        parser = IncrementalJSONParser(records_key(schema))
+        table = st.empty()
+        records = []
+        start_time = time.time()
+        for record in self.ollama_client.stream_records(
+                prompt, schema, parser=parser, system_prompt=system_prompt, model=model, host=host, port=port,
+                temperature=temperature, max_tokens=max_tokens, session_id=st.session_state.session_id,
+                provider=provider, messages=messages):
+            if isinstance(record, dict) and record.keys() == {'error'}:
+                table.empty()
+                return {'response': f"Error: {record['error']}", 'error': record['error']}
+            records.append(record)
+            table.dataframe(records, use_container_width=True)
+        table.empty()
+        
+        response_data = {'response': parser.buffer, 'inference_time': time.time() - start_time}
+        try:
+            response_data['structured'] = parser.close()
+        except ValueError as e:
+            response_data['structured_error'] = f"Response is not valid JSON: {e}"
+        return response_data
+
+    def cache_options(self, tab_name: str = None) -> Dict[str, Any]:
+        """Semantic cache arguments for a request, from this session's cache settings"""
+        settings = st.session_state.semantic_cache
+        if not settings['enabled'] or tab_name is None or 'embedder_provider' not in settings:
+            return {}
+        return {
+            'cache_scope': tab_name,
+            'cache_threshold': settings['threshold'],
+            'cache_embedder': create_embedder(settings['embedder_provider'], settings['embedder_host'],
+                                              settings['embedder_port'])
+        }
+
+    def triage_generator(self, model: str, purpose: str = "triage") -> Callable[..., Dict[str, Any]]:
+        """Thread-safe generate function for bulk triage and summarization workers (no Streamlit calls)"""
+        config = dict(st.session_state.ollama_config)
+        use_pool = st.session_state.backend_pool['enabled'] and bool(self.backend_pool.backends())
+        # Batch priority and its own fair-queue session, so a bulk run does not slow anyone's chat
+        session_id = f"{st.session_state.session_id}-{purpose}"
+        
+        def generate(prompt: str, system_prompt: str, max_tokens: int) -> Dict[str, Any]:
+            if use_pool:
+                # Bulk work is not latency sensitive; hedging it would only double its load
+                return self.backend_pool.generate_response(
+                    prompt=prompt, system_prompt=system_prompt, model=model,
+                    temperature=0.2, max_tokens=max_tokens, session_id=session_id, hedge=False,
+                    priority="batch"
+                )
+            return self.ollama_client.generate_response(
+                prompt=prompt, system_prompt=system_prompt, model=model,
+                host=config['host'], port=config['port'], temperature=0.2, max_tokens=max_tokens,
+                provider=config.get('provider', 'Ollama'), session_id=session_id, priority="batch"
+            )
+        return generate
+
+    def render_bulk_triage(self, system_prompt: str):
+        """Render bulk triage of an uploaded alert export"""
+        with st.expander("📥 Bulk Alert Triage", expanded=False):
+            st.markdown("Upload an alert export (JSONL or CSV) to prioritize every alert in token-budgeted batches. "
+                        "Interrupted runs resume from the last completed batch.")
+            uploaded = st.file_uploader("Alert export", type=["jsonl", "ndjson", "csv"], key="triage_upload")
+            if uploaded is None:
+                return
+            
+            # Uploads are stored by content hash, so re-uploading the same file resumes its run
+            data = uploaded.getvalue()
+            extension = "csv" if uploaded.name.lower().endswith(".csv") else "jsonl"
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            os.makedirs(DEFAULT_TRIAGE_DIR, exist_ok=True)
+            input_path = os.path.join(DEFAULT_TRIAGE_DIR, f"{digest}.{extension}")
+            if not os.path.exists(input_path):
+                with open(input_path, "wb") as f:
+                    f.write(data)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                workers = st.number_input("Parallel requests", 1, 8, DEFAULT_WORKERS, key="triage_workers")
+            with col2:
+                batch_tokens = st.slider("Alert tokens per request", 500, 4000, DEFAULT_BATCH_TOKENS, 250,
+                                         key="triage_batch_tokens")
+            dedup = st.checkbox("Collapse near-duplicate alerts", value=True, key="triage_dedup",
+                                help="Send one representative per cluster of near-identical alerts and "
+                                     "apply its verdict to every member")
+            model = st.session_state.ollama_config['model']
+            job = TriageJob(input_path, os.path.join(DEFAULT_TRIAGE_DIR, f"{digest}.triage.jsonl"),
+                            self.triage_generator(model), system_prompt, model=model,
+                            batch_tokens=batch_tokens, workers=int(workers), dedup=dedup)
+            
+            checkpoint = job.load_checkpoint()
+            if checkpoint['alerts_done']:
+                st.info(f"{checkpoint['alerts_done']} alerts already triaged for this file; running again resumes.")
+            restart = st.checkbox("Start over", value=False, key="triage_restart")
+            
+            if st.button("▶️ Run Triage", key="triage_run"):
+                progress_bar = st.progress(0.0)
+                status = st.empty()
+                
+                def progress(stats: Dict[str, Any]):
+                    seen = max(stats['alerts_seen'], stats['alerts_done'], 1)
+                    progress_bar.progress(min(1.0, stats['alerts_done'] / seen))
+                    status.caption(f"{stats['alerts_done']} alerts triaged · {stats['alerts_per_minute']} alerts/min · "
+                                   f"{stats['failed_batches']} failed batches")
+                
+                stats = job.run(resume=not restart, progress=progress)
+                if stats['finished']:
+                    st.success(f"Triaged {stats['alerts_done']} alerts ({stats['alerts_per_minute']} alerts/min)")
+                    if 'clusters' in stats:
+                        st.caption(f"{stats['clusters']} clusters sent to the model "
+                                   f"({stats['reduction']}x fewer than alerts)")
+                else:
+                    st.warning(f"{stats['failed_batches']} batches failed; run again to retry them")
+            
+            if os.path.exists(job.output_path) and job.load_checkpoint()['output_bytes']:
+                with open(job.output_path, "rb") as f:
+                    output = f.read()
+                counts = {}
+                preview = []
+                for line in output.splitlines():
+                    result = json.loads(line)
+                    priority = result['priority'] or 'Unparsed'
+                    counts[priority] = counts.get(priority, 0) + 1
+                    if len(preview) < 200:
+                        preview.append({key: result.get(key) for key in ('alert_id', 'priority', 'reasoning', 'action')})
+                order = PRIORITIES + ('Unparsed',)
+                st.markdown(" · ".join(f"**{p}** {counts[p]}" for p in order if p in counts))
+                st.dataframe(preview, use_container_width=True)
+                st.download_button(
+                    label="Download Results (JSONL)",
+                    data=output,
+                    file_name=f"triage_{os.path.splitext(uploaded.name)[0]}.jsonl",
+                    mime="application/jsonl",
+                    key="triage_download"
+                )
+
+    def render_log_summarization(self, system_prompt: str):
+        """Render map-reduce summarization of a large log or timeline file"""
+        with st.expander("📜 Summarize a Large Log", expanded=False):
+            st.markdown("Upload a log or timeline of any length. It is split on event boundaries, summarized "
+                        "chunk by chunk in parallel and merged into executive, technical and compliance summaries. "
+                        "Chunk summaries are cached, so re-runs only summarize what changed.")
+            uploaded = st.file_uploader("Log or timeline file", key="summary_upload")
+            server_path = st.text_input("...or a file path on this machine", key="summary_path",
+                                        help="Very large files can be read in place instead of uploaded")
+            if uploaded is not None:
+                # Uploads are stored by content hash like bulk triage inputs
+                data = uploaded.getvalue()
+                os.makedirs(DEFAULT_SUMMARY_DIR, exist_ok=True)
+                input_path = os.path.join(DEFAULT_SUMMARY_DIR, f"{hashlib.sha256(data).hexdigest()[:16]}.log")
+                if not os.path.exists(input_path):
+                    with open(input_path, "wb") as f:
+                        f.write(data)
+                name = uploaded.name
+            elif server_path.strip():
+                input_path = os.path.expanduser(server_path.strip())
+                if not os.path.isfile(input_path):
+                    st.error(f"File not found: {input_path}")
+                    return
+                name = os.path.basename(input_path)
+            else:
+                return
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                workers = st.number_input("Parallel requests", 1, 16, DEFAULT_SUMMARY_WORKERS, key="summary_workers")
+            with col2:
+                chunk_tokens = st.slider("Log tokens per chunk", 1000, 6000, DEFAULT_CHUNK_TOKENS, 250,
+                                         key="summary_chunk_tokens")
+            
+            if st.button("▶️ Summarize", key="summary_run"):
+                model = st.session_state.ollama_config['model']
+                summarizer = LogSummarizer(input_path, self.triage_generator(model, "summary"), system_prompt,
+                                           model=model, chunk_tokens=chunk_tokens, workers=int(workers))
+                progress_bar = st.progress(0.0)
+                status = st.empty()
+                
+                def progress(stats: Dict[str, Any]):
+                    if stats['stage'] == "map" and stats['chunks']:
+                        progress_bar.progress(min(1.0, stats['calls_done'] / stats['chunks']) * 0.8)
+                    elif stats['stage'] in ("reduce", "final"):
+                        progress_bar.progress(0.9 if stats['stage'] == "reduce" else 0.95)
+                    status.caption(f"{stats['stage']} · {stats['chunks']} chunks · {stats['calls_done']} model calls "
+                                   f"({stats['cached_calls']} cached, {stats['failed_calls']} failed) · "
+                                   f"{stats['elapsed']}s")
+                
+                result = summarizer.run(progress=progress)
+                progress_bar.progress(1.0)
+                st.session_state.log_summary = {'name': name, 'result': result}
+            
+            summary = st.session_state.get('log_summary')
+            if summary and summary['name'] == name:
+                stats = summary['result']['stats']
+                if not stats['finished']:
+                    st.warning(f"{stats['failed_calls']} model calls failed; run again to retry them")
+                tabs = st.tabs([audience.title() for audience in summary['result']['summaries']])
+                for tab, text in zip(tabs, summary['result']['summaries'].values()):
+                    with tab:
+                        st.markdown(text)
+                st.download_button(
+                    label="Download Summaries (Markdown)",
+                    data=render_markdown(summary['result']),
+                    file_name=f"summary_{os.path.splitext(name)[0]}.md",
+                    mime="text/markdown",
+                    key="summary_download"
+                )
+
+    def render_yara_validation(self, tab_name: str):
+        """Render compile-and-scan validation of the rules in the latest answer"""
+        answers = [m['content'] for m in st.session_state.messages.get(tab_name, []) if m['role'] == "assistant"]
+        rules = extract_rules(answers[-1]) if answers else []
+        with st.expander(f"🧪 Validate YARA Rules ({len(rules)} in the last answer)", expanded=False):
+            if not rules:
+                st.caption("Ask for a YARA rule; the rules in the latest answer can be checked here.")
+                return
+            if not YaraValidator.available():
+                st.info("Install yara-python (`pip install yara-python`) to compile and scan; only static checks run.")
+            col1, col2 = st.columns(2)
+            with col1:
+                corpus_dir = st.text_input("Sample corpus directory", DEFAULT_CORPUS_DIR, key="yara_corpus",
+                                           help="Local files to scan (benign and malicious samples)")
+            with col2:
+                workers = st.number_input("Worker processes", 1, 16, DEFAULT_YARA_WORKERS, key="yara_workers")
+            
+            if st.button("🧪 Compile and Scan", key="yara_validate"):
+                with st.spinner(f"Checking {len(rules)} rules..."):
+                    report = YaraValidator(corpus_dir, workers=int(workers)).validate(answers[-1])
+                summary = (f"{report['corpus_files']} corpus files ({report['corpus_mb']} MB) · "
+                           f"{report['compile_errors']} compile errors · {report['slow_rules']} slow rules · "
+                           f"{report['elapsed']}s")
+                if report['compile_errors'] or report['slow_rules']:
+                    st.warning(summary)
+                else:
+                    st.success(summary)
+                st.dataframe([{
+                    'Rule': r['rule'],
+                    'Compiles': {True: "✅", False: "❌", None: "—"}[r.get('compiled')],
+                    'Matched files': r.get('matches'),
+                    'Scan (ms)': r.get('scan_ms'),
+                    'ms/MB': r.get('ms_per_mb'),
+                    'Slow': "🐢" if r.get('slow') else "",
+                    'Cached': r['cached']
+                } for r in report['rules']], hide_index=True, use_container_width=True)
+                for r in report['rules']:
+                    if r.get('compiled') is False:
+                        st.error(f"**{r['rule']}**: {r['error']}")
+                    for warning in r.get('compiler_warnings', []) + r['performance_warnings']:
+                        st.caption(f"⚠️ **{r['rule']}**: {warning}")
+
+    def render_response_telemetry(self, response_data: Dict[str, Any]):
+        """Render per-request routing and context sizing details below a response"""
+        parts = []
+        if response_data.get('cached'):
+            parts.append(
+                f"⚡ cached (similarity {response_data['cache_similarity']:.2f}, "
+                f"saved ~{response_data['latency_saved']:.1f}s)"
+            )
+        routing = response_data.get('routing')
+        if routing and routing['attempts']:
+            served_by = routing['backend'] or "no backend"
+            details = f"🖧 {served_by} · {routing['strategy']}"
+            if routing['failovers']:
+                path = " → ".join(f"{a['backend']} ({a['outcome']})" for a in routing['attempts'])
+                details += f" · {routing['failovers']} failover(s): {path}"
+            elif routing.get('hedged'):
+                path = " + ".join(f"{a['backend']} ({a['outcome']})" for a in routing['attempts'])
+                details += f" · hedged after {routing['hedge_threshold'] * 1000:.0f} ms: {path}"
+            parts.append(details)
+        if response_data.get('num_ctx'):
+            details = f"num_ctx {response_data['num_ctx']}"
+            if response_data.get('ctx_reload'):
+                details += " (model reloaded)"
+            parts.append(details)
+        if parts:
+            st.caption(" · ".join(parts))
+        if response_data.get('context_trimmed'):
+            st.warning("⚠️ The input exceeded the model's context window and was trimmed.")
+
+    def render_backend_status(self, status: Dict[str, Any]):
+        """Render cached backend status with a staleness indicator"""
+        name = "Ollama" if status['provider'] == "Ollama" else "LM Studio"
+        if status['status'] == 'unknown':
+            st.info(f"⏳ Waiting for first {name} health check...")
+            return
+        
+        if status['status'] == 'healthy':
+            latency = status['response_time']
+            latency_text = f" ({latency * 1000:.0f} ms)" if latency is not None else ""
+            st.success(f"✅ {name} is running{latency_text}")
+        else:
+            st.error(f"❌ {name} connection failed: {status['error']}")
+        
+        age_text = f"Last checked {status['age_seconds']:.0f}s ago"
+        if status['stale']:
+            st.warning(f"⚠️ {age_text} - status may be stale")
+        else:
+            st.caption(age_text)
 
     def render_configuration_tab(self):
         """Render the configuration tab"""
@@ -314,39 +956,104 @@ class TrendCybertronApp:
         with col2:
             st.markdown("### 📊 System Status")
             
-            # Check provider status
+            # Check provider status from the health monitor's cache
             provider = st.session_state.ollama_config.get('provider', 'Ollama')
+            status = self.health_monitor.get_status(
+                provider,
+                st.session_state.ollama_config['host'],
+                st.session_state.ollama_config['port']
+            )
+            self.render_backend_status(status)
+            
+            if status['status'] == 'healthy':
+                if status['models']:
+                    st.info(f"📋 Available models: {len(status['models'])}")
+                    for model_name in status['models'][:5]:  # Show first 5 models
+                        st.text(f"  • {model_name}")
+                else:
+                    st.warning("⚠️ No models found")
+                if status['loaded_models']:
+                    st.info(f"🧠 Loaded in memory: {', '.join(status['loaded_models'])}")
+            
+            latencies = [round(rt * 1000) for _, rt in status['latency_history'] if rt is not None]
+            if len(latencies) > 1:
+                st.markdown("**Probe latency (ms)**")
+                st.line_chart(latencies, height=150)
             
             if provider == "Ollama":
-                try:
-                    models = self.ollama_client.list_models(
-                        st.session_state.ollama_config['host'],
-                        st.session_state.ollama_config['port']
-                    )
-                    if models:
-                        st.success("✅ Ollama is running")
-                        st.info(f"📋 Available models: {len(models)}")
-                        for model in models[:5]:  # Show first 5 models
-                            st.text(f"  • {model['name']}")
-                    else:
-                        st.warning("⚠️ No models found")
-                except Exception as e:
-                    st.error(f"❌ Ollama connection failed: {e}")
-            else:  # LM Studio
-                try:
-                    models = self.ollama_client.list_lmstudio_models(
-                        st.session_state.ollama_config['host'],
-                        st.session_state.ollama_config['port']
-                    )
-                    if models:
-                        st.success("✅ LM Studio is running")
-                        st.info(f"📋 Available models: {len(models)}")
-                        for model in models[:5]:  # Show first 5 models
-                            st.text(f"  • {model['id']}")
-                    else:
-                        st.warning("⚠️ No models found")
-                except Exception as e:
-                    st.error(f"❌ LM Studio connection failed: {e}")
+                self.render_model_residency(
+                    st.session_state.ollama_config['host'],
+                    st.session_state.ollama_config['port']
+                )
+                self.render_model_pulls(
+                    st.session_state.ollama_config['host'],
+                    st.session_state.ollama_config['port'],
+                    status['models']
+                )
+            
+            # Context sizing: num_ctx buckets and model reloads they caused
+            sizing = self.ollama_client.context_sizer.get_stats()
+            if sizing['total_requests']:
+                st.markdown("### 🧮 Context Sizing")
+                st.info(
+                    f"📏 {sizing['total_requests']} requests · {sizing['total_reloads']} num_ctx reloads · "
+                    f"{sizing['total_overflows']} over model limit"
+                )
+                for backend_model, bucket in sizing['current_buckets'].items():
+                    st.text(f"  • {backend_model}: num_ctx {bucket}")
+            
+            # Semantic cache: hit rate and model time saved
+            cache_stats = self.ollama_client.semantic_cache.get_stats()
+            if cache_stats['lookups']:
+                st.markdown("### ⚡ Semantic Cache")
+                st.info(
+                    f"🎯 Hit rate {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['lookups']}) · "
+                    f"~{cache_stats['latency_saved_seconds']:.1f}s of inference saved · "
+                    f"{cache_stats['entries']} cached answers"
+                )
+                if cache_stats['errors']:
+                    st.warning(f"⚠️ {cache_stats['errors']} embedding failures (cache was bypassed)")
+            
+            # Conversation vector index for similar-incident search
+            index_stats = self.conversation_index.get_stats()
+            st.info(
+                f"🔎 Similar-incident index: {index_stats['rows']:,} conversations · {index_stats['size_mb']} MB"
+                + (f" · p50 query {index_stats['p50_query_ms']} ms" if index_stats['queries'] else "")
+                + (f" · {index_stats['pending']} pending" if index_stats['pending'] else "")
+            )
+            
+            # Admission control: per-backend concurrency and queueing
+            admission_metrics = self.ollama_client.admission.get_metrics()
+            if admission_metrics:
+                st.markdown("### 🚦 Admission Control")
+                st.dataframe(
+                    [{
+                        'Backend': m['backend'],
+                        'Slots': m['slots'],
+                        'Running': m['in_flight'],
+                        'Queued': m['queue_depth'],
+                        'Rejected': m['total_rejected'],
+                        'Avg wait (s)': m['avg_wait_seconds'],
+                        'p95 wait (s)': m['p95_wait_seconds']
+                    } for m in admission_metrics],
+                    hide_index=True
+                )
+                st.dataframe(
+                    [{
+                        'Backend': m['backend'],
+                        'Class': priority,
+                        'Running': stats['in_flight'],
+                        'Queued': stats['queue_depth'],
+                        'Admitted': stats['admitted'],
+                        'Aged up': stats['promoted_in'],
+                        'Avg wait (s)': stats['avg_wait_seconds'],
+                        'p95 wait (s)': stats['p95_wait_seconds']
+                    } for m in admission_metrics for priority, stats in m['classes'].items()],
+                    hide_index=True
+                )
+            
+            with st.expander("📈 Metrics (Prometheus format)", expanded=False):
+                st.code(get_registry().render(), language="text")
             
             # Database status
             try:
@@ -356,7 +1063,162 @@ class TrendCybertronApp:
             except Exception as e:
                 st.error(f"❌ Database error: {e}")
 
-    def render_chat_tab(self, tab_name: str, system_prompt: str, test_prompts: List[str]):
+    def render_model_residency(self, host: str, port: str):
+        """Render resident models with pin/unpin/unload controls"""
+        st.markdown("### 🧠 Model Residency")
+        budget = self.residency.memory_budget_bytes
+        resident = self.residency.resident_models(host, port)
+        used = sum(m['size'] for m in resident)
+        budget_text = f" of {budget / 1024 ** 3:.1f} GB budget" if budget else ""
+        st.caption(f"{len(resident)} model(s) in memory · {used / 1024 ** 3:.1f} GB{budget_text}")
+        
+        for model in resident:
+            name = model['name']
+            cols = st.columns([3, 1])
+            with cols[0]:
+                pin_text = " 📌 pinned" if model['pinned'] else ""
+                vram = f", {model['size_vram'] / 1024 ** 3:.1f} GB VRAM" if model['size_vram'] else ""
+                st.text(f"  • {name} ({model['size'] / 1024 ** 3:.1f} GB{vram}){pin_text}")
+            with cols[1]:
+                action = "Unpin" if model['pinned'] else "Pin"
+                if st.button(action, key=f"residency_pin_{name}"):
+                    target = self.residency.unpin if model['pinned'] else self.residency.pin
+                    threading.Thread(target=target, args=(name, host, port), daemon=True).start()
+                    st.info(f"{action}ning {name}...")
+                if st.button("Unload", key=f"residency_unload_{name}"):
+                    threading.Thread(target=self.residency.unload, args=(name, host, port), daemon=True).start()
+                    st.info(f"Unloading {name}...")
+        
+        model = st.session_state.ollama_config['model']
+        if self.residency.is_loading(host, port, model):
+            st.info(f"⏳ Loading {model} into memory...")
+        elif model and model not in [m['name'] for m in resident]:
+            if st.button(f"Preload {model}", key="residency_preload"):
+                self.residency.preload_async([model], host, port)
+                st.info(f"Loading {model} in the background...")
+
+    def render_model_pulls(self, host: str, port: str, available_models: List[str]):
+        """Render model pulls with live progress and cancel controls"""
+        st.markdown("### 📥 Pull Models")
+        selected = st.session_state.ollama_config['model']
+        default = selected if selected and selected not in available_models else ""
+        names = st.text_input("Models to pull (comma-separated)", value=default, key="pull_models")
+        if st.button("Pull", key="pull_start") and names.strip():
+            self.pull_manager.pull(names.split(","), host, port)
+        
+        polling = self.pull_manager.active()
+        
+        def render_jobs():
+            jobs = [job for job in self.pull_manager.jobs() if job['host'] == str(host) and job['port'] == str(port)]
+            for job in jobs:
+                cols = st.columns([5, 1])
+                with cols[0]:
+                    st.progress(job['fraction'], text=f"{job['model']}: {job['summary']}")
+                with cols[1]:
+                    if job['status'] not in ("success", "failed", "cancelled"):
+                        if st.button("Cancel", key=f"pull_cancel_{job['model']}"):
+                            self.pull_manager.cancel(job['model'], host, port)
+            if polling and not self.pull_manager.active():
+                # Pulls finished: rerun the whole page so model lists pick up the new models
+                st.rerun()
+        
+        if polling and hasattr(st, "fragment"):
+            st.fragment(run_every=1.0)(render_jobs)()
+        else:
+            render_jobs()
+            if polling and st.button("🔄 Refresh progress", key="pull_refresh"):
+                st.rerun()
+        if any(job['status'] in ("success", "failed", "cancelled") for job in self.pull_manager.jobs()):
+            if st.button("Clear finished", key="pull_clear"):
+                self.pull_manager.clear_finished()
+                st.rerun()
+
+    def render_structured_output(self, document: Any, schema: Dict[str, Any]):
+        """Render a structured answer as a table of its records plus the raw JSON"""
+        key = records_key(schema)
+        records = document.get(key, []) if key and isinstance(document, dict) else document
+        if isinstance(records, list) and records:
+            st.dataframe(records, use_container_width=True)
+        else:
+            st.info("The model returned no records.")
+        with st.expander("JSON", expanded=False):
+            st.json(document)
+
+    def render_file_attachment(self, tab_name: str, use_case_key: str = None) -> Dict[str, Any]:
+        """Render the file attachment control for a chat tab and return the active attachment"""
+        state_key = f"attachment_{tab_name}"
+        tab_hash = hashlib.md5(tab_name.encode()).hexdigest()[:8]
+        with st.expander("📎 Attach a File", expanded=state_key in st.session_state):
+            st.markdown("Attach a CSV, JSONL, JSON or YAML export of any size. It is parsed as a stream, the fields "
+                        "relevant to this use case are kept and a digest that fits the context budget is sent "
+                        "in front of each question.")
+            uploaded = st.file_uploader("Data file", type=["csv", "jsonl", "ndjson", "json", "yaml", "yml"],
+                                        key=f"attach_upload_{tab_hash}")
+            server_path = st.text_input("...or a file path on this machine", key=f"attach_path_{tab_hash}",
+                                        help="Very large files can be read in place instead of uploaded")
+            budget = int(st.session_state.context_budget * ATTACHMENT_BUDGET_RATIO)
+            source = None
+            if uploaded is not None:
+                source = (uploaded.file_id, budget)
+            elif server_path.strip():
+                source = (server_path.strip(), budget)
+            
+            attachment = st.session_state.get(state_key)
+            if source is not None and (attachment is None or attachment.get('source') != source):
+                try:
+                    if uploaded is not None:
+                        input_path = self.store_upload(uploaded)
+                        name = uploaded.name
+                    else:
+                        input_path = os.path.expanduser(server_path.strip())
+                        if not os.path.isfile(input_path):
+                            st.error(f"File not found: {input_path}")
+                            return None
+                        name = os.path.basename(input_path)
+                    with st.spinner(f"Parsing {name}..."):
+                        attachment = ingest_file(input_path, use_case_key, budget, name=name)
+                    attachment['source'] = source
+                    st.session_state[state_key] = attachment
+                except Exception as e:
+                    st.error(f"Could not read the file: {e}")
+                    return None
+            
+            if attachment is None:
+                return None
+            st.caption(f"📎 {attachment['name']} ({attachment['format']}, {attachment['megabytes']} MB): "
+                       f"{attachment['records']:,} records, {attachment['shown']:,} shown, "
+                       f"{attachment['omitted']:,} omitted, ~{attachment['tokens']:,} tokens"
+                       + (" · cached" if attachment.get('cached') else
+                          f" · parsed in {attachment['seconds']}s ({attachment['mb_per_second']} MB/s)"))
+            if attachment['fields']:
+                st.caption("Fields: " + ", ".join(attachment['fields'][:20])
+                           + (" ..." if len(attachment['fields']) > 20 else ""))
+            st.text_area("Digest sent to the model", attachment['text'], height=150, disabled=True,
+                         key=f"attach_digest_{tab_hash}")
+            if st.button("🗑️ Remove Attachment", key=f"attach_remove_{tab_hash}"):
+                del st.session_state[state_key]
+                for key in (f"attach_upload_{tab_hash}", f"attach_path_{tab_hash}"):
+                    st.session_state.pop(key, None)
+                st.rerun()
+        return attachment
+    
+    def store_upload(self, uploaded) -> str:
+        """Copy an uploaded file to the ingest directory in chunks, named by content hash"""
+        os.makedirs(DEFAULT_INGEST_DIR, exist_ok=True)
+        extension = os.path.splitext(uploaded.name)[1].lower() or ".dat"
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(DEFAULT_INGEST_DIR, f".upload-{uuid.uuid4().hex}{extension}")
+        uploaded.seek(0)
+        with open(tmp_path, "wb") as f:
+            while chunk := uploaded.read(1 << 20):
+                digest.update(chunk)
+                f.write(chunk)
+        input_path = os.path.join(DEFAULT_INGEST_DIR, f"{digest.hexdigest()[:16]}{extension}")
+        os.replace(tmp_path, input_path)
+        return input_path
+    
+    def render_chat_tab(self, tab_name: str, system_prompt: str, test_prompts: List[str],
+                        output_schema: Dict[str, Any] = None, use_case_key: str = None):
         """Render a chat tab with system prompt and test prompts"""
         st.markdown(f'<div class="tab-header">💬 {tab_name}</div>', unsafe_allow_html=True)
         
@@ -452,6 +1314,25 @@ class TrendCybertronApp:
                 )
                 if model3:
                     comparison_models.append(model3)
+            
+            config = st.session_state.ollama_config
+            if config.get('provider', 'Ollama') == "Ollama" and comparison_models:
+                # Load comparison models ahead of the first prompt instead of on it
+                self.residency.preload_async(comparison_models, config['host'], config['port'])
+                if not self.residency.fits_budget(comparison_models, config['host'], config['port']):
+                    st.warning("⚠️ These models do not fit in the model memory budget together; "
+                               "they will be swapped in and out, which slows comparisons down.")
+        
+        # Structured output for use cases whose answers feed automation
+        structured = False
+        if output_schema is not None:
+            structured = st.checkbox(
+                "🧾 Structured JSON output",
+                key=f"structured_{tab_name}",
+                help="Constrain the answer to this use case's JSON schema and show it as a table"
+            )
+        
+        attachment = self.render_file_attachment(tab_name, use_case_key)
         
         # Chat input
         chat_input_key = f"chat_input_{tab_name}"
@@ -462,42 +1343,74 @@ class TrendCybertronApp:
             st.session_state.messages[tab_name].append({"role": "user", "content": prompt})
             with st.chat_message("user"):
                 st.markdown(prompt)
+                if attachment is not None:
+                    st.caption(f"📎 with {attachment['name']} ({attachment['shown']:,} of "
+                               f"{attachment['records']:,} records, ~{attachment['tokens']:,} tokens)")
+            self.render_similar_incidents(tab_name, prompt)
+            # The model sees the file digest; the chat history keeps the question as typed
+            model_prompt = attachment_prompt(attachment, prompt) if attachment is not None else prompt
             
             if enable_comparison and comparison_models:
                 # Multi-model comparison
                 self.generate_multi_model_responses(
-                    prompt=prompt,
+                    prompt=model_prompt,
                     system_prompt=system_prompt,
                     models=comparison_models,
                     tab_name=tab_name,
                     temperature=st.session_state.temperature,
-                    max_tokens=st.session_state.max_tokens
+                    max_tokens=st.session_state.max_tokens,
+                    saved_prompt=prompt
                 )
             else:
                 # Single model response
                 with st.chat_message("assistant"):
                     with st.spinner("Thinking..."):
                         try:
-                            response_data = self.ollama_client.generate_response(
-                                prompt=prompt,
-                                system_prompt=system_prompt,
-                                model=st.session_state.ollama_config['model'],
-                                host=st.session_state.ollama_config['host'],
-                                port=st.session_state.ollama_config['port'],
-                                temperature=st.session_state.temperature,
-                                max_tokens=st.session_state.max_tokens,
-                                provider=st.session_state.ollama_config.get('provider', 'Ollama')
-                            )
+                            model_name = st.session_state.ollama_config['model']
+                            schema = output_schema if structured else None
+                            request_system_prompt = system_prompt
+                            if schema is not None:
+                                request_system_prompt += schema_instructions(schema)
+                            context = self.build_context(tab_name, request_system_prompt, model_prompt, model_name)
+                            if schema is not None:
+                                # Records show up in a table while the model is still writing the rest
+                                response_data = self.stream_structured(
+                                    prompt=model_prompt,
+                                    system_prompt=request_system_prompt,
+                                    model=model_name,
+                                    temperature=st.session_state.temperature,
+                                    max_tokens=st.session_state.max_tokens,
+                                    schema=schema,
+                                    messages=context['messages']
+                                )
+                            else:
+                                response_data = self.generate(
+                                    prompt=model_prompt,
+                                    system_prompt=request_system_prompt,
+                                    model=model_name,
+                                    temperature=st.session_state.temperature,
+                                    max_tokens=st.session_state.max_tokens,
+                                    messages=context['messages'],
+                                    tab_name=tab_name
+                                )
                             
                             # Extract response
                             response_text = response_data['response']
                             
-                            st.markdown(response_text)
+                            if 'structured' in response_data:
+                                self.render_structured_output(response_data['structured'], schema)
+                            else:
+                                if 'structured_error' in response_data:
+                                    st.warning(response_data['structured_error'])
+                                st.markdown(response_text)
+                            self.render_context_info(context)
+                            self.render_response_telemetry(response_data)
                             
                             # Add assistant response to chat history
                             st.session_state.messages[tab_name].append({"role": "assistant", "content": response_text})
                             
-                            # Save to database
+                            # Save to database (the question as typed: a digest would come back with the
+                            # session's history and fill the similarity and IOC indexes)
                             self.db_manager.save_message(
                                 tab_name=tab_name,
                                 user_message=prompt,
@@ -505,7 +1418,8 @@ class TrendCybertronApp:
                                 system_prompt=system_prompt,
                                 model=model_name,
                                 temperature=st.session_state.temperature,
-                                max_tokens=st.session_state.max_tokens
+                                max_tokens=st.session_state.max_tokens,
+                                session_id=st.session_state.session_id
                             )
                             
                         except Exception as e:
@@ -513,28 +1427,39 @@ class TrendCybertronApp:
                             st.error(error_msg)
                             st.session_state.messages[tab_name].append({"role": "assistant", "content": error_msg})
 
-    def get_available_models(self):
-        """Get list of available models from the current provider"""
+    def render_similar_incidents(self, tab_name: str, prompt: str, k: int = 5, min_score: float = 0.3):
+        """Render the most similar conversations from earlier sessions of this tab"""
         try:
-            provider = st.session_state.ollama_config.get('provider', 'Ollama')
-            host = st.session_state.ollama_config['host']
-            port = st.session_state.ollama_config['port']
-            
-            if provider == "Ollama":
-                models = self.ollama_client.list_models(host, port)
-                return [model['name'] for model in models] if models else []
-            else:  # LM Studio
-                models = self.ollama_client.list_lmstudio_models(host, port)
-                return [model['id'] for model in models] if models else []
+            # Over-fetch: hits from this session or deleted conversations are dropped below
+            hits = self.conversation_index.search(prompt, k=k * 3, tab_name=tab_name)
+            hits = [(conversation_id, score) for conversation_id, score in hits if score >= min_score]
+            scores = dict(hits)
+            rows = self.db_manager.get_conversations_by_ids([conversation_id for conversation_id, _ in hits])
         except Exception as e:
-            st.error(f"Error getting models: {e}")
-            return []
+            st.caption(f"Similar incident search unavailable: {e}")
+            return
+        rows = [r for r in rows if r['session_id'] != st.session_state.session_id][:k]
+        if not rows:
+            return
+        with st.expander(f"🔎 Similar past incidents ({len(rows)})", expanded=False):
+            for row in rows:
+                st.markdown(f"**{scores[row['id']]:.0%} match** · {row['timestamp']} · {row['model'] or ''}")
+                st.markdown(f"> {row['user_message'][:300]}")
+                st.caption(row['assistant_response'][:500])
 
-    def generate_multi_model_responses(self, prompt, system_prompt, models, tab_name, temperature, max_tokens):
-        """Generate responses from multiple models and display them side by side"""
+    def get_available_models(self):
+        """Get list of available models from the current provider (cached by the health monitor)"""
         provider = st.session_state.ollama_config.get('provider', 'Ollama')
         host = st.session_state.ollama_config['host']
         port = st.session_state.ollama_config['port']
+        return self.health_monitor.get_status(provider, host, port)['models']
+
+    def generate_multi_model_responses(self, prompt, system_prompt, models, tab_name, temperature, max_tokens,
+                                       saved_prompt=None):
+        """Generate responses from multiple models and display them side by side (`saved_prompt`: as typed)"""
+        # Every model sees the same conversation context
+        context = self.build_context(tab_name, system_prompt, prompt, models[0])
+        self.render_context_info(context)
         
         # Create columns for each model response
         cols = st.columns(len(models))
@@ -545,21 +1470,21 @@ class TrendCybertronApp:
                 st.markdown(f"### 🤖 {model}")
                 with st.spinner(f"Generating response with {model}..."):
                     try:
-                        response_data = self.ollama_client.generate_response(
+                        response_data = self.generate(
                             prompt=prompt,
                             system_prompt=system_prompt,
                             model=model,
-                            host=host,
-                            port=port,
                             temperature=temperature,
                             max_tokens=max_tokens,
-                            provider=provider
+                            messages=context['messages'],
+                            tab_name=tab_name
                         )
                         
                         # Extract response
                         response_text = response_data['response']
                         
                         st.markdown(response_text)
+                        self.render_response_telemetry(response_data)
                         responses.append({
                             'model': model,
                             'response': response_text
@@ -581,12 +1506,13 @@ class TrendCybertronApp:
         for resp in responses:
             self.db_manager.save_message(
                 tab_name=tab_name,
-                user_message=prompt,
+                user_message=saved_prompt or prompt,
                 assistant_response=resp['response'],
                 system_prompt=system_prompt,
                 model=resp['model'],
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                session_id=st.session_state.session_id
             )
 
     def run(self):
@@ -595,102 +1521,58 @@ class TrendCybertronApp:
         self.render_header()
         self.render_sidebar()
         
-        # Define tabs with system prompts and test prompts
-        tabs = {
-            "Configuration": self.render_configuration_tab,
-            "Alert Prioritization": lambda: self.render_chat_tab(
-                "Alert Prioritization", 
-                self.prompt_templates.get_alert_prioritization_prompt(),
-                self.prompt_templates.get_test_prompts("alert_prioritization")
-            ),
-            "YARA Patterns": lambda: self.render_chat_tab(
-                "YARA Patterns", 
-                self.prompt_templates.get_yara_patterns_prompt(),
-                self.prompt_templates.get_test_prompts("yara_patterns")
-            ),
-            "OSINT Reporting": lambda: self.render_chat_tab(
-                "OSINT Reporting", 
-                self.prompt_templates.get_osint_reporting_prompt(),
-                self.prompt_templates.get_test_prompts("osint_reporting")
-            ),
-            "Incident Summarization": lambda: self.render_chat_tab(
-                "Incident Summarization", 
-                self.prompt_templates.get_incident_summarization_prompt(),
-                self.prompt_templates.get_test_prompts("incident_summarization")
-            ),
-            "Red Team Planning": lambda: self.render_chat_tab(
-                "Red Team Planning", 
-                self.prompt_templates.get_redteam_planning_prompt(),
-                self.prompt_templates.get_test_prompts("redteam_planning")
-            ),
-            "Exploit Generation": lambda: self.render_chat_tab(
-                "Exploit Generation", 
-                self.prompt_templates.get_exploit_generation_prompt(),
-                self.prompt_templates.get_test_prompts("exploit_generation")
-            ),
-            "Threat Intelligence": lambda: self.render_chat_tab(
-                "Threat Intelligence", 
-                self.prompt_templates.get_threat_intelligence_prompt(),
-                self.prompt_templates.get_test_prompts("threat_intelligence")
-            ),
-            "Vulnerability Assessment": lambda: self.render_chat_tab(
-                "Vulnerability Assessment", 
-                self.prompt_templates.get_vulnerability_assessment_prompt(),
-                self.prompt_templates.get_test_prompts("vulnerability_assessment")
-            ),
-            "Security Policy": lambda: self.render_chat_tab(
-                "Security Policy", 
-                self.prompt_templates.get_security_policy_prompt(),
-                self.prompt_templates.get_test_prompts("security_policy")
-            ),
-            "CREM Discover": lambda: self.render_chat_tab(
-                "CREM Discover", 
-                self.prompt_templates.get_crem_discover_prompt(),
-                self.prompt_templates.get_test_prompts("crem_discover")
-            ),
-            "CREM Predict": lambda: self.render_chat_tab(
-                "CREM Predict", 
-                self.prompt_templates.get_crem_predict_prompt(),
-                self.prompt_templates.get_test_prompts("crem_predict")
-            ),
-            "CREM Prioritize": lambda: self.render_chat_tab(
-                "CREM Prioritize", 
-                self.prompt_templates.get_crem_prioritize_prompt(),
-                self.prompt_templates.get_test_prompts("crem_prioritize")
-            ),
-            "CREM Comply": lambda: self.render_chat_tab(
-                "CREM Comply", 
-                self.prompt_templates.get_crem_comply_prompt(),
-                self.prompt_templates.get_test_prompts("crem_comply")
-            ),
-            "CREM Quantify": lambda: self.render_chat_tab(
-                "CREM Quantify", 
-                self.prompt_templates.get_crem_quantify_prompt(),
-                self.prompt_templates.get_test_prompts("crem_quantify")
-            ),
-            "CREM Mitigate": lambda: self.render_chat_tab(
-                "CREM Mitigate", 
-                self.prompt_templates.get_crem_mitigate_prompt(),
-                self.prompt_templates.get_test_prompts("crem_mitigate")
-            )
-        }
+        # Keep the selected model warm so the first prompt does not pay the load time
+        config = st.session_state.ollama_config
+        if config.get('provider', 'Ollama') == "Ollama" and config['model']:
+            self.residency.watch(config['host'], config['port'])
+            self.residency.ensure_preloaded(config['model'], config['host'], config['port'])
+        
+        # Tabs are driven by the prompt registry; it reloads itself when the prompt pack changes
+        registry = self.prompt_templates.registry.snapshot()
+        tab_names = ["Configuration"] + list(registry.tab_names)
+        if st.session_state.current_tab not in tab_names:
+            st.session_state.current_tab = "Configuration"
         
         # Create tabs
         selected_tab = st.selectbox(
             "Select a cybersecurity use case:",
-            list(tabs.keys()),
-            index=list(tabs.keys()).index(st.session_state.current_tab)
+            tab_names,
+            index=tab_names.index(st.session_state.current_tab)
         )
         
         st.session_state.current_tab = selected_tab
         
         # Render selected tab
-        tabs[selected_tab]()
+        if selected_tab == "Configuration":
+            self.render_configuration_tab()
+        else:
+            use_case = registry.by_tab[selected_tab]
+            schema_name = schema_name_for_use_case(use_case.key)
+            self.render_chat_tab(
+                use_case.tab_name,
+                use_case.system_prompt,
+                list(use_case.test_prompts),
+                output_schema=get_schema(schema_name) if schema_name else None,
+                use_case_key=use_case.key
+            )
+            if use_case.key == USE_CASE_KEY:
+                self.render_bulk_triage(use_case.system_prompt)
+            if use_case.key == SUMMARY_USE_CASE_KEY:
+                self.render_log_summarization(use_case.system_prompt)
+            if use_case.key == YARA_USE_CASE_KEY:
+                self.render_yara_validation(use_case.tab_name)
+
+get_tracer().instrument(TrendCybertronApp, "render", prefix="render_")
 
 def main():
     """Main function"""
-    app = TrendCybertronApp()
-    app.run()
+    # Session state exists before the app initializes it; until then the process defaults apply
+    tracing = st.session_state.get('tracing', {})
+    with get_tracer().trace("rerun", tracing.get('enabled'), tracing.get('profile_rate')) as trace:
+        app = TrendCybertronApp()
+        app.run()
+    if trace is not None:
+        st.session_state.last_trace = trace
 
 if __name__ == "__main__":
     main()
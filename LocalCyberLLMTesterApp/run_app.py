@@ -1,123 +1,315 @@
 #!/usr/bin/env python3
 """
 Trend Cybertron App Launcher
-Simple launcher script for the Streamlit application
+Simple launcher script for the Streamlit application: skips dependency installs
+that are already done, runs its preflight checks concurrently, waits for services
+by polling instead of sleeping, and prewarms the model while Streamlit starts
 """
 
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import shutil
 import subprocess
 import sys
-import os
+import threading
 import time
-import requests
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
 from pathlib import Path
 
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "llama-trendcybertron-primus-merged"
+STREAMLIT_PORT = os.environ.get("STREAMLIT_SERVER_PORT", "8501")
+INSTALL_STAMP = Path("database") / ".launcher_install.json"
+OLLAMA_START_TIMEOUT = float(os.environ.get("TREND_CYBERTRON_OLLAMA_START_TIMEOUT", "30"))
+STREAMLIT_START_TIMEOUT = float(os.environ.get("TREND_CYBERTRON_STREAMLIT_START_TIMEOUT", "60"))
+
+class StartupTimer:
+    def __init__(self):
+        """Wall-clock time of each startup phase"""
+        self.started_at = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        """Record how long a phase took"""
+        with self._lock:
+            self.phases[phase] = seconds
+
+    def timed(self, phase: str, func, *args, **kwargs):
+        """Run a phase and record its duration"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def report(self, title: str):
+        """Print the breakdown (phases ran concurrently, so they may add up to more than the total)"""
+        total = time.perf_counter() - self.started_at
+        with self._lock:
+            phases = dict(self.phases)
+        print(f"⏱️  {title} in {total:.1f}s")
+        for phase, seconds in phases.items():
+            print(f"   {phase:<28} {seconds:6.2f}s")
+
+def http_json(path: str, payload: dict = None, timeout: float = 5):
+    """GET (or POST `payload` to) an Ollama endpoint and decode the JSON answer"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(f"{OLLAMA_URL}{path}", data=data,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+def ollama_models(timeout: float = 5):
+    """Names of the models Ollama has, or None when it is not running (one /api/tags call)"""
+    try:
+        return {model['name'] for model in http_json("/api/tags", timeout=timeout).get('models', [])}
+    except (OSError, ValueError):
+        return None
+
 def check_ollama_running():
     """Check if Ollama is running"""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        return response.status_code == 200
-    except:
-        return False
+    return ollama_models() is not None
+
+def wait_until(check, timeout: float, initial: float = 0.05, factor: float = 1.6, max_interval: float = 1.0):
+    """Poll `check` with exponential backoff until it returns a truthy value or the deadline passes"""
+    deadline = time.monotonic() + timeout
+    interval = initial
+    while True:
+        result = check()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(max_interval, interval * factor)
+
+def required_models():
+    """The default model plus any listed in TREND_CYBERTRON_PULL_MODELS (comma-separated)"""
+    extra = os.environ.get("TREND_CYBERTRON_PULL_MODELS", "")
+    return list(dict.fromkeys([DEFAULT_MODEL] + [m.strip() for m in extra.split(",") if m.strip()]))
+
+def missing_models(models=None):
+    """Required models that Ollama does not have yet (`models`: names from an earlier /api/tags call)"""
+    if models is None:
+        models = ollama_models() or set()
+    # Ollama lists untagged models as name:latest
+    return [m for m in required_models() if m not in models and f"{m}:latest" not in models]
 
 def check_model_available():
     """Check if the Trend Cybertron model is available"""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            models = [model['name'] for model in data.get('models', [])]
-            return 'llama-trendcybertron-primus-merged' in models
-        return False
-    except:
-        return False
+    return not missing_models()
 
 def start_ollama():
-    """Start Ollama service"""
+    """Start Ollama service and wait until it answers; returns its model names"""
     print("🚀 Starting Ollama service...")
+    if shutil.which("ollama") is None:
+        print("❌ The ollama command was not found. Install it from https://ollama.ai/")
+        return None
     try:
         subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(5)  # Wait for service to start
-        return True
     except Exception as e:
         print(f"❌ Failed to start Ollama: {e}")
-        return False
+        return None
+    if not wait_until(lambda: ollama_models(timeout=1) is not None, OLLAMA_START_TIMEOUT):
+        print(f"❌ Ollama did not answer within {OLLAMA_START_TIMEOUT:.0f}s")
+        return None
+    return ollama_models()
+
+def ensure_ollama():
+    """Return Ollama's model names, starting the service first if it is not running"""
+    models = ollama_models()
+    if models is not None:
+        return models
+    print("⚠️  Ollama is not running. Attempting to start...")
+    return start_ollama()
+
+def pull_model(models=None):
+    """Pull models through the Ollama API with progress, in parallel, resuming after interruptions"""
+    sys.path.append(str(Path(__file__).resolve().parent / "utils"))
+    from model_pull import PullManager, watch
 
-def pull_model():
-    """Pull the Trend Cybertron model"""
-    print("📥 Pulling Trend Cybertron Primus 8B model...")
-    print("This may take several minutes depending on your internet connection...")
+    # Retries show up in the progress lines; keep their log warnings from breaking the redraw
+    logging.getLogger("model_pull").setLevel(logging.ERROR)
+    models = models or missing_models()
+    print(f"📥 Pulling {', '.join(models)}...")
+    print("Interrupted downloads resume where they stopped, also when the launcher is run again.")
+    manager = PullManager()
+    jobs = manager.pull(models, "localhost", "11434")
     try:
-        subprocess.run(["ollama", "pull", "llama-trendcybertron-primus-merged"], check=True)
-        print("✅ Model pulled successfully!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to pull model: {e}")
+        ok = watch(jobs)
+    except KeyboardInterrupt:
+        for job in jobs:
+            manager.cancel(job.model, "localhost", "11434")
+        print("\n⏸️  Pull cancelled; run the launcher again to resume.")
         return False
+    for job in jobs:
+        if job.status != "success":
+            print(f"❌ Failed to pull {job.model}: {job.error}")
+    if ok:
+        print("✅ Models pulled successfully!")
+    return ok
+
+def preload_model(model: str = DEFAULT_MODEL, timer: StartupTimer = None):
+    """Load the default model into Ollama memory so the first prompt does not pay the load time"""
+    sys.path.append(str(Path(__file__).resolve().parent / "utils"))
+    from model_residency import ModelResidencyManager
+
+    # Same request the app sends (keep_alive, num_ctx bucket), so its first prompt does not reload the model
+    logging.getLogger("model_residency").setLevel(logging.ERROR)
+    start = time.perf_counter()
+    try:
+        result = ModelResidencyManager().preload(model, "localhost", "11434")
+        if result['success']:
+            print(f"🧠 Model {model} loaded into memory with num_ctx {result['num_ctx']} "
+                  f"({result['load_duration']:.1f}s)")
+        else:
+            print(f"⚠️  Could not preload model: {result['error']}")
+    finally:
+        if timer is not None:
+            timer.record("model prewarm (background)", time.perf_counter() - start)
 
-def install_dependencies():
-    """Install required Python packages"""
+def requirement_names(path: str = "requirements.txt"):
+    """Distribution names listed in a requirements file (comments and options skipped)"""
+    names = []
+    for line in Path(path).read_text().splitlines():
+        match = re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)", line)
+        if match and not line.lstrip().startswith(("#", "-")):
+            names.append(match.group(1))
+    return names
+
+def environment_hash(path: str = "requirements.txt") -> str:
+    """Hash of the requirements file, the interpreter and the installed versions of the requirements"""
+    digest = hashlib.sha256(Path(path).read_bytes())
+    digest.update(f"{sys.executable}|{sys.version}|{platform.platform()}".encode())
+    for name in requirement_names(path):
+        try:
+            version = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            version = "missing"
+        digest.update(f"|{name.lower()}={version}".encode())
+    return digest.hexdigest()
+
+def install_dependencies(force: bool = False):
+    """Install required Python packages unless the same requirements are already installed here"""
+    current = environment_hash()
+    if not force and INSTALL_STAMP.exists():
+        try:
+            if json.loads(INSTALL_STAMP.read_text()).get('hash') == current:
+                print("✅ Dependencies unchanged since the last install; skipping pip")
+                return True
+        except (OSError, ValueError):
+            pass
     print("📦 Installing Python dependencies...")
     try:
         subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"], check=True)
         print("✅ Dependencies installed successfully!")
-        return True
     except subprocess.CalledProcessError as e:
         print(f"❌ Failed to install dependencies: {e}")
         return False
+    # Hash again: the installed versions are part of the environment
+    INSTALL_STAMP.parent.mkdir(parents=True, exist_ok=True)
+    INSTALL_STAMP.write_text(json.dumps({'hash': environment_hash(), 'installed_at': time.time()}))
+    return True
+
+def streamlit_ready() -> bool:
+    """Whether the Streamlit server answers its health check"""
+    for path in ("/_stcore/health", "/healthz"):
+        try:
+            with urllib.request.urlopen(f"http://localhost:{STREAMLIT_PORT}{path}", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            continue
+    return False
 
-def run_streamlit():
+def run_streamlit(timer: StartupTimer = None):
     """Run the Streamlit application"""
     print("🌐 Starting Trend Cybertron Streamlit App...")
+    if streamlit_ready():
+        print(f"❌ Port {STREAMLIT_PORT} is already serving an app; stop it or set STREAMLIT_SERVER_PORT")
+        return
     try:
-        subprocess.run([sys.executable, "-m", "streamlit", "run", "app.py"], check=True)
-    except subprocess.CalledProcessError as e:
+        # An explicit port makes Streamlit fail instead of moving to a free one the health check would miss
+        process = subprocess.Popen([sys.executable, "-m", "streamlit", "run", "app.py",
+                                    "--server.port", STREAMLIT_PORT])
+    except OSError as e:
         print(f"❌ Failed to start Streamlit: {e}")
+        return
+    if timer is not None:
+        def report_when_ready():
+            start = time.perf_counter()
+            if wait_until(lambda: process.poll() is not None or streamlit_ready(), STREAMLIT_START_TIMEOUT,
+                          initial=0.1) and process.poll() is None:
+                timer.record("streamlit boot", time.perf_counter() - start)
+                timer.report("App ready")
+        threading.Thread(target=report_when_ready, daemon=True).start()
+    try:
+        if process.wait() != 0:
+            print(f"❌ Streamlit exited with code {process.returncode}")
     except KeyboardInterrupt:
+        process.wait()
         print("\n👋 Application stopped by user")
 
 def main():
     """Main launcher function"""
+    timer = StartupTimer()
     print("=" * 60)
     print("🛡️  Trend Cybertron App Launcher")
     print("=" * 60)
     print()
-    
+
     # Check if we're in the right directory
     if not Path("app.py").exists():
         print("❌ Error: app.py not found. Please run this script from the TrendCybertronApp directory.")
         sys.exit(1)
-    
-    # Install dependencies
-    if not install_dependencies():
+
+    # Dependencies and Ollama are independent: check (and if needed install / start) both at once
+    force_install = "--reinstall" in sys.argv[1:]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        dependencies = executor.submit(timer.timed, "dependencies", install_dependencies, force_install)
+        ollama = executor.submit(timer.timed, "ollama", ensure_ollama)
+        dependencies_ok = dependencies.result()
+        models = ollama.result()
+
+    if not dependencies_ok:
         print("❌ Failed to install dependencies. Please install manually:")
         print("   pip install -r requirements.txt")
         sys.exit(1)
-    
-    # Check Ollama
-    if not check_ollama_running():
-        print("⚠️  Ollama is not running. Attempting to start...")
-        if not start_ollama():
-            print("❌ Failed to start Ollama. Please start manually:")
-            print("   ollama serve")
-            sys.exit(1)
-    
-    # Check model
-    if not check_model_available():
-        print("⚠️  Trend Cybertron model not found. Attempting to pull...")
-        if not pull_model():
+
+    if models is None:
+        print("❌ Failed to start Ollama. Please start manually:")
+        print("   ollama serve")
+        sys.exit(1)
+
+    # Check model (from the model list fetched above, without asking Ollama again)
+    missing = missing_models(models)
+    if missing:
+        print(f"⚠️  Model(s) not found: {', '.join(missing)}. Attempting to pull...")
+        if not timer.timed("model pull", pull_model, missing):
             print("❌ Failed to pull model. Please pull manually:")
-            print("   ollama pull llama-trendcybertron-primus-merged")
+            print(f"   python utils/model_pull.py {' '.join(missing)}")
             sys.exit(1)
-    
-    print("✅ All prerequisites are ready!")
+
+    # Load the model while Streamlit starts instead of on the first prompt
+    threading.Thread(target=preload_model, kwargs={'timer': timer}, daemon=True).start()
+
+    timer.report("Prerequisites ready")
     print()
     print("🌐 Starting the application...")
-    print("📱 The app will open in your default browser at http://localhost:8501")
+    print(f"📱 The app will open in your default browser at http://localhost:{STREAMLIT_PORT}")
     print("🛑 Press Ctrl+C to stop the application")
     print()
-    
+
     # Run the Streamlit app
-    run_streamlit()
+    run_streamlit(timer)
 
 if __name__ == "__main__":
     main()
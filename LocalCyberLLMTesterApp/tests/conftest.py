@@ -0,0 +1,13 @@
+"""
+Test configuration for Trend Cybertron App
+Makes the utils modules importable the same way app.py does
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "utils"))
+
+def pytest_configure(config):
+    """Register the markers used by the suite"""
+    config.addinivalue_line("markers", "slow: large generated inputs (deselect with -m 'not slow')")
@@ -0,0 +1,58 @@
+"""
+Tests for alert deduplication
+"""
+
+import pytest
+
+from alert_dedup import benchmark, cluster_alerts, normalize_alert
+
+LOGON = {
+    'rule': "Windows logon",
+    'host': "WS-0001",
+    'user': "bob",
+    'message': "EventCode=4624 user=bob from 10.1.2.3:50123 dst_port=3389 pid=4412 at 2025-01-01T10:00:00Z"
+}
+
+def variant(**changes):
+    """The logon alert with parts of its message replaced"""
+    alert = dict(LOGON)
+    for old, new in changes.get('message', {}).items():
+        alert['message'] = alert['message'].replace(old, new)
+    alert.update({key: value for key, value in changes.items() if key != 'message'})
+    return alert
+
+def test_volatile_values_are_masked():
+    other = variant(host="WS-0999", user="alice",
+                    message={"bob": "alice", "10.1.2.3:50123": "10.9.9.9:40000", "4412": "99",
+                             "2025-01-01T10:00:00Z": "2025-02-01T11:00:00Z"})
+    assert normalize_alert(other) == normalize_alert(LOGON)
+
+def test_event_codes_and_ports_are_kept():
+    text = normalize_alert(LOGON)
+    assert "eventcode=4624" in text
+    assert "dst_port=3389" in text
+
+def test_alerts_differing_in_event_code_or_port_stay_apart():
+    alerts = [
+        LOGON,
+        variant(message={"4624": "4625"}),
+        variant(message={"dst_port=3389": "dst_port=22"}),
+        variant(host="WS-0999", message={"4412": "99"})
+    ]
+    labels = cluster_alerts(alerts).labels.tolist()
+    assert labels[0] == labels[3]
+    assert len({labels[0], labels[1], labels[2]}) == 3
+
+@pytest.fixture(scope="module")
+def synthetic_stats():
+    """Benchmark figures on 20,000 synthetic alerts (60 alert types plus 2% one-offs)"""
+    return benchmark(20_000)
+
+def test_synthetic_reduction_floor(synthetic_stats):
+    assert synthetic_stats['reduction'] >= 30
+
+def test_synthetic_purity_floor(synthetic_stats):
+    assert synthetic_stats['purity'] >= 0.99
+
+def test_synthetic_templates_never_merge(synthetic_stats):
+    assert synthetic_stats['mixed_clusters'] == 0
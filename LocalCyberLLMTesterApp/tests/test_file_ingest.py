@@ -0,0 +1,73 @@
+"""
+Tests for file ingestion
+"""
+
+import json
+
+import pytest
+
+from file_ingest import benchmark, detect_format, ingest_file, iter_csv, iter_json, iter_jsonl, iter_records
+
+RECORDS = [
+    {'id': 1, 'severity': "High", 'rule': {'name': "Brute force", 'tags': ["T1110", "ssh"]}},
+    {'id': 22, 'severity': "Low", 'message': 'quoted "value", with [brackets] and {braces}'},
+    {'id': 333, 'score': 9.75, 'kev': True, 'fixed': None},
+    {'id': 4444, 'note': "ünicode – text"}
+]
+
+def write(path, text, encoding="utf-8"):
+    path.write_text(text, encoding=encoding)
+    return str(path)
+
+def test_top_level_array(tmp_path):
+    path = write(tmp_path / "alerts.json", json.dumps(RECORDS, indent=2))
+    assert list(iter_json(path)) == RECORDS
+
+def test_results_wrapper(tmp_path):
+    document = {'meta': {'source': "siem", 'count': 4}, 'results': RECORDS, 'next': None}
+    path = write(tmp_path / "alerts.json", json.dumps(document))
+    assert list(iter_json(path)) == RECORDS
+
+def test_object_without_record_array(tmp_path):
+    path = write(tmp_path / "config.json", json.dumps({'name': "policy", 'rules': {'a': 1}}))
+    assert list(iter_json(path)) == [{'name': "policy", 'rules': {'a': 1}}]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16])
+def test_records_split_across_read_chunks(tmp_path, chunk_size):
+    # Bare numbers at the end of a chunk must not be cut short
+    records = RECORDS + [1234567, 8.5e3, "tail"]
+    path = write(tmp_path / "alerts.json", json.dumps({'meta': {}, 'results': records}))
+    assert list(iter_json(path, chunk_size=chunk_size)) == records
+
+def test_malformed_jsonl_lines_are_skipped(tmp_path):
+    lines = [json.dumps(RECORDS[0]), "", "{not json", json.dumps(RECORDS[1]), "   ", '{"id": 3,', json.dumps(RECORDS[2])]
+    path = write(tmp_path / "alerts.jsonl", "\n".join(lines) + "\n")
+    assert list(iter_jsonl(path)) == [RECORDS[0], RECORDS[1], RECORDS[2]]
+
+def test_csv_byte_order_mark(tmp_path):
+    path = write(tmp_path / "alerts.csv", "severity,host\nHigh,ws-01\nLow,ws-02\n", encoding="utf-8-sig")
+    assert list(iter_csv(path)) == [{'severity': "High", 'host': "ws-01"}, {'severity': "Low", 'host': "ws-02"}]
+
+def test_format_detection_without_extension(tmp_path):
+    assert detect_format(write(tmp_path / "a", json.dumps(RECORDS))) == "json"
+    assert detect_format(write(tmp_path / "b", "\n".join(json.dumps(r) for r in RECORDS))) == "jsonl"
+    assert detect_format(write(tmp_path / "c", "severity,host\nHigh,ws-01\n")) == "csv"
+    assert len(list(iter_records(str(tmp_path / "b")))) == len(RECORDS)
+
+def test_digest_keeps_use_case_fields(tmp_path):
+    path = write(tmp_path / "alerts.jsonl", "\n".join(json.dumps(r) for r in RECORDS))
+    result = ingest_file(path, "alert_prioritization", cache_dir=str(tmp_path / "cache"))
+    assert result['records'] == len(RECORDS)
+    assert "severity=High" in result['text']
+    assert "rule.name=Brute force" in result['text']
+    assert ingest_file(path, "alert_prioritization", cache_dir=str(tmp_path / "cache"))['cached']
+
+@pytest.mark.slow
+@pytest.mark.parametrize("file_format", ["jsonl", "json", "csv"])
+def test_large_file_memory_is_bounded(tmp_path, file_format):
+    pytest.importorskip("resource")
+    megabytes = 128
+    stats = benchmark(megabytes, file_format, directory=str(tmp_path))
+    assert stats['records'] > 250000
+    # Streaming keeps peak memory far below the file size
+    assert stats['rss_growth_mb'] < megabytes / 4
@@ -0,0 +1,83 @@
+"""
+Smoke tests for OllamaClient against the mock inference server
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from mock_server import MockInferenceServer, MockServerConfig
+from ollama_client import OllamaClient
+
+MODEL = "llama-trendcybertron-primus-merged"
+PROVIDERS = ["Ollama", "LM Studio"]
+
+def start_server(**options) -> MockInferenceServer:
+    """A fast mock server on a free port"""
+    settings = dict(ttft=0.01, tokens_per_second=2000, response_tokens=24, load_delay=0, seed=1)
+    settings.update(options)
+    return MockInferenceServer(MockServerConfig(**settings), port=0).start()
+
+@pytest.fixture
+def server():
+    server = start_server()
+    yield server
+    server.stop()
+
+def generate(server, **kwargs):
+    return OllamaClient().generate_response("Summarize the alert", model=MODEL, host=server.host,
+                                            port=str(server.port), **kwargs)
+
+@pytest.mark.parametrize("provider", PROVIDERS)
+def test_generate_response(server, provider):
+    result = generate(server, provider=provider)
+    assert 'error' not in result
+    assert len(result['response'].split()) == 24
+    assert result['eval_count'] == 24
+
+@pytest.mark.parametrize("provider", PROVIDERS)
+def test_stream_response_matches_generate(server, provider):
+    chunks = list(OllamaClient().stream_response("Summarize the alert", model=MODEL, host=server.host,
+                                                 port=str(server.port), provider=provider))
+    assert chunks
+    assert not any(chunk.startswith("Error:") for chunk in chunks)
+    assert "".join(chunks) == generate(server, provider=provider)['response']
+    assert server.get_stats()['streams'] >= 1
+
+@pytest.mark.parametrize("provider", PROVIDERS)
+def test_injected_failure_is_retried(provider):
+    # With this seed the first generation fails and the second succeeds
+    server = start_server(error_rate=0.5, seed=3)
+    try:
+        result = generate(server, provider=provider, max_retries=3)
+        assert 'error' not in result
+        assert server.get_stats()['injected_errors'] == 1
+    finally:
+        server.stop()
+
+def test_persistent_failure_gives_up_after_retries():
+    server = start_server(error_rate=1.0)
+    try:
+        result = generate(server, max_retries=2)
+        assert "status 500" in result['error']
+        assert server.get_stats()['injected_errors'] == 2
+    finally:
+        server.stop()
+
+def test_full_queue_returns_503():
+    server = start_server(slots=1, max_queue=0, ttft=0.5)
+    try:
+        busy = threading.Thread(target=requests.post, args=(f"{server.url}/api/generate",),
+                                kwargs={'json': {'model': MODEL, 'prompt': "hold the slot", 'stream': False}})
+        busy.start()
+        # Wait until the first request holds the only slot
+        while server.backend.in_flight == 0:
+            time.sleep(0.01)
+        response = requests.post(f"{server.url}/api/generate", json={'model': MODEL, 'prompt': "x", 'stream': False})
+        busy.join()
+        assert response.status_code == 503
+        assert server.get_stats()['rejected'] == 1
+    finally:
+        server.stop()
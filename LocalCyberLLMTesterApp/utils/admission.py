@@ -0,0 +1,412 @@
+"""
+Admission Control for Trend Cybertron App
+Limits concurrent requests per backend to its parallel slots and schedules
+the overflow by priority class: interactive chats jump ahead (with reserved
+slots), batch and background work share the rest by weight, long waits age
+up a class, sessions within a class are served round-robin, and a full
+queue rejects fast
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Any, Optional
+import logging
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOTS = int(os.environ.get("TREND_CYBERTRON_BACKEND_SLOTS", os.environ.get("OLLAMA_NUM_PARALLEL", "4")))
+DEFAULT_MAX_QUEUE = int(os.environ.get("TREND_CYBERTRON_MAX_QUEUE", "16"))
+# Slots only interactive requests may use, so a batch run never fills the backend
+DEFAULT_RESERVED_SLOTS = int(os.environ.get("TREND_CYBERTRON_INTERACTIVE_SLOTS", "1"))
+# Seconds a waiting request spends in a class before it is promoted to the next one up
+DEFAULT_AGING_SECONDS = float(os.environ.get("TREND_CYBERTRON_AGING_SECONDS", "30"))
+
+# Highest priority first
+PRIORITIES = ("interactive", "batch", "background")
+# Share of the unreserved slots batch and background get while both are waiting
+CLASS_WEIGHTS = {"batch": 4, "background": 1}
+
+_metrics = get_registry()
+ADMISSION_WAIT = _metrics.histogram(
+    "trendcybertron_admission_wait_seconds", "Time requests spent queued for a backend slot", ("backend",))
+ADMISSION_REJECTED = _metrics.counter(
+    "trendcybertron_admission_rejected_total", "Requests rejected by admission control", ("backend", "reason"))
+QUEUE_DEPTH = _metrics.gauge(
+    "trendcybertron_admission_queue_depth", "Requests waiting for a backend slot", ("backend",))
+IN_FLIGHT = _metrics.gauge(
+    "trendcybertron_admission_in_flight", "Requests running on a backend", ("backend",))
+SLOTS = _metrics.gauge(
+    "trendcybertron_admission_slots", "Parallel slots allowed per backend", ("backend",))
+CLASS_WAIT = _metrics.histogram(
+    "trendcybertron_scheduler_wait_seconds", "Time requests spent queued, by priority class",
+    ("backend", "priority"))
+CLASS_QUEUE_DEPTH = _metrics.gauge(
+    "trendcybertron_scheduler_queue_depth", "Requests waiting for a backend slot, by priority class",
+    ("backend", "priority"))
+CLASS_IN_FLIGHT = _metrics.gauge(
+    "trendcybertron_scheduler_in_flight", "Requests running on a backend, by priority class",
+    ("backend", "priority"))
+CLASS_PROMOTIONS = _metrics.counter(
+    "trendcybertron_scheduler_promotions_total", "Waiting requests aged up into a priority class",
+    ("backend", "priority"))
+
+class BackendBusyError(Exception):
+    """Raised when a backend's wait queue is full or the wait timed out"""
+
+    def __init__(self, backend: str, message: str):
+        super().__init__(message)
+        self.backend = backend
+
+class _Waiter:
+    def __init__(self, session_id: str, priority: str):
+        self.session_id = session_id
+        # Requested class; `priority` is the class it currently waits in
+        self.base_priority = priority
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.class_entered_at = self.enqueued_at
+
+def check_priority(priority: str) -> str:
+    """Validate a priority class name"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {priority}. Use one of {PRIORITIES}.")
+    return priority
+
+class BackendLimiter:
+    def __init__(self, name: str, slots: int = DEFAULT_SLOTS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 wait_history: int = 500, reserved_slots: int = DEFAULT_RESERVED_SLOTS,
+                 aging_seconds: float = DEFAULT_AGING_SECONDS):
+        """Initialize a concurrency limiter for a single backend
+
+        `max_queue` bounds each priority class separately, so queued batch
+        work can never get an interactive request rejected.
+        """
+        self.name = name
+        self.slots = max(1, int(slots))
+        self.max_queue = max(0, int(max_queue))
+        self.reserved_slots = max(0, int(reserved_slots))
+        self.aging_seconds = aging_seconds
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._class_in_flight = dict.fromkeys(PRIORITIES, 0)
+        # priority -> session_id -> FIFO of waiters; sessions of a class are served round-robin
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._class_queued = dict.fromkeys(PRIORITIES, 0)
+        self._queued = 0
+        # Stride scheduling between batch and background: the class with the lowest pass goes next
+        self._pass = dict.fromkeys(CLASS_WEIGHTS, 0.0)
+        self._waits = deque(maxlen=wait_history)
+        self._class_waits = {p: deque(maxlen=wait_history) for p in PRIORITIES}
+        self._class_admitted = dict.fromkeys(PRIORITIES, 0)
+        self._class_promoted = dict.fromkeys(PRIORITIES, 0)
+        self.total_admitted = 0
+        self.total_rejected = 0
+        self.total_timeouts = 0
+        self.max_queue_depth = 0
+
+    def _shared_slots(self) -> int:
+        """Slots batch and background work may use (at least one is always left to them)"""
+        return max(1, self.slots - self.reserved_slots)
+
+    def _limit(self, priority: str) -> int:
+        """Slots a request of this class may start in"""
+        return self.slots if priority == "interactive" else self._shared_slots()
+
+    def _enqueue(self, waiter: _Waiter):
+        """Add a waiter to the back of its session's queue in its current class"""
+        queues = self._queues[waiter.priority]
+        if waiter.priority in self._pass and not queues:
+            # A class that was idle joins at the current pass instead of with banked credit
+            active = [self._pass[p] for p in self._pass if self._queues[p]]
+            if active:
+                self._pass[waiter.priority] = max(self._pass[waiter.priority], min(active))
+        queues.setdefault(waiter.session_id, deque()).append(waiter)
+        self._class_queued[waiter.priority] += 1
+        self._queued += 1
+
+    def _position(self, waiter: _Waiter) -> int:
+        """Approximate 1-based dispatch position: every waiter of a higher class, then round-robin order"""
+        position = 0
+        for priority in PRIORITIES:
+            if priority == waiter.priority:
+                break
+            position += self._class_queued[priority]
+        sessions = list(self._queues[waiter.priority].values())
+        depth = 0
+        while True:
+            progressed = False
+            for queue in sessions:
+                if depth < len(queue):
+                    progressed = True
+                    position += 1
+                    if queue[depth] is waiter:
+                        return position
+            if not progressed:
+                return position
+            depth += 1
+
+    def _dequeue(self, waiter: _Waiter):
+        """Remove a waiter that gave up"""
+        queues = self._queues[waiter.priority]
+        queue = queues.get(waiter.session_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._class_queued[waiter.priority] -= 1
+            self._queued -= 1
+            if not queue:
+                del queues[waiter.session_id]
+
+    def _promote(self):
+        """Move waiters that have waited aging_seconds in a class up to the next class"""
+        if not self.aging_seconds or self.aging_seconds <= 0:
+            return
+        now = time.monotonic()
+        for higher, priority in zip(PRIORITIES, PRIORITIES[1:]):
+            queues = self._queues[priority]
+            for session_id in list(queues):
+                queue = queues[session_id]
+                # Each session's queue is FIFO, so the oldest waiters are at the front
+                while queue and now - queue[0].class_entered_at >= self.aging_seconds:
+                    waiter = queue.popleft()
+                    self._class_queued[priority] -= 1
+                    self._queued -= 1
+                    waiter.priority = higher
+                    waiter.class_entered_at = now
+                    self._enqueue(waiter)
+                    self._class_promoted[higher] += 1
+                    CLASS_PROMOTIONS.inc(backend=self.name, priority=higher)
+                if not queue:
+                    del queues[session_id]
+
+    def _pop(self, priority: str, interactive_only: bool = False) -> Optional[_Waiter]:
+        """Take the next waiter of a class in round-robin session order"""
+        queues = self._queues[priority]
+        for session_id in list(queues):
+            queue = queues[session_id]
+            # Reserved slots only go to requests that asked for interactive, not aged-up work
+            if interactive_only and queue[0].base_priority != "interactive":
+                continue
+            waiter = queue.popleft()
+            del queues[session_id]
+            if queue:
+                # Session still has work waiting; it goes to the back of the line
+                queues[session_id] = queue
+            self._class_queued[priority] -= 1
+            self._queued -= 1
+            return waiter
+        return None
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Pick who gets a free slot: interactive first, then batch and background by weight"""
+        shared_free = self._in_flight < self._shared_slots()
+        waiter = self._pop("interactive", interactive_only=not shared_free)
+        if waiter is not None or not shared_free:
+            return waiter
+        active = [p for p in CLASS_WEIGHTS if self._queues[p]]
+        if not active:
+            return None
+        priority = min(active, key=lambda p: self._pass[p])
+        self._pass[priority] += 1.0 / CLASS_WEIGHTS[priority]
+        return self._pop(priority)
+
+    def _admit(self, waiter: _Waiter):
+        """Count a waiter as running"""
+        self._in_flight += 1
+        self._class_in_flight[waiter.base_priority] += 1
+        waiter.granted = True
+
+    def _grant_next(self):
+        """Hand free slots to the next waiters in priority order"""
+        self._promote()
+        while self._queued and self._in_flight < self.slots:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._admit(waiter)
+            waiter.event.set()
+
+    def _record_wait(self, priority: str, waited: float):
+        """Record an admitted request's wait overall and for its class"""
+        self.total_admitted += 1
+        self._class_admitted[priority] += 1
+        self._waits.append(waited)
+        self._class_waits[priority].append(waited)
+        ADMISSION_WAIT.observe(waited, backend=self.name)
+        CLASS_WAIT.observe(waited, backend=self.name, priority=priority)
+
+    def acquire(self, session_id: str = None, timeout: float = None,
+                on_queued: Callable[[int], None] = None, poll_interval: float = 0.5,
+                priority: str = "interactive") -> float:
+        """Acquire a slot, waiting in the priority queue if needed; returns seconds waited"""
+        session_id = session_id or "anonymous"
+        check_priority(priority)
+        with self._lock:
+            waiter = _Waiter(session_id, priority)
+            if self._in_flight < self._limit(priority) and not self._class_queued[priority] and (
+                    priority == "interactive" or not self._class_queued["interactive"]):
+                # Nobody this request would have to wait behind
+                self._admit(waiter)
+                self._record_wait(priority, 0.0)
+                return 0.0
+            if self._class_queued[priority] >= self.max_queue:
+                self.total_rejected += 1
+                ADMISSION_REJECTED.inc(backend=self.name, reason="queue_full")
+                raise BackendBusyError(
+                    self.name,
+                    f"Backend {self.name} is busy ({self._in_flight} running, "
+                    f"{self._class_queued[priority]} {priority} requests queued). Try again shortly."
+                )
+            self._enqueue(waiter)
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+            self._grant_next()
+            position = None if waiter.granted else self._position(waiter)
+
+        deadline = None if timeout is None else waiter.enqueued_at + timeout
+        last_position = None
+        while True:
+            if on_queued is not None and position is not None and position != last_position:
+                on_queued(position)
+                last_position = position
+            wait_for = poll_interval
+            if deadline is not None:
+                wait_for = min(wait_for, max(0.0, deadline - time.monotonic()))
+            waiter.event.wait(wait_for)
+            with self._lock:
+                if waiter.granted:
+                    waited = time.monotonic() - waiter.enqueued_at
+                    self._record_wait(priority, waited)
+                    return waited
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._dequeue(waiter)
+                    self.total_timeouts += 1
+                    ADMISSION_REJECTED.inc(backend=self.name, reason="timeout")
+                    raise BackendBusyError(self.name, f"Timed out waiting for a slot on backend {self.name}")
+                # Aging happens on the clock, not only when a slot frees up
+                self._grant_next()
+                if waiter.granted:
+                    continue
+                position = self._position(waiter)
+
+    def release(self, priority: str = "interactive"):
+        """Release a slot and admit the next waiter"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._class_in_flight[priority] = max(0, self._class_in_flight[priority] - 1)
+            self._grant_next()
+
+    def set_slots(self, slots: int):
+        """Change the number of parallel slots"""
+        with self._lock:
+            self.slots = max(1, int(slots))
+            self._grant_next()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth and wait-time statistics, overall and per priority class"""
+        with self._lock:
+            waits = sorted(self._waits)
+            in_flight = self._in_flight
+            queued = self._queued
+            sessions_waiting = sum(len(queues) for queues in self._queues.values())
+            classes = {}
+            for priority in PRIORITIES:
+                class_waits = sorted(self._class_waits[priority])
+                classes[priority] = {
+                    'queue_depth': self._class_queued[priority],
+                    'in_flight': self._class_in_flight[priority],
+                    'admitted': self._class_admitted[priority],
+                    'promoted_in': self._class_promoted[priority],
+                    'avg_wait_seconds': round(sum(class_waits) / len(class_waits), 3) if class_waits else 0.0,
+                    'p95_wait_seconds': (round(class_waits[int(0.95 * (len(class_waits) - 1))], 3)
+                                         if class_waits else 0.0)
+                }
+        return {
+            'backend': self.name,
+            'slots': self.slots,
+            'reserved_slots': min(self.reserved_slots, self.slots - 1),
+            'in_flight': in_flight,
+            'queue_depth': queued,
+            'max_queue': self.max_queue,
+            'sessions_waiting': sessions_waiting,
+            'max_queue_depth_seen': self.max_queue_depth,
+            'total_admitted': self.total_admitted,
+            'total_rejected': self.total_rejected,
+            'total_timeouts': self.total_timeouts,
+            'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'p95_wait_seconds': round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+            'classes': classes
+        }
+
+class AdmissionController:
+    def __init__(self, default_slots: int = DEFAULT_SLOTS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 queue_timeout: float = None):
+        """Initialize per-backend admission control"""
+        self.default_slots = default_slots
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._limiters: Dict[str, BackendLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, host: str, port: str) -> BackendLimiter:
+        """Get (or create) the limiter for a backend"""
+        name = f"{host}:{port}"
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(name)
+                if limiter is None:
+                    limiter = BackendLimiter(name, self.default_slots, self.max_queue)
+                    self._limiters[name] = limiter
+        return limiter
+
+    def set_slots(self, host: str, port: str, slots: int):
+        """Match a backend's limit to its server-side parallel slots"""
+        self.limiter(host, port).set_slots(slots)
+
+    @contextmanager
+    def slot(self, host: str, port: str, session_id: str = None,
+             on_queued: Callable[[int], None] = None, timeout: float = None,
+             priority: str = "interactive"):
+        """Hold a backend slot for the duration of a request; yields seconds spent queued"""
+        limiter = self.limiter(host, port)
+        waited = limiter.acquire(session_id, timeout if timeout is not None else self.queue_timeout, on_queued,
+                                 priority=priority)
+        try:
+            yield waited
+        finally:
+            limiter.release(priority)
+
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        """Metrics for every backend seen so far"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.get_metrics() for limiter in limiters]
+
+    def collect_metrics(self):
+        """Publish queue depth, in-flight requests and slots as gauges (runs at scrape time)"""
+        for metrics in self.get_metrics():
+            QUEUE_DEPTH.set(metrics['queue_depth'], backend=metrics['backend'])
+            IN_FLIGHT.set(metrics['in_flight'], backend=metrics['backend'])
+            SLOTS.set(metrics['slots'], backend=metrics['backend'])
+            for priority, stats in metrics['classes'].items():
+                CLASS_QUEUE_DEPTH.set(stats['queue_depth'], backend=metrics['backend'], priority=priority)
+                CLASS_IN_FLIGHT.set(stats['in_flight'], backend=metrics['backend'], priority=priority)
+
+_default_controller = None
+_default_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """Get the process-wide admission controller shared by all sessions"""
+    global _default_controller
+    if _default_controller is None:
+        with _default_lock:
+            if _default_controller is None:
+                _default_controller = AdmissionController()
+                _metrics.register_collector(_default_controller.collect_metrics)
+    return _default_controller
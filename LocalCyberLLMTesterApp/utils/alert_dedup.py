@@ -0,0 +1,313 @@
+"""
+Alert Deduplication for Trend Cybertron App
+Collapses near-duplicate alerts before triage: alerts are normalized (IPs,
+timestamps, usernames, hosts, hashes and volatile counters masked; event
+codes, ports and rule ids kept), reduced to MinHash
+signatures and grouped with locality-sensitive hashing, all as vectorized
+numpy operations. The model sees one representative per cluster and its
+verdict is applied to every member
+"""
+
+import functools
+import re
+import zlib
+from typing import Dict, Iterable, List, Any, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+SHINGLE_SIZE = 2
+# Shingles hashed per numpy chunk (bounds the permutation matrix to ~64 MB)
+_CHUNK_SHINGLES = 131072
+
+# Fields that differ between otherwise identical alerts
+_IGNORED_KEY = re.compile(r"^(id|alert_id|event_id|uuid|@timestamp|timestamp|time|date|ts|created_at|updated_at)$"
+                          r"|(_time|_timestamp|_date|_ts)$", re.IGNORECASE)
+_USER_KEY = re.compile(r"(^|_)(user|username|user_name|account|login|principal)$", re.IGNORECASE)
+# Fields whose value changes from one occurrence to the next without changing what the alert means.
+# Other numbers stay: an event code, port or rule id is what tells two alerts apart
+_VOLATILE_KEY = re.compile(r"(^|_)(host|hostname|computer|device|pid|ppid|process_id|session_id|count|bytes|size"
+                           r"|duration|seq|sequence)$", re.IGNORECASE)
+
+# One alternation, so each alert is scanned once; earlier alternatives win at the same position.
+# Lookbehinds keep the open-ended patterns from being retried inside every word
+_MASK = re.compile("|".join([
+    r"(?P<ts>\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?\b"
+    r"|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\b"
+    r"|\b\d{1,2}:\d{2}:\d{2}(?:\.\d+)?\b)",
+    r"(?P<email>(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b)",
+    r"(?P<ip>\b(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?\b|\b(?:[0-9a-f]{1,4}:+){2,7}[0-9a-f]{1,4}\b)",
+    r"(?P<guid>\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b)",
+    r"(?P<hash>\b[0-9a-f]{32,128}\b)",
+    r"(?P<userkv>\b(?:user(?:name)?|account|login)[=:]\s*)[\"']?[\w.$\\-]+",
+    r"(?P<user>(?<![\w-])[\w-]+\\[\w.$-]+)",
+    r"(?P<nkv>\b(?:pid|ppid|count|bytes|size|duration|seq)[=:]\s*)\d+\b",
+    # Epoch times and record ids; codes, ports and rule ids are shorter
+    r"(?P<n>\b\d{10,}\b)"
+]), re.IGNORECASE)
+_TOKEN = re.compile(r"<\w+>|\w+")
+# Numbers left after masking (event codes, ports, rule ids) must match exactly, not just be similar
+_KEPT_NUMBER = re.compile(r"\b\d+\b")
+
+def _mask(match: re.Match) -> str:
+    """Placeholder for one masked value"""
+    if match.lastgroup == "userkv":
+        return f"{match.group('userkv')}<user>"
+    if match.lastgroup == "nkv":
+        return f"{match.group('nkv')}<n>"
+    return f"<{match.lastgroup}>"
+
+@functools.lru_cache(maxsize=65536)
+def normalize_text(text: str) -> str:
+    """Mask the volatile parts of an alert's text (cached: field values such as rule names repeat a lot)"""
+    return " ".join(_MASK.sub(_mask, text).lower().split())
+
+@functools.lru_cache(maxsize=1024)
+def _ignored_key(key: str) -> bool:
+    """Whether a field is dropped before comparison"""
+    return bool(_IGNORED_KEY.search(key))
+
+@functools.lru_cache(maxsize=1024)
+def _user_key(key: str) -> bool:
+    """Whether a field holds a username"""
+    return bool(_USER_KEY.search(key))
+
+@functools.lru_cache(maxsize=1024)
+def _volatile_key(key: str) -> bool:
+    """Whether a field holds a per-occurrence value such as a host, pid or byte count"""
+    return bool(_VOLATILE_KEY.search(key))
+
+def normalize_alert(alert: Dict[str, Any]) -> str:
+    """Canonical text of an alert: ids and timestamps dropped, users and other volatile values masked"""
+    parts = []
+    for key in sorted(alert):
+        if _ignored_key(key):
+            continue
+        if _user_key(key):
+            value = "<user>"
+        elif _volatile_key(key):
+            value = "<var>"
+        else:
+            value = normalize_text(str(alert[key]))
+        parts.append(f"{key.lower()}={value}")
+    return "; ".join(parts)
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """32-bit hashes of the token n-grams of a normalized text"""
+    tokens = _TOKEN.findall(text)
+    if len(tokens) <= size:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+
+def minhash_signatures(texts: List[str], num_perm: int = DEFAULT_NUM_PERM, seed: int = 1) -> np.ndarray:
+    """MinHash signatures (len(texts) x num_perm, uint32) computed with vectorized multiply-shift hashing"""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+
+    start = 0
+    while start < len(texts):
+        hashes, lengths = [], []
+        end = start
+        while end < len(texts) and len(hashes) < _CHUNK_SHINGLES:
+            shingles = shingle_hashes(texts[end])
+            hashes.extend(shingles)
+            lengths.append(len(shingles))
+            end += 1
+        values = np.asarray(hashes, dtype=np.uint64)[:, None]
+        # (a * x + b) mod 2^64, keeping the high 32 bits: one universal hash per permutation
+        with np.errstate(over="ignore"):
+            permuted = ((values * multipliers + offsets) >> np.uint64(32)).astype(np.uint32)
+        boundaries = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures[start:end] = np.minimum.reduceat(permuted, boundaries, axis=0)
+        start = end
+    return signatures
+
+def number_keys(texts: List[str]) -> np.ndarray:
+    """Hash of the numbers in each normalized text; only texts with equal keys may share a cluster"""
+    return np.fromiter((zlib.crc32(" ".join(_KEPT_NUMBER.findall(text)).encode("utf-8")) for text in texts),
+                       dtype=np.int64, count=len(texts))
+
+def lsh_clusters(signatures: np.ndarray, bands: int = DEFAULT_BANDS, threshold: float = DEFAULT_THRESHOLD,
+                 partitions: np.ndarray = None) -> np.ndarray:
+    """Root row of each signature's cluster: rows sharing any LSH band are joined, then checked against the root
+
+    With `partitions`, rows are only joined with rows of the same partition.
+    """
+    count, num_perm = signatures.shape
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    rows = num_perm // bands
+    rng = np.random.default_rng(7)
+    mixers = rng.integers(1, 2 ** 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    bucket_ids = []
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * mixers).sum(axis=1)
+            if partitions is not None:
+                keys = np.stack([keys.astype(np.int64), partitions], axis=1)
+            bucket_ids.append(np.unique(keys, axis=0 if partitions is not None else None,
+                                        return_inverse=True)[1].ravel())
+
+    # Connected components by min-label propagation with pointer jumping
+    labels = np.arange(count)
+    while True:
+        previous = labels.copy()
+        for inverse in bucket_ids:
+            bucket_min = np.full(inverse.max() + 1, count, dtype=np.int64)
+            np.minimum.at(bucket_min, inverse, labels)
+            labels = np.minimum(labels, bucket_min[inverse])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+
+    # Band collisions chain; members that are not actually close to the root become singletons
+    similarity = (signatures == signatures[labels]).mean(axis=1)
+    far = similarity < threshold
+    labels[far] = np.arange(count)[far]
+    return labels
+
+class AlertClustering:
+    def __init__(self, labels: np.ndarray, representatives: np.ndarray):
+        """Cluster id per alert and the representative alert index per cluster"""
+        self.labels = labels
+        self.representatives = representatives
+        self.counts = np.bincount(labels, minlength=len(representatives))
+        self._order = None
+
+    def __len__(self) -> int:
+        return len(self.representatives)
+
+    def members(self, cluster: int) -> np.ndarray:
+        """Alert indexes in a cluster, in file order"""
+        if self._order is None:
+            self._order = np.argsort(self.labels, kind="stable")
+            self._starts = np.concatenate(([0], np.cumsum(self.counts)))
+        return self._order[self._starts[cluster]:self._starts[cluster + 1]]
+
+    def expand(self, verdicts: Dict[int, Any]) -> Dict[int, Any]:
+        """Apply per-cluster verdicts to every member alert"""
+        return {int(index): verdicts[cluster] for cluster in verdicts for index in self.members(cluster)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sizes before and after deduplication"""
+        alerts = int(self.counts.sum())
+        return {
+            'alerts': alerts,
+            'clusters': len(self),
+            'reduction': round(alerts / len(self), 1) if len(self) else 0.0,
+            'largest_cluster': int(self.counts.max()) if len(self) else 0
+        }
+
+def cluster_texts(texts: Iterable[str],
+                  threshold: float = DEFAULT_THRESHOLD,
+                  num_perm: int = DEFAULT_NUM_PERM,
+                  bands: int = DEFAULT_BANDS) -> AlertClustering:
+    """Cluster normalized alert texts; identical texts are merged before any hashing"""
+    unique_ids: Dict[str, int] = {}
+    text_ids = np.fromiter((unique_ids.setdefault(text, len(unique_ids)) for text in texts), dtype=np.int64)
+    unique_texts = list(unique_ids)
+    if not unique_texts:
+        return AlertClustering(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    roots = lsh_clusters(minhash_signatures(unique_texts, num_perm), bands, threshold, number_keys(unique_texts))
+    # Compact cluster ids, numbered by first appearance in the file
+    alert_roots = roots[text_ids]
+    _, first_seen, labels = np.unique(alert_roots, return_index=True, return_inverse=True)
+    order = np.argsort(first_seen, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    labels = rank[labels.ravel()]
+    return AlertClustering(labels, first_seen[order])
+
+def cluster_alerts(alerts: Iterable[Dict[str, Any]], **kwargs) -> AlertClustering:
+    """Cluster alerts by their normalized text (see cluster_texts for options)"""
+    return cluster_texts((normalize_alert(alert) for alert in alerts), **kwargs)
+
+def synthetic_alerts(count: int, templates: int = 60, unique_fraction: float = 0.02, seed: int = 0) -> Iterable[Tuple[int, Dict[str, Any]]]:
+    """(template id, alert) pairs: a few alert types repeated with varying IPs, users, hosts and times"""
+    rng = np.random.default_rng(seed)
+    rules = ["Failed login burst", "Outbound connection to rare domain", "PowerShell encoded command",
+             "Malware signature match", "Privilege escalation attempt", "Port scan detected",
+             "Suspicious DNS tunnelling", "Impossible travel sign-in", "New scheduled task", "USB mass storage"]
+    details = ["lsass", "rundll32", "certutil", "mimikatz", "beacon", "tor", "vssadmin", "wmic", "bitsadmin",
+               "regsvr32", "psexec", "mshta", "cobalt", "dropbox", "pastebin", "ngrok", "anydesk", "7zip"]
+    for i in range(count):
+        template = int(rng.integers(templates))
+        if rng.random() < unique_fraction:
+            template = -1 - i
+        rule = rules[template % len(rules)]
+        # Words that set this alert type apart from others with the same rule
+        words = np.random.default_rng(abs(template)).choice(details, 4, replace=False)
+        alert = {
+            'id': f"ALRT-{i:07d}",
+            'timestamp': f"2025-06-{1 + i % 28:02d}T{int(rng.integers(24)):02d}:{int(rng.integers(60)):02d}:00Z",
+            'rule': f"{rule} (policy {template % 1000 if template >= 0 else -template})",
+            'severity': ["low", "medium", "high", "critical"][template % 4],
+            'src_ip': f"10.{int(rng.integers(256))}.{int(rng.integers(256))}.{int(rng.integers(256))}",
+            'dst_ip': f"203.0.113.{int(rng.integers(256))}",
+            'user': f"user{int(rng.integers(5000))}",
+            'host': f"WS-{int(rng.integers(2000)):04d}",
+            'message': f"{rule} observed by sensor {template} for process {words[0]}.exe "
+                       f"spawned by {words[1]} with {words[2]} and {words[3]} indicators "
+                       f"at 12:{int(rng.integers(60)):02d}:{int(rng.integers(60)):02d}"
+        }
+        # Near duplicates, not just masked copies: some alerts carry an extra detail
+        if rng.random() < 0.3:
+            alert['action'] = ["allowed", "blocked", "quarantined"][int(rng.integers(3))]
+        yield template, alert
+
+def benchmark(count: int = 100_000, threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Any]:
+    """Cluster a synthetic alert set and measure speed, token reduction and cluster purity"""
+    import time
+
+    from alert_triage import format_alert
+    from context_builder import estimate_tokens
+
+    templates, alerts = zip(*synthetic_alerts(count))
+    start_time = time.perf_counter()
+    texts = [normalize_alert(alert) for alert in alerts]
+    normalize_time = time.perf_counter() - start_time
+    clustering = cluster_texts(texts, threshold)
+    cluster_time = time.perf_counter() - start_time - normalize_time
+
+    tokens_before = sum(estimate_tokens(format_alert(alert)) for alert in alerts)
+    tokens_after = sum(estimate_tokens(format_alert(alerts[i])) for i in clustering.representatives)
+    templates = np.asarray(templates)
+    # Purity: share of alerts whose cluster's representative came from the same template
+    purity = float((templates[clustering.representatives[clustering.labels]] == templates).mean())
+    # Clusters holding alerts of more than one template
+    pairs = np.unique(np.stack([clustering.labels, templates]), axis=1)
+    mixed = int((np.bincount(pairs[0], minlength=len(clustering)) > 1).sum())
+    return dict(clustering.get_stats(),
+                purity=purity,
+                mixed_clusters=mixed,
+                templates=len(np.unique(templates)),
+                normalize_seconds=normalize_time,
+                cluster_seconds=cluster_time,
+                alerts_per_second=count / (normalize_time + cluster_time),
+                tokens_before=tokens_before,
+                tokens_after=tokens_after)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark alert deduplication on a synthetic alert set")
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    stats = benchmark(args.alerts, args.threshold)
+    print(f"alerts={stats['alerts']:,} clusters={stats['clusters']:,} ({stats['reduction']}x fewer) "
+          f"purity={stats['purity']:.3f} mixed clusters={stats['mixed_clusters']}")
+    print(f"normalize={stats['normalize_seconds']:.2f}s cluster={stats['cluster_seconds']:.2f}s "
+          f"({stats['alerts_per_second']:,.0f} alerts/s)")
+    print(f"prompt tokens {stats['tokens_before']:,} -> {stats['tokens_after']:,} "
+          f"({stats['tokens_before'] / max(1, stats['tokens_after']):.1f}x fewer)")
@@ -0,0 +1,391 @@
+"""
+Alert Triage for Trend Cybertron App
+Bulk triage of alert exports (JSONL or CSV): alerts are streamed from disk,
+packed into token-budgeted batches, prioritized by a worker pool with the
+alert prioritization prompt and appended to a JSONL results file. A
+checkpoint after every batch lets an interrupted run resume where it stopped.
+Near-duplicate alerts can be collapsed first (alert_dedup) so only one
+representative per cluster reaches the model
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Any, Tuple
+import logging
+
+from alert_dedup import DEFAULT_THRESHOLD as DEFAULT_DEDUP_THRESHOLD, AlertClustering, cluster_alerts
+from context_builder import estimate_tokens, truncate_to_tokens
+from prompt_registry import get_default_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRIAGE_DIR = os.environ.get("TREND_CYBERTRON_TRIAGE_DIR", "database/triage")
+USE_CASE_KEY = "alert_prioritization"
+DEFAULT_BATCH_TOKENS = 1500
+DEFAULT_MAX_BATCH_SIZE = 20
+DEFAULT_WORKERS = 2
+MAX_ALERT_TOKENS = 300
+# Output tokens requested per alert in a batch (one verdict line each)
+TOKENS_PER_VERDICT = 60
+PRIORITIES = ("Critical", "High", "Medium", "Low")
+ID_FIELDS = ("id", "alert_id", "event_id", "uuid")
+
+BATCH_INSTRUCTIONS = (
+    "Triage the following {count} security alerts. Answer with exactly one line per alert, "
+    "in the same order, formatted as:\n"
+    "<number> | <Critical|High|Medium|Low> | <one-sentence reasoning> | <recommended action>\n"
+    "Do not add any other text.\n\n{alerts}"
+)
+
+_VERDICT_PATTERN = re.compile(
+    r"^\W*(\d+)\W*\|\s*\**\s*(critical|high|medium|low)\s*\**\s*\|\s*([^|]*?)\s*(?:\|\s*(.*?))?\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+
+def read_alerts(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream alerts from a JSONL or CSV file without loading it into memory"""
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if key and value not in (None, "")}
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                alert = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed alert on line {line_number} of {path}")
+                continue
+            yield alert if isinstance(alert, dict) else {'alert': alert}
+
+def alert_id(alert: Dict[str, Any], index: int) -> str:
+    """The alert's own identifier when it has one, else its position in the file"""
+    for field in ID_FIELDS:
+        if alert.get(field) not in (None, ""):
+            return str(alert[field])
+    return str(index)
+
+def format_alert(alert: Dict[str, Any], max_tokens: int = MAX_ALERT_TOKENS) -> str:
+    """Compact one-line rendering of an alert for the prompt"""
+    parts = []
+    for key, value in alert.items():
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, separators=(",", ":"))
+        parts.append(f"{key}={' '.join(str(value).split())}")
+    return truncate_to_tokens("; ".join(parts), max_tokens)
+
+def batch_alerts(alerts: Iterator[Tuple[int, Dict[str, Any]]],
+                 batch_tokens: int = DEFAULT_BATCH_TOKENS,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE) -> Iterator[List[Tuple[int, Dict[str, Any], str]]]:
+    """Pack (index, alert) pairs into batches of (index, alert, text) that fit the token budget"""
+    batch, used = [], 0
+    for index, alert in alerts:
+        text = format_alert(alert)
+        tokens = estimate_tokens(text) + 2
+        if batch and (used + tokens > batch_tokens or len(batch) >= max_batch_size):
+            yield batch
+            batch, used = [], 0
+        batch.append((index, alert, text))
+        used += tokens
+    if batch:
+        yield batch
+
+def build_batch_prompt(batch: List[Tuple[int, Dict[str, Any], str]]) -> str:
+    """Prompt asking for one verdict line per alert"""
+    alerts = "\n".join(f"{number}. {text}" for number, (_, _, text) in enumerate(batch, 1))
+    return BATCH_INSTRUCTIONS.format(count=len(batch), alerts=alerts)
+
+def parse_verdicts(response: str, count: int) -> Dict[int, Dict[str, str]]:
+    """Verdicts by 1-based alert number from a batch response"""
+    verdicts = {}
+    for match in _VERDICT_PATTERN.finditer(response or ""):
+        number = int(match.group(1))
+        if 1 <= number <= count and number not in verdicts:
+            verdicts[number] = {
+                'priority': match.group(2).capitalize(),
+                'reasoning': match.group(3).strip(),
+                'action': (match.group(4) or "").strip()
+            }
+    return verdicts
+
+class TriageJob:
+    def __init__(self,
+                 input_path: str,
+                 output_path: str,
+                 generate: Callable[..., Dict[str, Any]],
+                 system_prompt: str = None,
+                 model: str = "",
+                 batch_tokens: int = DEFAULT_BATCH_TOKENS,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 workers: int = DEFAULT_WORKERS,
+                 checkpoint_path: str = None,
+                 dedup: bool = False,
+                 dedup_threshold: float = DEFAULT_DEDUP_THRESHOLD):
+        """Initialize a triage job; generate(prompt=..., system_prompt=..., max_tokens=...) returns a result dict"""
+        self.input_path = input_path
+        self.output_path = output_path
+        self.generate = generate
+        if system_prompt is None:
+            system_prompt = get_default_registry().get(USE_CASE_KEY).system_prompt
+        self.system_prompt = system_prompt
+        self.model = model
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.workers = max(1, workers)
+        # Near-duplicate alerts are sent once, as one representative per cluster
+        self.dedup = dedup
+        self.dedup_threshold = dedup_threshold
+        self.clustering: AlertClustering = None
+        self._alert_ids: List[str] = []
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.json"
+        self._stop = threading.Event()
+        self.stats: Dict[str, Any] = {}
+
+    def fingerprint(self) -> str:
+        """Identifies the input and batching so a checkpoint is only reused for the same job"""
+        stat = os.stat(self.input_path)
+        key = json.dumps([os.path.abspath(self.input_path), stat.st_size, stat.st_mtime, self.batch_tokens,
+                          self.max_batch_size, self.model, self.dedup and self.dedup_threshold,
+                          hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        """Checkpoint for this job, or an empty one"""
+        empty = {'fingerprint': self.fingerprint(), 'completed': [], 'output_bytes': 0,
+                 'alerts_done': 0, 'failed_batches': 0, 'elapsed': 0.0}
+        if not os.path.exists(self.checkpoint_path):
+            return empty
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable triage checkpoint {self.checkpoint_path}, starting over: {e}")
+            return empty
+        if checkpoint.get('fingerprint') != empty['fingerprint']:
+            logger.info(f"Checkpoint {self.checkpoint_path} belongs to a different input or settings, starting over")
+            return empty
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]):
+        """Write the checkpoint atomically"""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reset(self):
+        """Discard previous results and the checkpoint"""
+        for path in (self.output_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stop(self):
+        """Ask a running job to stop after the batches in flight"""
+        self._stop.set()
+
+    def _triage_batch(self, batch_number: int, batch: List[Tuple[int, Dict[str, Any], str]]) -> Dict[str, Any]:
+        """Run one batch through the model"""
+        result = self.generate(
+            prompt=build_batch_prompt(batch),
+            system_prompt=self.system_prompt,
+            max_tokens=TOKENS_PER_VERDICT * len(batch) + 50
+        )
+        return {'batch': batch_number, 'alerts': batch, 'result': result}
+
+    def _records(self, outcome: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """One output record per alert in a finished batch (every cluster member when deduplicating)"""
+        batch, result = outcome['alerts'], outcome['result']
+        verdicts = parse_verdicts(result.get('response', ''), len(batch))
+        records = []
+        for number, (index, alert, _) in enumerate(batch, 1):
+            verdict = verdicts.get(number, {})
+            record = {
+                'index': index,
+                'alert_id': alert_id(alert, index),
+                'priority': verdict.get('priority'),
+                'reasoning': verdict.get('reasoning'),
+                'action': verdict.get('action'),
+                'batch': outcome['batch'],
+                'model': self.model,
+                # Keep the raw answer when the model did not follow the line format
+                **({} if verdict else {'raw_response': result.get('response', '')})
+            }
+            if self.clustering is None:
+                records.append(record)
+                continue
+            cluster = int(self.clustering.labels[index])
+            members = self.clustering.members(cluster)
+            for member in members:
+                records.append(dict(record, index=int(member), alert_id=self._alert_ids[member], cluster=cluster,
+                                    cluster_size=len(members), representative=record['alert_id']))
+        return records
+
+    def _prepare_dedup(self) -> AlertClustering:
+        """Cluster the whole export (first pass) so verdicts can be expanded to every member"""
+        self._alert_ids = []
+
+        def alerts():
+            for index, alert in enumerate(read_alerts(self.input_path)):
+                self._alert_ids.append(alert_id(alert, index))
+                yield alert
+
+        self.clustering = cluster_alerts(alerts(), threshold=self.dedup_threshold)
+        return self.clustering
+
+    def _representatives(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Second pass: the representative of each cluster, annotated with its duplicate count"""
+        representatives = {int(index): cluster for cluster, index in enumerate(self.clustering.representatives)}
+        counts = self.clustering.counts
+        for index, alert in enumerate(read_alerts(self.input_path)):
+            cluster = representatives.get(index)
+            if cluster is not None:
+                # The model should know how often an alert fired when it prioritizes it
+                yield index, (dict(alert, occurrences=int(counts[cluster])) if counts[cluster] > 1 else alert)
+
+    def run(self, resume: bool = True, progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Triage the whole file (skipping batches completed by an earlier run) and return the stats"""
+        self._stop.clear()
+        if not resume:
+            self.reset()
+        checkpoint = self.load_checkpoint()
+        completed = set(checkpoint['completed'])
+        # Anything written after the last checkpoint is redone, so drop it (and any torn line)
+        mode = "r+b" if os.path.exists(self.output_path) else "wb"
+        output = open(self.output_path, mode)
+        output.truncate(checkpoint['output_bytes'])
+        output.seek(checkpoint['output_bytes'])
+
+        start_time = time.perf_counter()
+        previous_elapsed = checkpoint.get('elapsed', 0.0)
+        resumed_alerts = checkpoint['alerts_done']
+        stats = self.stats = {
+            'input': self.input_path,
+            'output': self.output_path,
+            'alerts_done': checkpoint['alerts_done'],
+            'batches_done': len(completed),
+            'failed_batches': 0,
+            'unparsed_alerts': 0,
+            'alerts_seen': 0,
+            'resumed_from': resumed_alerts,
+            'alerts_per_minute': 0.0,
+            'elapsed': previous_elapsed,
+            'finished': False
+        }
+        if self.dedup:
+            stats.update(self._prepare_dedup().get_stats())
+            alerts = self._representatives()
+        else:
+            self.clustering = None
+            alerts = enumerate(read_alerts(self.input_path))
+
+        def record(outcome: Dict[str, Any]):
+            result = outcome['result']
+            if 'error' in result:
+                # Not checkpointed, so the next run retries it
+                stats['failed_batches'] += 1
+                logger.warning(f"Triage batch {outcome['batch']} failed: {result['error']}")
+            else:
+                records = self._records(outcome)
+                output.write("".join(json.dumps(r) + "\n" for r in records).encode("utf-8"))
+                output.flush()
+                os.fsync(output.fileno())
+                completed.add(outcome['batch'])
+                stats['alerts_done'] += len(records)
+                stats['batches_done'] += 1
+                stats['unparsed_alerts'] += sum(1 for r in records if r['priority'] is None)
+                checkpoint.update({
+                    'completed': sorted(completed),
+                    'output_bytes': output.tell(),
+                    'alerts_done': stats['alerts_done'],
+                    'elapsed': previous_elapsed + time.perf_counter() - start_time
+                })
+                self._save_checkpoint(checkpoint)
+            run_time = time.perf_counter() - start_time
+            stats['elapsed'] = round(previous_elapsed + run_time, 2)
+            stats['alerts_per_minute'] = round((stats['alerts_done'] - resumed_alerts) / run_time * 60, 1) if run_time else 0.0
+            if progress is not None:
+                progress(dict(stats))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="triage") as pool:
+                pending = set()
+                for batch_number, batch in enumerate(batch_alerts(alerts, self.batch_tokens, self.max_batch_size)):
+                    if self.clustering is None:
+                        stats['alerts_seen'] += len(batch)
+                    else:
+                        stats['alerts_seen'] += sum(int(self.clustering.counts[self.clustering.labels[index]])
+                                                    for index, _, _ in batch)
+                    if batch_number in completed:
+                        continue
+                    if self._stop.is_set():
+                        break
+                    # Bounded look-ahead keeps memory flat on large exports
+                    while len(pending) >= self.workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result())
+                    pending.add(pool.submit(self._triage_batch, batch_number, batch))
+                for future in pending:
+                    record(future.result())
+        finally:
+            output.close()
+        stats['finished'] = not self._stop.is_set() and stats['failed_batches'] == 0
+        return stats
+
+def main():
+    """Triage an alert export from the command line"""
+    import argparse
+    import functools
+
+    from log_setup import configure_logging
+    from ollama_client import OllamaClient
+
+    parser = argparse.ArgumentParser(description="Prioritize a JSONL/CSV alert export with the Trend Cybertron model")
+    parser.add_argument("input", help="Alerts as JSONL (one object per line) or CSV with a header row")
+    parser.add_argument("-o", "--output", help="Results JSONL (default: <input>.triage.jsonl)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="11434")
+    parser.add_argument("--provider", default="Ollama", choices=["Ollama", "LM Studio"])
+    parser.add_argument("--model", default="llama-trendcybertron-primus-merged")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS, help="Alert tokens per request")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Alerts per request")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    parser.add_argument("--no-dedup", action="store_true", help="Send every alert instead of one per near-duplicate cluster")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help="Similarity at which alerts count as duplicates")
+    args = parser.parse_args()
+
+    configure_logging("WARNING")
+    client = OllamaClient()
+    generate = functools.partial(client.generate_response, model=args.model, host=args.host, port=args.port,
+                                 provider=args.provider, temperature=args.temperature, session_id="bulk-triage",
+                                 priority="batch")
+    job = TriageJob(args.input, args.output or f"{args.input}.triage.jsonl", generate, model=args.model,
+                    batch_tokens=args.batch_tokens, max_batch_size=args.max_batch, workers=args.workers,
+                    dedup=not args.no_dedup, dedup_threshold=args.dedup_threshold)
+
+    def progress(stats):
+        print(f"\r{stats['alerts_done']} alerts triaged, {stats['failed_batches']} failed batches, "
+              f"{stats['alerts_per_minute']} alerts/min", end="", flush=True)
+
+    try:
+        stats = job.run(resume=not args.restart, progress=progress)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; rerun the same command to resume from {job.checkpoint_path}")
+        return
+    print()
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
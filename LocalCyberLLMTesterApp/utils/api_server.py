@@ -0,0 +1,657 @@
+"""
+API Server for Trend Cybertron App
+Headless async HTTP service for SOAR and other automation: runs the use cases
+(system prompts from PromptTemplates, generation through OllamaClient or the
+backend pool, persistence through DatabaseManager) with streaming responses,
+health and readiness endpoints, request IDs and concurrency limits
+"""
+
+import argparse
+import asyncio
+import functools
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+import logging
+
+from admission import PRIORITIES
+from backend_pool import BackendPool, get_backend_pool
+from context_builder import ContextBuilder
+from database_manager import DatabaseManager
+from health_monitor import HealthMonitor, get_health_monitor
+from load_generator import percentile
+from metrics import LATENCY_BUCKETS, get_registry
+from ollama_client import OllamaClient
+from prompt_templates import PromptTemplates
+from structured_output import IncrementalJSONParser, get_schema, records_key, schema_instructions, schema_name_for_use_case
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = os.environ.get("TREND_CYBERTRON_API_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.environ.get("TREND_CYBERTRON_API_PORT", "8081"))
+# Generations running at once, and waiting for one of those places, before requests get 503
+DEFAULT_CONCURRENCY = int(os.environ.get("TREND_CYBERTRON_API_CONCURRENCY", "16"))
+DEFAULT_MAX_PENDING = int(os.environ.get("TREND_CYBERTRON_API_MAX_PENDING", "64"))
+DEFAULT_MODEL = os.environ.get("TREND_CYBERTRON_MODEL", "llama-trendcybertron-primus-merged")
+DEFAULT_DB_PATH = os.environ.get("TREND_CYBERTRON_DB_PATH", "database/conversations.db")
+DEFAULT_CONTEXT_BUDGET = 4096
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_PROMPT_CHARS = 200_000
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+# Reachable without the API token, so orchestrators can probe the service
+PUBLIC_PATHS = ("/health", "/ready")
+
+_metrics = get_registry()
+API_REQUESTS = _metrics.counter(
+    "trendcybertron_api_requests_total", "API requests by route and status", ("route", "status"))
+API_LATENCY = _metrics.histogram(
+    "trendcybertron_api_latency_seconds", "API request latency (streams: until the last chunk)", ("route",),
+    LATENCY_BUCKETS)
+API_IN_FLIGHT = _metrics.gauge(
+    "trendcybertron_api_generations_in_flight", "API generations running")
+API_PENDING = _metrics.gauge(
+    "trendcybertron_api_generations_pending", "API generations waiting for a concurrency slot")
+API_REJECTED = _metrics.counter(
+    "trendcybertron_api_rejected_total", "API generations rejected before running", ("reason",))
+
+class ApiError(Exception):
+    """An error returned to the API caller as JSON"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class ApiService:
+    def __init__(self,
+                 provider: str = "Ollama",
+                 backend_host: str = None,
+                 backend_port: str = None,
+                 model: str = DEFAULT_MODEL,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 token: str = None,
+                 db_manager: DatabaseManager = None,
+                 client: OllamaClient = None,
+                 pool: BackendPool = None,
+                 templates: PromptTemplates = None,
+                 monitor: HealthMonitor = None):
+        """Initialize the API service on the shared inference and storage layers"""
+        self.provider = provider
+        self.backend_host = backend_host or os.environ.get("OLLAMA_HOST", "localhost")
+        self.backend_port = str(backend_port or os.environ.get("OLLAMA_PORT", "11434"))
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max(0, max_pending)
+        self.token = token if token is not None else os.environ.get("TREND_CYBERTRON_API_TOKEN")
+        # No vector index: database/vector_index is owned by the Streamlit process and has no cross-process
+        # locking. Conversations saved here while the app is stopped are caught up when it next starts
+        self.db_manager = db_manager or DatabaseManager(DEFAULT_DB_PATH)
+        self.client = client or OllamaClient()
+        self.pool = pool or get_backend_pool()
+        self.templates = templates or PromptTemplates()
+        self.monitor = monitor or get_health_monitor()
+        self.monitor.add_endpoint(self.provider, self.backend_host, self.backend_port, persistent=True)
+        # Blocking client and database calls run here, off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency + 4, thread_name_prefix="api")
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._pending = 0
+        self._in_flight = 0
+        self.started_at = time.time()
+
+    def use_pool(self) -> bool:
+        """Route through the backend pool when one is configured"""
+        return bool(self.pool.backends())
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking call on the service's executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _acquire(self):
+        """Take a generation slot, rejecting when too many requests are already waiting"""
+        if self._in_flight >= self.concurrency and self._pending >= self.max_pending:
+            API_REJECTED.inc(reason="busy")
+            raise ApiError(503, f"Server busy ({self._in_flight} running, {self._pending} waiting). Retry shortly.")
+        self._pending += 1
+        API_PENDING.set(self._pending)
+        try:
+            await self._slots.acquire()
+        finally:
+            self._pending -= 1
+            API_PENDING.set(self._pending)
+        self._in_flight += 1
+        API_IN_FLIGHT.set(self._in_flight)
+
+    def _release(self):
+        """Give a generation slot back"""
+        self._in_flight -= 1
+        API_IN_FLIGHT.set(self._in_flight)
+        self._slots.release()
+
+    def _start_generation(self, func, *args) -> asyncio.Future:
+        """Run a generation on the executor under a slot taken by _acquire, released when the call returns
+
+        A client that disconnects cancels its handler but not the executor thread,
+        so the slot is released by the future itself rather than by the handler.
+        Callers await it through asyncio.shield so cancellation cannot finish it early.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def parse_generation(self, use_case_key: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a generation request body into the arguments of a generation"""
+        use_case = self.templates.registry.get(use_case_key)
+        if use_case is None:
+            raise ApiError(404, f"Unknown use case: {use_case_key}")
+        prompt = body.get('prompt')
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ApiError(400, "'prompt' must be a non-empty string")
+        if len(prompt) > MAX_PROMPT_CHARS:
+            raise ApiError(413, f"'prompt' is longer than {MAX_PROMPT_CHARS} characters")
+        priority = body.get('priority', "interactive")
+        if priority not in PRIORITIES:
+            raise ApiError(400, f"'priority' must be one of {', '.join(PRIORITIES)}")
+        try:
+            temperature = float(body.get('temperature', 0.7))
+            max_tokens = int(body.get('max_tokens', 2000))
+            context_budget = int(body.get('context_budget', DEFAULT_CONTEXT_BUDGET))
+        except (TypeError, ValueError):
+            raise ApiError(400, "'temperature', 'max_tokens' and 'context_budget' must be numbers")
+        if not 0 <= temperature <= 2 or not 1 <= max_tokens <= 32768:
+            raise ApiError(400, "'temperature' must be in [0, 2] and 'max_tokens' in [1, 32768]")
+        session_id = body.get('session_id')
+        if session_id is not None and not (isinstance(session_id, str) and _REQUEST_ID.match(session_id)):
+            raise ApiError(400, "'session_id' must be 1-128 characters of letters, digits and ._:-")
+
+        system_prompt = use_case.system_prompt
+        schema = None
+        if body.get('structured'):
+            schema_name = schema_name_for_use_case(use_case.key)
+            if schema_name is None:
+                raise ApiError(400, f"Use case {use_case.key} has no structured output schema")
+            schema = get_schema(schema_name)
+        return {
+            'use_case': use_case,
+            'tab_name': use_case.tab_name or use_case.key,
+            'prompt': prompt,
+            'system_prompt': system_prompt,
+            'request_system_prompt': system_prompt + schema_instructions(schema) if schema else system_prompt,
+            'schema': schema,
+            'model': body.get('model') or self.model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'context_budget': max(256, context_budget),
+            'priority': priority,
+            # Without a session_id every request is a single turn of its own session
+            'session_id': session_id or f"api-{uuid.uuid4().hex}",
+            'multi_turn': session_id is not None
+        }
+
+    def build_messages(self, job: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        """Token-budgeted multi-turn messages from the session's saved turns (None for a single turn)"""
+        if not job['multi_turn']:
+            return None
+        history = self.db_manager.get_session_turns(job['tab_name'], job['session_id'])
+        if not history:
+            return None
+        builder = ContextBuilder(token_budget=job['context_budget'])
+        return builder.build(job['request_system_prompt'], history, job['prompt'])['messages']
+
+    def generate(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a generation and save it (blocking)"""
+        messages = self.build_messages(job)
+        kwargs = dict(
+            prompt=job['prompt'],
+            system_prompt=job['request_system_prompt'],
+            model=job['model'],
+            temperature=job['temperature'],
+            max_tokens=job['max_tokens'],
+            session_id=job['session_id'],
+            messages=messages,
+            output_schema=job['schema'],
+            priority=job['priority']
+        )
+        if self.use_pool():
+            result = self.pool.generate_response(**kwargs)
+        else:
+            result = self.client.generate_response(host=self.backend_host, port=self.backend_port,
+                                                   provider=self.provider, **kwargs)
+        if 'error' not in result:
+            result['conversation_id'] = self.save(job, result['response'])
+        return result
+
+    def save(self, job: Dict[str, Any], response_text: str) -> int:
+        """Persist a finished turn like the UI does"""
+        return self.db_manager.save_message(
+            tab_name=job['tab_name'],
+            user_message=job['prompt'],
+            assistant_response=response_text,
+            system_prompt=job['system_prompt'],
+            model=job['model'],
+            temperature=job['temperature'],
+            max_tokens=job['max_tokens'],
+            session_id=job['session_id']
+        )
+
+    def stream_target(self, model: str):
+        """(provider, host, port) a stream is sent to: the best pool backend, or the configured one"""
+        if self.use_pool():
+            candidates = self.pool.candidates(model)
+            if not candidates:
+                raise ApiError(503, f"No backend in the pool can serve model {model}")
+            return candidates[0].provider, candidates[0].host, candidates[0].port
+        return self.provider, self.backend_host, self.backend_port
+
+    def check_readiness(self) -> Dict[str, Any]:
+        """Database, backend and model checks (blocking; backend state comes from the health monitor cache)"""
+        checks = {}
+        try:
+            with sqlite3.connect(self.db_manager.db_path, timeout=2.0) as conn:
+                conn.execute("SELECT 1 FROM conversations LIMIT 1").fetchall()
+            checks['database'] = {'ok': True}
+        except sqlite3.Error as e:
+            checks['database'] = {'ok': False, 'error': str(e)}
+
+        if self.use_pool():
+            endpoints = [(b.provider, b.host, b.port) for b in self.pool.backends()]
+        else:
+            endpoints = [(self.provider, self.backend_host, self.backend_port)]
+        statuses = [self.monitor.get_status(*endpoint) for endpoint in endpoints]
+        healthy = [status for status in statuses if status['status'] == 'healthy']
+        checks['backend'] = {
+            'ok': bool(healthy),
+            'healthy': len(healthy),
+            'total': len(statuses),
+            'status': statuses[0]['status'] if len(statuses) == 1 else None
+        }
+        # An empty model list means the backend did not report one; do not fail on that
+        checks['model'] = {
+            'ok': any(not status['models'] or self.model in status['models'] for status in healthy),
+            'model': self.model
+        }
+        return {'ready': all(check['ok'] for check in checks.values()), 'checks': checks}
+
+def _request_id(request: web.Request) -> str:
+    """The caller's request ID if it is well formed, otherwise a new one"""
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")
+    return request_id if _REQUEST_ID.match(request_id) else uuid.uuid4().hex
+
+def _json_error(request: web.Request, status: int, message: str) -> web.Response:
+    """Error body shared by every endpoint"""
+    response = web.json_response({'error': message, 'request_id': request.get('request_id')}, status=status)
+    if status == 503:
+        response.headers["Retry-After"] = "1"
+    return response
+
+@web.middleware
+async def request_middleware(request: web.Request, handler):
+    """Request IDs, API token check, JSON errors, access logging and metrics"""
+    request['request_id'] = _request_id(request)
+    service: ApiService = request.app['service']
+    route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+    start_time = time.perf_counter()
+    try:
+        if service.token and request.path not in PUBLIC_PATHS:
+            supplied = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(supplied.encode(), f"Bearer {service.token}".encode()):
+                raise ApiError(401, "Missing or invalid API token")
+        response = await handler(request)
+    except ApiError as e:
+        response = _json_error(request, e.status, str(e))
+    except web.HTTPException as e:
+        response = _json_error(request, e.status, e.reason)
+    except Exception as e:
+        logger.exception(f"Unhandled error in {request.method} {request.path}")
+        response = _json_error(request, 500, f"Internal error: {e}")
+    elapsed = time.perf_counter() - start_time
+    if not response.prepared:
+        response.headers[REQUEST_ID_HEADER] = request['request_id']
+    API_REQUESTS.inc(route=route, status=str(response.status))
+    API_LATENCY.observe(elapsed, route=route)
+    logger.info(f"{request.method} {request.path} {response.status} in {elapsed * 1000:.0f} ms",
+                extra={'event': 'api.request', 'request_id': request['request_id'], 'status': response.status,
+                       'route': route, 'latency_ms': round(elapsed * 1000, 1)})
+    return response
+
+async def handle_health(request: web.Request) -> web.Response:
+    """Liveness: the process is up and serving"""
+    service: ApiService = request.app['service']
+    return web.json_response({'status': 'ok', 'uptime_seconds': round(time.time() - service.started_at, 1)})
+
+async def handle_ready(request: web.Request) -> web.Response:
+    """Readiness: the database answers and a healthy backend serves the model"""
+    service: ApiService = request.app['service']
+    readiness = await service._run(service.check_readiness)
+    return web.json_response(readiness, status=200 if readiness['ready'] else 503)
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Prometheus metrics of this process"""
+    return web.Response(text=get_registry().render(), content_type="text/plain")
+
+async def handle_use_cases(request: web.Request) -> web.Response:
+    """List the use cases callable through the API"""
+    service: ApiService = request.app['service']
+    snapshot = service.templates.registry.snapshot()
+    return web.json_response({
+        'version': snapshot.version,
+        'use_cases': [{
+            'key': use_case.key,
+            'name': use_case.tab_name,
+            'category': use_case.category,
+            'structured_output': schema_name_for_use_case(use_case.key) is not None,
+            'test_prompts': list(use_case.test_prompts)
+        } for use_case in snapshot.use_cases]
+    })
+
+async def handle_session_turns(request: web.Request) -> web.Response:
+    """A session's saved turns in one use case, oldest first"""
+    service: ApiService = request.app['service']
+    use_case = service.templates.registry.get(request.match_info['use_case'])
+    if use_case is None:
+        raise ApiError(404, f"Unknown use case: {request.match_info['use_case']}")
+    turns = await service._run(service.db_manager.get_session_turns, use_case.tab_name or use_case.key,
+                               request.match_info['session_id'])
+    return web.json_response({'session_id': request.match_info['session_id'], 'messages': turns})
+
+async def _read_json(request: web.Request) -> Dict[str, Any]:
+    """Request body as a JSON object"""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+async def handle_generate(request: web.Request) -> web.StreamResponse:
+    """Run a use case on a prompt; with "stream": true the answer is streamed as NDJSON"""
+    service: ApiService = request.app['service']
+    body = await _read_json(request)
+    job = service.parse_generation(request.match_info['use_case'], body)
+    if body.get('stream'):
+        return await _stream_generation(request, service, job)
+
+    await service._acquire()
+    start_time = time.perf_counter()
+    result = await asyncio.shield(service._start_generation(service.generate, job))
+    if 'error' in result:
+        status = 503 if result.get('busy') else 502
+        raise ApiError(status, result['error'])
+    data = {
+        'request_id': request['request_id'],
+        'use_case': job['use_case'].key,
+        'session_id': job['session_id'],
+        'conversation_id': result.get('conversation_id'),
+        'model': job['model'],
+        'response': result['response'],
+        'usage': {
+            'prompt_tokens': result.get('prompt_tokens', 0),
+            'completion_tokens': result.get('eval_count', 0)
+        },
+        'latency_seconds': round(time.perf_counter() - start_time, 3),
+        'queue_wait_seconds': round(result.get('queue_wait') or 0.0, 3),
+        'cached': result.get('cached', False)
+    }
+    for key in ('structured', 'structured_error', 'routing'):
+        if key in result:
+            data[key] = result[key]
+    return web.json_response(data)
+
+async def _stream_generation(request: web.Request, service: ApiService, job: Dict[str, Any]) -> web.StreamResponse:
+    """Stream tokens as {"token": ...} lines (records as {"record": ...} lines for structured output),
+    then a final {"done": true, ...} line"""
+    provider, host, port = service.stream_target(job['model'])
+    await service._acquire()
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    # Structured answers are streamed as whole records; the parser keeps the full text for saving
+    parser = IncrementalJSONParser(records_key(job['schema'])) if job['schema'] is not None else None
+
+    def pump():
+        # Runs on the executor: iterate the blocking stream and hand chunks to the event loop
+        try:
+            options = dict(system_prompt=job['request_system_prompt'], model=job['model'], host=host, port=port,
+                           temperature=job['temperature'], max_tokens=job['max_tokens'],
+                           session_id=job['session_id'], provider=provider, priority=job['priority'],
+                           messages=service.build_messages(job))
+            if parser is None:
+                stream = service.client.stream_response(job['prompt'], **options)
+            else:
+                stream = service.client.stream_records(job['prompt'], job['schema'], parser=parser, **options)
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, f"Error: {e}")
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    start_time = time.perf_counter()
+    service._start_generation(pump)
+    response = web.StreamResponse(headers={'Content-Type': "application/x-ndjson",
+                                           REQUEST_ID_HEADER: request['request_id']})
+    parts = []
+    error = None
+    ttft = None
+    try:
+        await response.prepare(request)
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            # stream_response reports failures in-band, also after tokens (e.g. a read timeout mid-answer);
+            # a truncated answer is reported as an error and not saved
+            if isinstance(chunk, dict):
+                if chunk.keys() == {'error'}:
+                    error = chunk['error']
+                    continue
+                line = {'record': chunk}
+            elif chunk.startswith("Error:"):
+                error = chunk[len("Error:"):].strip()
+                continue
+            else:
+                parts.append(chunk)
+                line = {'token': chunk}
+            if ttft is None:
+                ttft = time.perf_counter() - start_time
+            await response.write(json.dumps(line).encode() + b"\n")
+        final = {'done': True, 'request_id': request['request_id'], 'use_case': job['use_case'].key,
+                 'session_id': job['session_id'], 'model': job['model']}
+        text = "".join(parts) if parser is None else parser.buffer
+        if error is not None:
+            final['error'] = error
+        else:
+            if parser is not None:
+                final['records'] = parser.records_emitted
+                try:
+                    final['structured'] = parser.close()
+                except ValueError as e:
+                    final['structured_error'] = f"Response is not valid JSON: {e}"
+            final['conversation_id'] = await service._run(service.save, job, text)
+        final['latency_seconds'] = round(time.perf_counter() - start_time, 3)
+        final['ttft_seconds'] = round(ttft, 3) if ttft is not None else None
+        await response.write(json.dumps(final).encode() + b"\n")
+        await response.write_eof()
+    except ConnectionResetError:
+        # The caller went away mid-stream; there is nobody left to send an error to
+        logger.info(f"Client disconnected from stream {request['request_id']}")
+    except asyncio.CancelledError:
+        logger.info(f"Client disconnected from stream {request['request_id']}")
+        raise
+    finally:
+        # Stop reading from the backend, which closes its connection; the pump releases the slot when it returns
+        stop.set()
+    return response
+
+def create_app(service: ApiService) -> web.Application:
+    """Build the aiohttp application for a service"""
+    app = web.Application(middlewares=[request_middleware], client_max_size=MAX_BODY_BYTES)
+    app['service'] = service
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/ready", handle_ready)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/v1/use-cases", handle_use_cases)
+    app.router.add_post("/v1/use-cases/{use_case}/generate", handle_generate)
+    app.router.add_get("/v1/use-cases/{use_case}/sessions/{session_id}", handle_session_turns)
+
+    async def on_cleanup(app):
+        service.executor.shutdown(wait=False)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+async def load_test(base_url: str,
+                    use_case: str = "alert_prioritization",
+                    total_requests: int = 200,
+                    concurrency: int = 16,
+                    stream: bool = False,
+                    prompt: str = "Triage this alert: powershell -enc from WS-01 contacting 203.0.113.7",
+                    max_tokens: int = 64,
+                    token: str = None) -> Dict[str, Any]:
+    """Send requests to a running API server and report throughput and latency percentiles"""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    url = f"{base_url.rstrip('/')}/v1/use-cases/{use_case}/generate"
+    body = {'prompt': prompt, 'max_tokens': max_tokens, 'stream': stream}
+    results = []
+    next_index = iter(range(total_requests))
+
+    async def worker(session: ClientSession):
+        for _ in next_index:
+            start_time = time.perf_counter()
+            ttft = None
+            ok = False
+            try:
+                async with session.post(url, json=body, headers=headers) as response:
+                    if stream:
+                        async for line in response.content:
+                            if ttft is None and line.startswith(b'{"token"'):
+                                ttft = time.perf_counter() - start_time
+                            if line.startswith(b'{"done"'):
+                                ok = response.status == 200 and b'"error"' not in line
+                    else:
+                        await response.read()
+                        ok = response.status == 200
+                    status = response.status
+            except Exception as e:
+                status = type(e).__name__
+            results.append({'ok': ok, 'status': status, 'latency': time.perf_counter() - start_time, 'ttft': ttft})
+
+    start_time = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=concurrency),
+                             timeout=ClientTimeout(total=600)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start_time
+
+    succeeded = [r for r in results if r['ok']]
+    latencies = [r['latency'] for r in succeeded]
+    ttfts = [r['ttft'] for r in succeeded if r['ttft'] is not None]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+    return {
+        'url': url,
+        'stream': stream,
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'succeeded': len(succeeded),
+        'failed': total_requests - len(succeeded),
+        'statuses': statuses,
+        'wall_time': round(wall_time, 3),
+        'requests_per_second': round(len(succeeded) / wall_time, 2) if wall_time else 0.0,
+        'latency_p50': round(percentile(latencies, 0.50), 3),
+        'latency_p95': round(percentile(latencies, 0.95), 3),
+        'latency_p99': round(percentile(latencies, 0.99), 3),
+        'ttft_p50': round(percentile(ttfts, 0.50), 3) if ttfts else None,
+        'ttft_p95': round(percentile(ttfts, 0.95), 3) if ttfts else None
+    }
+
+async def _serve_and_load_test(service: ApiService, args) -> Dict[str, Any]:
+    """Start the API server, load test it, and shut it down"""
+    runner = web.AppRunner(create_app(service), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, args.host, args.port)
+    await site.start()
+    try:
+        return await load_test(f"http://{args.host}:{args.port}", args.use_case, args.load_test,
+                               args.load_concurrency, args.stream, max_tokens=args.max_tokens,
+                               token=service.token)
+    finally:
+        await runner.cleanup()
+
+def main():
+    """Run the API server, optionally load testing it against a bundled mock backend"""
+    from log_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Trend Cybertron headless HTTP API")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--provider", default="Ollama", choices=["Ollama", "LM Studio"])
+    parser.add_argument("--backend-host", default=None, help="Inference host (default: OLLAMA_HOST or localhost)")
+    parser.add_argument("--backend-port", default=None, help="Inference port (default: OLLAMA_PORT or 11434)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Generations running at once")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Generations waiting for a slot before new ones get 503")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument("--mock", action="store_true", help="Start a mock inference server on the backend port")
+    parser.add_argument("--load-test", type=int, metavar="N", help="Send N requests to the server, report, and exit")
+    parser.add_argument("--load-concurrency", type=int, default=16)
+    parser.add_argument("--use-case", default="alert_prioritization", help="Use case key for the load test")
+    parser.add_argument("--stream", action="store_true", help="Load test streaming requests")
+    parser.add_argument("--max-tokens", type=int, default=64, help="max_tokens of load test requests")
+    parser.add_argument("--json", action="store_true", help="Print the load test report as JSON")
+    args = parser.parse_args()
+
+    configure_logging("WARNING" if args.load_test else None)
+    mock = None
+    if args.mock:
+        from mock_server import MockInferenceServer, MockServerConfig
+
+        backend_port = int(args.backend_port or 11434)
+        mock = MockInferenceServer(MockServerConfig(models=[args.model], ttft=0.1, tokens_per_second=200.0,
+                                                    slots=4, max_queue=max(64, args.load_concurrency),
+                                                    load_delay=0.0),
+                                   "127.0.0.1", backend_port).start()
+        args.backend_host = "127.0.0.1"
+        args.backend_port = str(backend_port)
+
+    service = ApiService(args.provider, args.backend_host, args.backend_port, args.model,
+                         args.concurrency, args.max_pending, db_manager=DatabaseManager(args.db))
+    try:
+        if not args.load_test:
+            print(f"Serving the Trend Cybertron API on http://{args.host}:{args.port}")
+            web.run_app(create_app(service), host=args.host, port=args.port, access_log=None, print=None)
+            return
+        report = asyncio.run(_serve_and_load_test(service, args))
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'stream' if report['stream'] else 'generate'} x{report['requests']} @ concurrency "
+          f"{report['concurrency']} -> {report['url']}")
+    print(f"  ok {report['succeeded']}  failed {report['failed']}  statuses {report['statuses']}  "
+          f"wall {report['wall_time']}s")
+    print(f"  throughput {report['requests_per_second']} req/s")
+    print(f"  latency p50 {report['latency_p50']}s  p95 {report['latency_p95']}s  p99 {report['latency_p99']}s")
+    if report['ttft_p50'] is not None:
+        print(f"  ttft p50 {report['ttft_p50']}s  p95 {report['ttft_p95']}s")
+
+if __name__ == "__main__":
+    main()
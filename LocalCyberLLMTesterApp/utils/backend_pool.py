@@ -0,0 +1,472 @@
+"""
+Backend Pool for Trend Cybertron App
+Routes generation requests across several Ollama/LM Studio hosts with
+health-aware, model-aware load balancing and automatic failover
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Any, Optional
+import logging
+
+from ollama_client import CancelToken, OllamaClient
+from health_monitor import HealthMonitor, get_health_monitor
+from hedging import HedgePolicy
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("least_outstanding", "latency_weighted")
+
+DEFAULT_PORTS = {"Ollama": "11434", "LM Studio": "1234"}
+
+class Backend:
+    def __init__(self, provider: str, host: str, port: str, name: str = None, weight: float = 1.0):
+        """Describe one inference endpoint and its live routing counters"""
+        self.provider = provider
+        self.host = str(host)
+        self.port = str(port)
+        self.name = name or f"{host}:{port}"
+        self.weight = weight
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.total_requests = 0
+        self.total_failures = 0
+        self.cooldown_until = 0.0
+
+    def key(self):
+        """Key shared with the health monitor"""
+        return HealthMonitor.endpoint_key(self.provider, self.host, self.port)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the backend's routing state"""
+        return {
+            'name': self.name,
+            'provider': self.provider,
+            'host': self.host,
+            'port': self.port,
+            'weight': self.weight,
+            'outstanding': self.outstanding,
+            'ewma_latency': self.ewma_latency,
+            'total_requests': self.total_requests,
+            'total_failures': self.total_failures,
+            'cooling_down': self.cooldown_until > time.time()
+        }
+
+class _Attempt:
+    def __init__(self, backend: Backend, hedge: bool = False):
+        """One in-flight request of a hedged pool request"""
+        self.backend = backend
+        self.hedge = hedge
+        self.cancel = CancelToken()
+        self.start_time = time.time()
+        self.first_token = None
+        self.result = None
+        self.latency = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def failed(self) -> bool:
+        """Whether the attempt finished with an error"""
+        return self.result is not None and 'error' in self.result
+
+    def finish(self, result: Dict[str, Any]):
+        """Store the result and run the callbacks waiting for it"""
+        with self._lock:
+            self.latency = time.time() - self.start_time
+            self.result = result
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def when_done(self, callback):
+        """Run a callback once the attempt has finished (now, if it already has)"""
+        with self._lock:
+            if self.result is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+def parse_backend_spec(spec: str, default_provider: str = "Ollama") -> Backend:
+    """Parse 'host:port', 'Ollama@host:port' or 'LM Studio@host:port' into a Backend"""
+    spec = spec.strip()
+    provider = default_provider
+    if "@" in spec:
+        provider, spec = [part.strip() for part in spec.split("@", 1)]
+        if provider.lower() in ("lmstudio", "lm studio", "lm_studio"):
+            provider = "LM Studio"
+        elif provider.lower() == "ollama":
+            provider = "Ollama"
+        else:
+            raise ValueError(f"Unknown provider in backend spec: {provider}")
+    if ":" in spec:
+        host, port = spec.rsplit(":", 1)
+    else:
+        host, port = spec, DEFAULT_PORTS[provider]
+    return Backend(provider, host, port)
+
+def parse_backend_specs(text: str, default_provider: str = "Ollama") -> List[Backend]:
+    """Parse a comma or newline separated list of backend specs"""
+    specs = [s for s in text.replace(",", "\n").splitlines() if s.strip()]
+    return [parse_backend_spec(s, default_provider) for s in specs]
+
+class BackendPool:
+    def __init__(self,
+                 backends: List[Backend] = None,
+                 client: OllamaClient = None,
+                 monitor: HealthMonitor = None,
+                 strategy: str = "least_outstanding",
+                 failure_cooldown: float = 30.0,
+                 ewma_alpha: float = 0.3,
+                 hedging: HedgePolicy = None):
+        """Initialize the backend pool"""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown routing strategy: {strategy}. Use one of {STRATEGIES}.")
+        self.client = client or OllamaClient()
+        self.monitor = monitor or get_health_monitor()
+        self.strategy = strategy
+        self.failure_cooldown = failure_cooldown
+        self.ewma_alpha = ewma_alpha
+        # Off unless enabled; kept either way so the TTFT window survives toggling
+        self.hedging = hedging or HedgePolicy()
+        self._lock = threading.Lock()
+        self._backends: List[Backend] = []
+        self._round_robin = itertools.count()
+        for backend in backends or []:
+            self.add_backend(backend)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> Optional["BackendPool"]:
+        """Build a pool from TREND_CYBERTRON_BACKENDS, or None if it is not set"""
+        text = os.environ.get("TREND_CYBERTRON_BACKENDS", "")
+        if not text.strip():
+            return None
+        strategy = os.environ.get("TREND_CYBERTRON_ROUTING", kwargs.pop("strategy", "least_outstanding"))
+        kwargs.setdefault("hedging", HedgePolicy.from_env())
+        return cls(parse_backend_specs(text), strategy=strategy, **kwargs)
+
+    def add_backend(self, backend: Backend):
+        """Add a backend and register it with the health monitor"""
+        with self._lock:
+            if any(b.key() == backend.key() for b in self._backends):
+                return
+            self._backends.append(backend)
+        self.monitor.add_endpoint(backend.provider, backend.host, backend.port, persistent=True)
+
+    def configure(self, backends: List[Backend], strategy: str = None):
+        """Replace the backend list, keeping counters for backends that stay"""
+        if strategy is not None:
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown routing strategy: {strategy}. Use one of {STRATEGIES}.")
+            self.strategy = strategy
+        with self._lock:
+            existing = {b.key(): b for b in self._backends}
+            self._backends = [existing.get(b.key(), b) for b in backends]
+            kept = {b.key() for b in self._backends}
+        for backend in backends:
+            self.monitor.add_endpoint(backend.provider, backend.host, backend.port, persistent=True)
+        # Dropped backends are still probed while something else (e.g. the sidebar) uses them
+        for key, backend in existing.items():
+            if key not in kept:
+                self.monitor.release_endpoint(backend.provider, backend.host, backend.port)
+
+    def backends(self) -> List[Backend]:
+        """List configured backends"""
+        with self._lock:
+            return list(self._backends)
+
+    def get_pool_status(self) -> List[Dict[str, Any]]:
+        """Routing counters combined with cached health for every backend"""
+        statuses = []
+        for backend in self.backends():
+            info = backend.to_dict()
+            health = self.monitor.get_status(backend.provider, backend.host, backend.port)
+            info['status'] = health['status']
+            info['models'] = health['models']
+            info['stale'] = health['stale']
+            statuses.append(info)
+        return statuses
+
+    def _eligibility(self, backend: Backend, model: str, now: float) -> int:
+        """Rank a backend for a model: 0 = preferred, 1 = unverified, 2 = last resort, None = ineligible"""
+        health = self.monitor.get_status(backend.provider, backend.host, backend.port)
+        if health['status'] == 'healthy' and health['models'] and model not in health['models']:
+            return None
+        if backend.cooldown_until > now or health['status'] == 'unhealthy':
+            return 2
+        if health['status'] == 'unknown':
+            return 1
+        return 0
+
+    def _score(self, backend: Backend) -> float:
+        """Lower is better; depends on the routing strategy"""
+        if self.strategy == "least_outstanding":
+            return backend.outstanding / backend.weight
+        latency = backend.ewma_latency
+        if latency is None:
+            health = self.monitor.get_status(backend.provider, backend.host, backend.port)
+            latency = health['response_time'] or 1.0
+        return latency * (1 + backend.outstanding) / backend.weight
+
+    def candidates(self, model: str, provider: str = None) -> List[Backend]:
+        """Order eligible backends for a model, best first"""
+        now = time.time()
+        offset = next(self._round_robin)
+        ranked = []
+        with self._lock:
+            backends = list(self._backends)
+        for index, backend in enumerate(backends):
+            if provider is not None and backend.provider != provider:
+                continue
+            tier = self._eligibility(backend, model, now)
+            if tier is None:
+                continue
+            # Rotate ties so equally loaded backends share work
+            tie_breaker = (index - offset) % len(backends)
+            ranked.append((tier, self._score(backend), tie_breaker, backend))
+        ranked.sort(key=lambda item: item[:3])
+        return [item[3] for item in ranked]
+
+    def _record(self, backend: Backend, latency: Optional[float], failed: bool):
+        """Update routing counters after a request finishes (latency None: not a real model call)"""
+        with self._lock:
+            backend.outstanding -= 1
+            backend.total_requests += 1
+            if failed:
+                backend.total_failures += 1
+                backend.cooldown_until = time.time() + self.failure_cooldown
+            elif latency is not None:
+                backend.cooldown_until = 0.0
+                if backend.ewma_latency is None:
+                    backend.ewma_latency = latency
+                else:
+                    backend.ewma_latency = (self.ewma_alpha * latency +
+                                            (1 - self.ewma_alpha) * backend.ewma_latency)
+
+    def generate_response(self, prompt: str, model: str, provider: str = None,
+                          max_retries: int = 1, hedge: bool = None, hedge_budget: float = None,
+                          **kwargs) -> Dict[str, Any]:
+        """Generate a response on the best backend, failing over to the next one on error
+
+        With hedging on a request that has no first token after the model's p95
+        time to first token is also sent to the next backend; the first to answer
+        wins and the other is cancelled. `hedge` and `hedge_budget` override the
+        pool's policy for this request (None: use the policy's settings).
+        """
+        if hedge is None:
+            hedge = self.hedging.enabled
+        candidates = self.candidates(model, provider)
+        routing = {
+            'strategy': self.strategy,
+            'candidates': [b.name for b in candidates],
+            'attempts': [],
+            'backend': None,
+            'failovers': 0
+        }
+        if not candidates:
+            result = self.client._error_result(f"No backend in the pool can serve model {model}")
+            result['routing'] = routing
+            return result
+
+        result = None
+        # Hedging onto a backend that is cooling down or unhealthy would only add load to it
+        if (hedge and len(candidates) > 1 and not kwargs.get('stream')
+                and self._eligibility(candidates[1], model, time.time()) != 2):
+            result, tried = self._generate_hedged(candidates, routing, prompt, model, max_retries, kwargs,
+                                                  hedge_budget)
+            if routing['backend'] is not None:
+                result['routing'] = routing
+                return result
+            # Both hedged attempts failed (or the primary did before a hedge): fail over as usual
+            candidates = [b for b in candidates if b not in tried]
+            if not candidates:
+                routing['failovers'] -= 1
+                result['routing'] = routing
+                return result
+
+        for backend in candidates:
+            with self._lock:
+                backend.outstanding += 1
+            start_time = time.time()
+            try:
+                result = self.client.generate_response(
+                    prompt=prompt,
+                    model=model,
+                    host=backend.host,
+                    port=backend.port,
+                    provider=backend.provider,
+                    max_retries=max_retries,
+                    **kwargs
+                )
+            except Exception as e:
+                result = self.client._error_result(f"Unexpected error: {e}")
+            latency = time.time() - start_time
+            failed = 'error' in result
+            # Semantic cache hits say nothing about the backend's speed
+            self._record(backend, None if result.get('cached') else latency, failed)
+            routing['attempts'].append({
+                'backend': backend.name,
+                'outcome': 'error' if failed else 'ok',
+                'latency': round(latency, 3)
+            })
+            if not failed:
+                routing['backend'] = backend.name
+                break
+            routing['failovers'] += 1
+            self.monitor.request_probe(backend.provider, backend.host, backend.port)
+            logger.warning(f"Backend {backend.name} failed, failing over: {result['error']}")
+
+        if routing['backend'] is None:
+            # Every candidate failed; the final attempt is not a failover
+            routing['failovers'] -= 1
+        result['routing'] = routing
+        return result
+
+    def _start_attempt(self, backend: Backend, hedge: bool, events: "queue.Queue", prompt: str, model: str,
+                       max_retries: int, kwargs: Dict[str, Any]) -> _Attempt:
+        """Run one attempt of a hedged request on its own thread, reporting to `events`"""
+        attempt = _Attempt(backend, hedge)
+        with self._lock:
+            backend.outstanding += 1
+
+        def on_first_token():
+            attempt.first_token = time.time() - attempt.start_time
+            events.put(("first_token", attempt))
+
+        def run():
+            try:
+                result = self.client.generate_response(
+                    prompt=prompt,
+                    model=model,
+                    host=backend.host,
+                    port=backend.port,
+                    provider=backend.provider,
+                    max_retries=max_retries,
+                    on_first_token=on_first_token,
+                    cancel=attempt.cancel,
+                    **kwargs
+                )
+            except Exception as e:
+                result = self.client._error_result(f"Unexpected error: {e}")
+            cancelled = result.get('cancelled', False)
+            failed = 'error' in result and not cancelled
+            # A cancelled loser says nothing about its backend
+            self._record(backend, None if result.get('cached') or cancelled else attempt.latency, failed)
+            # Slow losers count too, or the threshold would only learn from the fast backends
+            if attempt.first_token is not None:
+                self.hedging.observe(model, attempt.first_token)
+            if failed:
+                self.monitor.request_probe(backend.provider, backend.host, backend.port)
+            attempt.finish(result)
+            events.put(("done", attempt))
+
+        threading.Thread(target=run, daemon=True, name=f"hedge-{backend.name}").start()
+        return attempt
+
+    def _generate_hedged(self, candidates: List[Backend], routing: Dict[str, Any], prompt: str, model: str,
+                         max_retries: int, kwargs: Dict[str, Any], budget: float = None):
+        """Send to the best backend and, past the hedge threshold, to the runner-up; returns (result, tried)"""
+        policy = self.hedging
+        policy.start_request(budget)
+        threshold = policy.threshold(model)
+        routing['hedge_threshold'] = round(threshold, 3) if threshold is not None else None
+        routing['hedged'] = False
+        # Queue notices come from worker threads here, where a UI callback cannot draw
+        kwargs = {k: v for k, v in kwargs.items() if k != 'on_queued'}
+        events = queue.Queue()
+        request_start = time.time()
+        attempts = [self._start_attempt(candidates[0], False, events, prompt, model, max_retries, kwargs)]
+        winner = None
+        outcome = "warmup" if threshold is None else "fast"
+        can_hedge = threshold is not None
+
+        while True:
+            running = [a for a in attempts if a.result is None]
+            timeout = None
+            if can_hedge and winner is None and len(attempts) == 1:
+                timeout = max(0.0, request_start + threshold - time.time())
+            try:
+                kind, attempt = events.get(timeout=timeout)
+            except queue.Empty:
+                can_hedge = False
+                if policy.try_hedge():
+                    routing['hedged'] = True
+                    outcome = "hedged"
+                    logger.info(f"No first token from {candidates[0].name} after {threshold:.2f}s, "
+                                f"hedging to {candidates[1].name}")
+                    attempts.append(self._start_attempt(candidates[1], True, events, prompt, model,
+                                                        max_retries, kwargs))
+                else:
+                    outcome = "budget"
+                continue
+
+            if kind == "first_token" or (kind == "done" and not attempt.failed()):
+                if winner is None:
+                    winner = attempt
+                    for other in attempts:
+                        if other is not attempt and other.result is None:
+                            other.cancel.set()
+                if kind == "done" and attempt is winner:
+                    break
+            elif kind == "done" and attempt.failed() and winner is None:
+                if not [a for a in running if a is not attempt]:
+                    break
+            elif kind == "done" and attempt is winner:
+                break
+
+        for attempt in attempts:
+            if attempt.cancel.is_set() and attempt.result is None:
+                outcome_name = 'cancelled'
+                latency = time.time() - attempt.start_time
+            else:
+                outcome_name = 'error' if attempt.failed() else 'ok'
+                if attempt.result is not None and attempt.result.get('cancelled'):
+                    outcome_name = 'cancelled'
+                latency = attempt.latency if attempt.latency is not None else time.time() - attempt.start_time
+            routing['attempts'].append({
+                'backend': attempt.backend.name,
+                'outcome': outcome_name,
+                'latency': round(latency, 3),
+                'hedge': attempt.hedge
+            })
+
+        primary = attempts[0]
+        if winner is not None and not winner.failed():
+            routing['backend'] = winner.backend.name
+            served = (winner.start_time - request_start) + (winner.first_token or winner.latency)
+            if outcome == "hedged":
+                outcome = "hedge_won" if winner.hedge else "primary_won"
+
+            def record():
+                # A cancelled primary still reports its first token when it arrives; if it
+                # failed instead, the time it took is a lower bound on the wait without a hedge
+                unhedged = primary.first_token if primary.first_token is not None else primary.latency
+                policy.record(outcome, served, unhedged)
+            primary.when_done(record)
+            return winner.result, [a.backend for a in attempts]
+
+        routing['failovers'] += len(attempts)
+        policy.record("failed")
+        for attempt in attempts:
+            if attempt.failed():
+                logger.warning(f"Backend {attempt.backend.name} failed, failing over: {attempt.result['error']}")
+        result = attempts[-1].result if winner is None else winner.result
+        return result, [a.backend for a in attempts]
+
+    def get_hedge_stats(self) -> Dict[str, Any]:
+        """Hedge rate and time-to-first-token tails of hedged routing"""
+        return self.hedging.get_stats()
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def get_backend_pool() -> BackendPool:
+    """Get the process-wide backend pool (seeded from TREND_CYBERTRON_BACKENDS if set)"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_lock:
+            if _default_pool is None:
+                _default_pool = BackendPool.from_env() or BackendPool()
+    return _default_pool
@@ -0,0 +1,139 @@
+"""
+Context Builder for Trend Cybertron App
+Builds multi-turn chat messages under an explicit token budget: the system
+prompt is pinned, recent turns are kept and older turns are folded into a
+rolling summary
+"""
+
+from typing import Callable, Dict, List, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Security text is dense with IPs, hashes and paths, which tokenize worse than prose
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (no tokenizer round-trip)"""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate tokens for a list of chat messages including per-message overhead"""
+    return sum(estimate_tokens(m.get('content', '')) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text down to roughly max_tokens, keeping the head or the tail"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    if keep == "tail":
+        return "..." + text[-max_chars:]
+    return text[:max_chars] + "..."
+
+def extractive_summary(previous_summary: str, dropped: List[Dict[str, str]], max_tokens: int) -> str:
+    """Summarize dropped turns without a model call by keeping the gist of each turn"""
+    lines = previous_summary.splitlines() if previous_summary else []
+    line_tokens = max(8, min(60, max_tokens // 4))
+    for message in dropped:
+        content = " ".join(message.get('content', '').split())
+        if message.get('role') == 'user':
+            lines.append(f"- Analyst asked: {truncate_to_tokens(content, line_tokens)}")
+        else:
+            lines.append(f"- Assistant answered: {truncate_to_tokens(content, line_tokens)}")
+    # Rolling: when the summary outgrows its budget the oldest lines go first
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def llm_summarizer(generate: Callable[..., Dict[str, Any]]) -> Callable[[str, List[Dict[str, str]], int], str]:
+    """Build a summarizer that asks the model to fold dropped turns into the summary"""
+    def summarize(previous_summary: str, dropped: List[Dict[str, str]], max_tokens: int) -> str:
+        transcript = "\n\n".join(f"{m['role'].upper()}: {m['content']}" for m in dropped)
+        prompt = (
+            "Update the running summary of a security investigation conversation. Preserve every "
+            "indicator (IPs, domains, hashes, CVEs, hostnames, accounts), decision and open question. "
+            f"Answer with the updated summary only, at most {int(max_tokens * 0.75)} words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        result = generate(prompt=prompt, max_tokens=max_tokens)
+        if 'error' in result:
+            logger.warning(f"Summary generation failed, using extractive summary: {result['error']}")
+            return extractive_summary(previous_summary, dropped, max_tokens)
+        return truncate_to_tokens(result['response'].strip(), max_tokens)
+    return summarize
+
+class ContextBuilder:
+    def __init__(self,
+                 token_budget: int = 4096,
+                 summary_ratio: float = 0.2,
+                 summarizer: Callable[[str, List[Dict[str, str]], int], str] = None):
+        """Initialize the context builder"""
+        self.token_budget = token_budget
+        self.summary_ratio = summary_ratio
+        self.summarizer = summarizer or extractive_summary
+
+    def build(self,
+              system_prompt: str,
+              history: List[Dict[str, str]],
+              prompt: str,
+              state: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Build chat messages for a new prompt; `state` carries the rolling summary between calls"""
+        state = state if state is not None else {}
+        summary = state.get('summary', "")
+        covered = min(state.get('covered', 0), len(history))
+
+        pinned = []
+        if system_prompt:
+            pinned.append({"role": "system", "content": system_prompt})
+        current = {"role": "user", "content": prompt}
+        fixed_tokens = estimate_message_tokens(pinned + [current])
+        available = max(0, self.token_budget - fixed_tokens)
+
+        candidates = [(index, m) for index, m in enumerate(history)
+                      if index >= covered and not self._is_error(m)]
+        candidate_tokens = estimate_message_tokens([m for _, m in candidates])
+        needs_summary = bool(summary) or candidate_tokens > available
+        summary_budget = int(available * self.summary_ratio) if needs_summary else 0
+
+        # Keep the newest turns that fit next to the (reserved) summary
+        kept = []
+        used = 0
+        for index, message in reversed(candidates):
+            tokens = estimate_message_tokens([message])
+            if used + tokens > available - summary_budget:
+                break
+            kept.insert(0, (index, message))
+            used += tokens
+        # Never start the window on an orphaned assistant reply
+        while kept and kept[0][1]['role'] != 'user':
+            used -= estimate_message_tokens([kept.pop(0)[1]])
+
+        dropped = [m for _, m in candidates[:len(candidates) - len(kept)]]
+        if dropped:
+            summary = self.summarizer(summary, dropped, summary_budget)
+            # Everything before the first kept turn is now represented by the summary
+            state['summary'] = summary
+            state['covered'] = kept[0][0] if kept else len(history)
+
+        messages = list(pinned)
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        messages.extend(m for _, m in kept)
+        messages.append(current)
+
+        return {
+            'messages': messages,
+            'prompt_tokens': estimate_message_tokens(messages),
+            'kept_turns': len(kept),
+            'dropped_turns': len(dropped),
+            'summarized': bool(summary),
+            'over_budget': fixed_tokens > self.token_budget
+        }
+
+    @staticmethod
+    def _is_error(message: Dict[str, str]) -> bool:
+        """Failed generations are not useful context"""
+        return message.get('role') == 'assistant' and message.get('content', '').startswith(("Error", "❌"))
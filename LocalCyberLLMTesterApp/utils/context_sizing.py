@@ -0,0 +1,188 @@
+"""
+Context Sizing for Trend Cybertron App
+Chooses num_ctx per request from a small set of buckets so prompts are not
+truncated, KV-cache memory is not wasted and Ollama does not reload the
+model every time the requested context size changes
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import logging
+
+from context_builder import CHARS_PER_TOKEN, estimate_message_tokens, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+DEFAULT_MODEL_LIMIT = 8192
+# Prompt plus response of a typical request (the app's default max_tokens is 2000)
+DEFAULT_EXPECTED_TOKENS = 2500
+
+class ContextSizer:
+    def __init__(self,
+                 buckets: Tuple[int, ...] = CONTEXT_BUCKETS,
+                 default_model_limit: int = DEFAULT_MODEL_LIMIT,
+                 headroom: float = 1.1,
+                 limit_lookup: Callable[[str, str, str], Optional[int]] = None,
+                 event_history: int = 200,
+                 fallback_ttl: float = 60.0,
+                 expected_tokens: int = DEFAULT_EXPECTED_TOKENS):
+        """Initialize the context sizer"""
+        self.buckets = tuple(sorted(buckets))
+        self.default_model_limit = default_model_limit
+        # The token estimate is approximate; leave some slack before picking a bucket
+        self.headroom = headroom
+        self.limit_lookup = limit_lookup
+        # A failed lookup falls back to the default only this long, so a backend that was down is asked again
+        self.fallback_ttl = fallback_ttl
+        # What a model is preloaded for before any request has picked its bucket
+        self.expected_tokens = expected_tokens
+        self._lock = threading.Lock()
+        self._current: Dict[Tuple[str, str, str], int] = {}
+        # (limit, expiry); looked-up limits never expire, fallbacks do
+        self._limits: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+        self.events = deque(maxlen=event_history)
+        self.total_requests = 0
+        self.total_reloads = 0
+        self.total_overflows = 0
+
+    def model_limit(self, host: str, port: str, model: str) -> int:
+        """Maximum context length of a model (looked up once per backend and model)"""
+        key = (str(host), str(port), model)
+        with self._lock:
+            cached = self._limits.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        limit = None
+        if self.limit_lookup is not None:
+            try:
+                limit = self.limit_lookup(host, port, model)
+            except Exception as e:
+                logger.warning(f"Could not look up context length for {model}: {e}")
+        expires = float("inf")
+        if not limit:
+            limit = self.default_model_limit
+            expires = time.time() + self.fallback_ttl
+        with self._lock:
+            self._limits[key] = (limit, expires)
+        return limit
+
+    def forget_model(self, host: str, port: str, model: str):
+        """Drop a model's cached context length, e.g. after it was pulled or updated"""
+        with self._lock:
+            self._limits.pop((str(host), str(port), model), None)
+
+    def expected_num_ctx(self, host: str, port: str, model: str) -> int:
+        """num_ctx to load a model with: its current bucket, else the one a typical request would pick"""
+        with self._lock:
+            current = self._current.get((str(host), str(port), model))
+        if current is not None:
+            return current
+        limit = self.model_limit(host, port, model)
+        required = int(self.expected_tokens * self.headroom)
+        fitting = [b for b in self.buckets if b >= required and b <= limit]
+        return fitting[0] if fitting else limit
+
+    def record_loaded(self, host: str, port: str, model: str, num_ctx: int):
+        """Note the bucket a model was loaded with outside a request, unless a request already set one"""
+        with self._lock:
+            self._current.setdefault((str(host), str(port), model), num_ctx)
+
+    def choose(self, host: str, port: str, model: str, prompt_tokens: int, max_tokens: int) -> Dict[str, Any]:
+        """Pick num_ctx for a request; reuses the model's current bucket whenever it is large enough"""
+        key = (str(host), str(port), model)
+        limit = self.model_limit(host, port, model)
+        required = int((prompt_tokens + max_tokens) * self.headroom)
+
+        with self._lock:
+            self.total_requests += 1
+            previous = self._current.get(key)
+            if previous is not None and previous >= required:
+                # A bigger-than-needed window is cheaper than a model reload
+                return {
+                    'num_ctx': previous,
+                    'required': required,
+                    'model_limit': limit,
+                    'reload': False,
+                    'overflow': False
+                }
+
+            fitting = [b for b in self.buckets if b >= required and b <= limit]
+            overflow = not fitting
+            num_ctx = fitting[0] if fitting else limit
+            if overflow:
+                self.total_overflows += 1
+                logger.warning(
+                    f"Request for {model} needs ~{required} tokens but the model supports {limit}; input will be trimmed"
+                )
+
+            reload = previous is not None and previous != num_ctx
+            self._current[key] = num_ctx
+            if reload:
+                self.total_reloads += 1
+                self.events.append({
+                    'time': time.time(),
+                    'backend': f"{host}:{port}",
+                    'model': model,
+                    'from': previous,
+                    'to': num_ctx
+                })
+                logger.info(f"num_ctx for {model} on {host}:{port} changed {previous} -> {num_ctx} (model reload)")
+
+        return {
+            'num_ctx': num_ctx,
+            'required': required,
+            'model_limit': limit,
+            'reload': reload,
+            'overflow': overflow
+        }
+
+    def fit_messages(self, messages: List[Dict[str, str]], max_prompt_tokens: int) -> List[Dict[str, str]]:
+        """Trim messages to fit: drop the oldest non-system turns, then shorten the last message"""
+        messages = list(messages)
+        while estimate_message_tokens(messages) > max_prompt_tokens:
+            droppable = [i for i, m in enumerate(messages[:-1]) if m.get('role') != 'system']
+            if not droppable:
+                break
+            messages.pop(droppable[0])
+        overshoot = estimate_message_tokens(messages) - max_prompt_tokens
+        if overshoot > 0:
+            last = dict(messages[-1])
+            last['content'] = self.fit_text(last['content'], estimate_tokens(last['content']) - overshoot)
+            messages[-1] = last
+        return messages
+
+    @staticmethod
+    def fit_text(text: str, max_tokens: int) -> str:
+        """Shorten text to about max_tokens, keeping its beginning and end"""
+        max_chars = max(0, int(max_tokens * CHARS_PER_TOKEN))
+        if len(text) <= max_chars:
+            return text
+        marker = "\n...[truncated to fit the model context]...\n"
+        keep = max(0, max_chars - len(marker))
+        return text[:keep // 2] + marker + text[len(text) - keep // 2:]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Bucket assignments and reload history"""
+        with self._lock:
+            return {
+                'total_requests': self.total_requests,
+                'total_reloads': self.total_reloads,
+                'total_overflows': self.total_overflows,
+                'current_buckets': {f"{h}:{p} {m}": n for (h, p, m), n in self._current.items()},
+                'recent_reloads': list(self.events)
+            }
+
+_default_sizer = None
+_default_lock = threading.Lock()
+
+def get_context_sizer() -> ContextSizer:
+    """Get the process-wide context sizer (bucket state is per backend, shared by all sessions)"""
+    global _default_sizer
+    if _default_sizer is None:
+        with _default_lock:
+            if _default_sizer is None:
+                _default_sizer = ContextSizer()
+    return _default_sizer
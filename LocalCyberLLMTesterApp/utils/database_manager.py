@@ -8,11 +8,36 @@ import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import os
+import time
+
+from ioc_extractor import classify, extract_conversation_iocs
+from metrics import FAST_BUCKETS, get_registry, timed
+from tracing import get_tracer
+
+_metrics = get_registry()
+DB_QUERY_SECONDS = _metrics.histogram(
+    "trendcybertron_db_query_seconds", "DatabaseManager call latency by method", ("method",), buckets=FAST_BUCKETS)
+DB_SIZE_BYTES = _metrics.gauge(
+    "trendcybertron_db_size_bytes", "Size of the SQLite database including its WAL", ("path",))
+IOCS_INDEXED = _metrics.counter(
+    "trendcybertron_iocs_indexed_total", "IOC rows added to the index from saved conversations (duplicates skipped)", ("type",))
+_db_paths = set()
+
+def _collect_db_size():
+    """Publish database file sizes (runs at scrape time)"""
+    for path in list(_db_paths):
+        size = sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+        DB_SIZE_BYTES.set(size, path=path)
+
+_metrics.register_collector(_collect_db_size)
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "database/conversations.db"):
+    def __init__(self, db_path: str = "database/conversations.db", vector_index=None):
         """Initialize the database manager"""
         self.db_path = db_path
+        # Optional ConversationIndex kept up to date as messages are saved
+        self.vector_index = vector_index
+        _db_paths.add(db_path)
         self.ensure_database_directory()
         self.init_database()
     
@@ -61,6 +86,18 @@ class DatabaseManager:
                 )
             """)
             
+            # Create IOC table (one row per indicator per conversation; the
+            # primary key doubles as the value/type lookup index)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS iocs (
+                    value TEXT NOT NULL,
+                    ioc_type TEXT NOT NULL,
+                    conversation_id INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    PRIMARY KEY (value, ioc_type, conversation_id)
+                ) WITHOUT ROWID
+            """)
+            
             # Create indexes for better performance
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_conversations_tab_name 
@@ -77,10 +114,16 @@ class DatabaseManager:
                 ON conversations(session_id)
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_iocs_conversation_id 
+                ON iocs(conversation_id)
+            """)
+            
             conn.commit()
         finally:
             conn.close()
     
+    @timed(DB_QUERY_SECONDS)
     def save_message(self, 
                     tab_name: str, 
                     user_message: str, 
@@ -93,6 +136,8 @@ class DatabaseManager:
         """Save a conversation message to the database"""
         if session_id is None:
             session_id = self.get_current_session_id()
+        # Extract before opening the write transaction so the lock is held briefly
+        iocs = extract_conversation_iocs(user_message, assistant_response)
         
         # Use WAL mode and timeout for better concurrency
         conn = sqlite3.connect(self.db_path, timeout=30.0)
@@ -111,11 +156,14 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (tab_name, user_message, assistant_response, system_prompt,
                   model, temperature, max_tokens, session_id))
+            self._insert_iocs(cursor, cursor.lastrowid, iocs)
             
             # Update session activity
             self.update_session_activity(session_id, conn)
             
             conn.commit()
+            if self.vector_index is not None:
+                self.vector_index.enqueue(cursor.lastrowid, tab_name, user_message, assistant_response)
             return cursor.lastrowid
         except Exception as e:
             conn.rollback()
@@ -123,6 +171,123 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def _insert_iocs(self, cursor, conversation_id: int, iocs: List[tuple]) -> int:
+        """Index a conversation's IOCs; returns how many rows were new"""
+        rows: Dict[str, List[tuple]] = {}
+        for ioc_type, value, source in iocs:
+            rows.setdefault(ioc_type, []).append((value, ioc_type, conversation_id, source))
+        inserted = 0
+        # One statement per type so rowcount gives the rows INSERT OR IGNORE actually added per type
+        for ioc_type, values in rows.items():
+            cursor.executemany("""
+                INSERT OR IGNORE INTO iocs (value, ioc_type, conversation_id, source)
+                VALUES (?, ?, ?, ?)
+            """, values)
+            added = max(cursor.rowcount, 0)
+            if added:
+                IOCS_INDEXED.inc(added, type=ioc_type)
+            inserted += added
+        return inserted
+    
+    @timed(DB_QUERY_SECONDS)
+    def find_conversations_by_ioc(self, value: str, ioc_type: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get every conversation mentioning an indicator (defanged input is accepted), newest first"""
+        classified = classify(value)
+        if classified:
+            ioc_type = ioc_type or classified[0]
+            value = classified[1]
+        else:
+            value = value.strip().lower()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            type_filter = "AND i.ioc_type = ?" if ioc_type else ""
+            cursor.execute(f"""
+                SELECT c.*, i.ioc_type, i.value AS ioc_value, i.source AS ioc_source 
+                FROM iocs i JOIN conversations c ON c.id = i.conversation_id 
+                WHERE i.value = ? {type_filter} 
+                ORDER BY c.id DESC 
+                LIMIT ?
+            """, [value] + ([ioc_type] if ioc_type else []) + [limit])
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    @timed(DB_QUERY_SECONDS)
+    def get_conversation_iocs(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Get the IOCs indexed for one conversation"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT ioc_type, value, source FROM iocs 
+                WHERE conversation_id = ? 
+                ORDER BY ioc_type, value
+            """, (conversation_id,))
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    @timed(DB_QUERY_SECONDS)
+    def get_top_iocs(self, limit: int = 20, ioc_type: str = None) -> List[Dict[str, Any]]:
+        """Get the indicators mentioned in the most conversations"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            type_filter = "WHERE ioc_type = ?" if ioc_type else ""
+            cursor.execute(f"""
+                SELECT ioc_type, value, COUNT(*) AS conversations FROM iocs 
+                {type_filter} 
+                GROUP BY value, ioc_type 
+                ORDER BY conversations DESC 
+                LIMIT ?
+            """, ([ioc_type] if ioc_type else []) + [limit])
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    @timed(DB_QUERY_SECONDS)
+    def backfill_iocs(self, batch_size: int = 500, progress=None) -> Dict[str, Any]:
+        """Index the IOCs of every saved conversation (idempotent; used after upgrading an existing database)"""
+        stats = {'conversations': 0, 'iocs': 0, 'megabytes': 0.0, 'seconds': 0.0, 'mb_per_second': 0.0}
+        start_time = time.perf_counter()
+        extract_seconds = 0.0
+        text_bytes = 0
+        last_id = 0
+        while True:
+            rows = self.get_conversations_after(last_id, batch_size)
+            if not rows:
+                break
+            extract_start = time.perf_counter()
+            batch = []
+            for row in rows:
+                text_bytes += len(row['user_message'].encode("utf-8")) + len(row['assistant_response'].encode("utf-8"))
+                batch.append((row['id'], extract_conversation_iocs(row['user_message'], row['assistant_response'])))
+            extract_seconds += time.perf_counter() - extract_start
+            
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            try:
+                cursor = conn.cursor()
+                for conversation_id, iocs in batch:
+                    stats['iocs'] += self._insert_iocs(cursor, conversation_id, iocs)
+                conn.commit()
+            finally:
+                conn.close()
+            
+            last_id = rows[-1]['id']
+            stats['conversations'] += len(rows)
+            if progress:
+                progress(stats)
+        
+        stats['megabytes'] = round(text_bytes / (1024 * 1024), 2)
+        stats['seconds'] = round(time.perf_counter() - start_time, 3)
+        stats['mb_per_second'] = round(text_bytes / (1024 * 1024) / extract_seconds, 2) if extract_seconds else 0.0
+        return stats
+    
+    @timed(DB_QUERY_SECONDS)
     def get_conversation_history(self, tab_name: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get conversation history for a specific tab"""
         with sqlite3.connect(self.db_path) as conn:
@@ -139,6 +304,60 @@ class DatabaseManager:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @timed(DB_QUERY_SECONDS)
+    def get_session_turns(self, tab_name: str, session_id: str, limit: int = 50) -> List[Dict[str, str]]:
+        """Get a session's conversation in a tab as chronological chat messages"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT user_message, assistant_response FROM (
+                    SELECT id, user_message, assistant_response FROM conversations 
+                    WHERE tab_name = ? AND session_id = ? 
+                    ORDER BY id DESC 
+                    LIMIT ?
+                ) ORDER BY id ASC
+            """, (tab_name, session_id, limit))
+            
+            turns = []
+            for user_message, assistant_response in cursor.fetchall():
+                turns.append({"role": "user", "content": user_message})
+                turns.append({"role": "assistant", "content": assistant_response})
+            return turns
+    
+    @timed(DB_QUERY_SECONDS)
+    def get_conversations_after(self, last_id: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Get conversations with an id greater than last_id, oldest first (for incremental indexing)"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, tab_name, user_message, assistant_response FROM conversations 
+                WHERE id > ? 
+                ORDER BY id 
+                LIMIT ?
+            """, (last_id, limit))
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    @timed(DB_QUERY_SECONDS)
+    def get_conversations_by_ids(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Get conversations by id, in the order of the ids given (missing ids are skipped)"""
+        if not ids:
+            return []
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            placeholders = ",".join("?" * len(ids))
+            cursor.execute(f"SELECT * FROM conversations WHERE id IN ({placeholders})", list(ids))
+            
+            rows = {row['id']: dict(row) for row in cursor.fetchall()}
+            return [rows[i] for i in ids if i in rows]
+    
+    @timed(DB_QUERY_SECONDS)
     def get_all_conversations(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all conversations across all tabs"""
         with sqlite3.connect(self.db_path) as conn:
@@ -154,21 +373,32 @@ class DatabaseManager:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @timed(DB_QUERY_SECONDS)
     def clear_conversation(self, tab_name: str):
         """Clear conversation history for a specific tab"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM conversations WHERE tab_name = ?", (tab_name,))
+            self._delete_orphan_iocs(cursor)
             conn.commit()
     
+    @timed(DB_QUERY_SECONDS)
     def clear_all_conversations(self):
         """Clear all conversation history"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM conversations")
             cursor.execute("DELETE FROM sessions")
+            cursor.execute("DELETE FROM iocs")
             conn.commit()
+        if self.vector_index is not None:
+            self.vector_index.clear()
+    
+    def _delete_orphan_iocs(self, cursor):
+        """Drop IOC rows whose conversation was deleted"""
+        cursor.execute("DELETE FROM iocs WHERE conversation_id NOT IN (SELECT id FROM conversations)")
     
+    @timed(DB_QUERY_SECONDS)
     def get_database_status(self) -> Dict[str, Any]:
         """Get database status and statistics"""
         with sqlite3.connect(self.db_path) as conn:
@@ -194,6 +424,13 @@ class DatabaseManager:
             """)
             recent_activity = cursor.fetchone()[0]
             
+            # Get indexed IOCs by type
+            cursor.execute("""
+                SELECT ioc_type, COUNT(DISTINCT value) FROM iocs 
+                GROUP BY ioc_type
+            """)
+            iocs_by_type = dict(cursor.fetchall())
+            
             # Get database size
             db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
             
@@ -201,10 +438,12 @@ class DatabaseManager:
                 'total_conversations': total_conversations,
                 'conversations_by_tab': conversations_by_tab,
                 'recent_activity': recent_activity,
+                'iocs_by_type': iocs_by_type,
                 'database_size_bytes': db_size,
                 'database_size_mb': round(db_size / (1024 * 1024), 2)
             }
     
+    @timed(DB_QUERY_SECONDS)
     def export_conversations(self, format: str = 'json') -> Any:
         """Export conversations in specified format"""
         conversations = self.get_all_conversations()
@@ -218,6 +457,7 @@ class DatabaseManager:
         else:
             raise ValueError("Unsupported format. Use 'json' or 'csv'.")
     
+    @timed(DB_QUERY_SECONDS)
     def search_conversations(self, query: str, tab_name: str = None) -> List[Dict[str, Any]]:
         """Search conversations by content"""
         with sqlite3.connect(self.db_path) as conn:
@@ -272,6 +512,7 @@ class DatabaseManager:
             if should_close:
                 conn.close()
     
+    @timed(DB_QUERY_SECONDS)
     def get_session_statistics(self) -> Dict[str, Any]:
         """Get session statistics"""
         with sqlite3.connect(self.db_path) as conn:
@@ -300,6 +541,7 @@ class DatabaseManager:
                 'average_messages_per_session': round(avg_messages, 2)
             }
     
+    @timed(DB_QUERY_SECONDS)
     def cleanup_old_conversations(self, days: int = 30):
         """Clean up conversations older than specified days"""
         with sqlite3.connect(self.db_path) as conn:
@@ -311,6 +553,9 @@ class DatabaseManager:
             """.format(days))
             
             deleted_count = cursor.rowcount
+            self._delete_orphan_iocs(cursor)
             conn.commit()
             
             return deleted_count
+
+get_tracer().instrument(DatabaseManager, "db")
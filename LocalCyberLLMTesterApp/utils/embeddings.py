@@ -0,0 +1,106 @@
+"""
+Embeddings for Trend Cybertron App
+Turns text into L2-normalized float32 vectors using the inference backend's
+embeddings endpoint, or a local hashing embedder for tests and offline use
+"""
+
+import hashlib
+import os
+import re
+from typing import List
+import logging
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_MODEL = os.environ.get("TREND_CYBERTRON_EMBED_MODEL", "nomic-embed-text")
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a dot product is a cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class OllamaEmbedder:
+    def __init__(self, host: str = "localhost", port: str = "11434",
+                 model: str = DEFAULT_EMBED_MODEL, timeout: float = 30):
+        """Embed text with Ollama's /api/embed endpoint"""
+        self.host = host
+        self.port = port
+        self.model = model
+        self.timeout = timeout
+        self.name = f"ollama:{model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts"""
+        url = f"http://{self.host}:{self.port}/api/embed"
+        response = requests.post(url, json={"model": self.model, "input": list(texts)}, timeout=self.timeout)
+        if response.status_code == 404:
+            # Older Ollama releases only have the single-prompt endpoint
+            return normalize_rows([self._embed_legacy(text) for text in texts])
+        response.raise_for_status()
+        return normalize_rows(response.json()['embeddings'])
+
+    def _embed_legacy(self, text: str) -> List[float]:
+        """Embed one text with the pre-0.3 /api/embeddings endpoint"""
+        url = f"http://{self.host}:{self.port}/api/embeddings"
+        response = requests.post(url, json={"model": self.model, "prompt": text}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['embedding']
+
+class LMStudioEmbedder:
+    def __init__(self, host: str = "localhost", port: str = "1234",
+                 model: str = DEFAULT_EMBED_MODEL, timeout: float = 30):
+        """Embed text with LM Studio's OpenAI-compatible /v1/embeddings endpoint"""
+        self.host = host
+        self.port = port
+        self.model = model
+        self.timeout = timeout
+        self.name = f"lmstudio:{model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts"""
+        url = f"http://{self.host}:{self.port}/v1/embeddings"
+        response = requests.post(url, json={"model": self.model, "input": list(texts)}, timeout=self.timeout)
+        response.raise_for_status()
+        data = sorted(response.json()['data'], key=lambda item: item.get('index', 0))
+        return normalize_rows([item['embedding'] for item in data])
+
+class HashingEmbedder:
+    _token_pattern = re.compile(r"[a-z0-9_.:/\-]+")
+
+    def __init__(self, dim: int = 256):
+        """Local feature-hashing embedder over words and word bigrams (no model needed)"""
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        """Words plus adjacent word pairs"""
+        words = self._token_pattern.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dim] += sign
+        return normalize_rows(vectors)
+
+def create_embedder(provider: str, host: str, port: str, model: str = DEFAULT_EMBED_MODEL):
+    """Build the embedder matching a provider ('hashing' for the local embedder)"""
+    if provider == "Ollama":
+        return OllamaEmbedder(host, port, model)
+    if provider == "LM Studio":
+        return LMStudioEmbedder(host, port, model)
+    if provider == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedding provider: {provider}")
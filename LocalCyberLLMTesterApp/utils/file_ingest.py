@@ -0,0 +1,469 @@
+"""
+File Ingestion for Trend Cybertron App
+Turns uploaded exports (SIEM alerts, EASM findings, IaC configs, CVE lists)
+into prompt attachments: CSV, JSONL, JSON and YAML are parsed as record
+streams without loading the file, the fields relevant to the tab's use case
+are kept, and a token-budgeted digest (aggregates over every record plus as
+many records as fit) is cached by content hash
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import time
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+import logging
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from context_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INGEST_DIR = os.environ.get("TREND_CYBERTRON_INGEST_DIR", "database/ingest")
+FORMATS = ("csv", "jsonl", "json", "yaml")
+# Share of the context budget an attachment may take; the rest is left for the question and history
+ATTACHMENT_BUDGET_RATIO = 0.6
+# Share of the attachment budget for aggregates over all records
+AGGREGATE_RATIO = 0.25
+READ_CHUNK = 1 << 20
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+MAX_VALUE_CHARS = 200
+# Fields with more distinct values than this are not aggregated
+MAX_DISTINCT_VALUES = 50
+TOP_VALUES = 5
+# Bump when the digest format changes so cached digests are rebuilt
+INGEST_VERSION = 1
+
+# Field names (matched against the last part of dotted keys) worth sending per use case;
+# use cases without an entry keep every field (IaC configs, policies)
+_ALERT_FIELDS = ("severity", "priority", "rule", "name", "title", "description", "message", "host",
+                 "hostname", "src", "dst", "ip", "user", "account", "process", "command", "time",
+                 "timestamp", "tactic", "technique", "mitre", "action", "status", "category")
+_IOC_FIELDS = ("indicator", "ioc", "type", "value", "domain", "ip", "url", "hash", "md5", "sha1", "sha256",
+               "malware", "family", "actor", "campaign", "tags", "confidence", "first_seen", "last_seen",
+               "source", "description", "country", "asn")
+_VULNERABILITY_FIELDS = ("cve", "cvss", "score", "severity", "epss", "kev", "exploit", "product", "vendor",
+                         "version", "package", "description", "published", "fixed", "patch", "asset", "host")
+_EXPOSURE_FIELDS = ("asset", "hostname", "host", "ip", "domain", "port", "service", "finding", "issue",
+                    "severity", "risk", "score", "exposure", "cve", "remediation", "owner", "cloud",
+                    "account", "region", "resource", "status", "compliance", "control", "framework")
+USE_CASE_FIELDS = {
+    'alert_prioritization': _ALERT_FIELDS,
+    'incident_summarization': _ALERT_FIELDS + ("event", "outcome", "id"),
+    'threat_intelligence': _IOC_FIELDS,
+    'osint_reporting': _IOC_FIELDS,
+    'vulnerability_assessment': _VULNERABILITY_FIELDS,
+    'crem_discover': _EXPOSURE_FIELDS,
+    'crem_predict': _EXPOSURE_FIELDS + _VULNERABILITY_FIELDS,
+    'crem_prioritize': _EXPOSURE_FIELDS + _VULNERABILITY_FIELDS,
+    'crem_comply': _EXPOSURE_FIELDS,
+    'crem_quantify': _EXPOSURE_FIELDS,
+    'crem_mitigate': _EXPOSURE_FIELDS
+}
+
+_SEPARATORS = re.compile(r"[\s,]*")
+_KEY_SEPARATOR = re.compile(r"[\s:]*")
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+def field_pattern(use_case_key: str) -> Optional["re.Pattern"]:
+    """Regex matching the field names kept for a use case, or None to keep every field"""
+    names = USE_CASE_FIELDS.get(use_case_key)
+    if not names:
+        return None
+    # Whole words inside snake/camel/dotted names: "src_ip", "alert.severity", "cvss_score"
+    return re.compile(r"(?:^|[._\-\s])(?:" + "|".join(sorted(set(names), key=len, reverse=True)) + r")(?:$|[._\-\s])",
+                      re.IGNORECASE)
+
+def detect_format(path: str) -> str:
+    """File format from the extension, or from the first bytes"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension in ("yaml", "yml"):
+        return "yaml"
+    if extension in ("csv", "json"):
+        return extension
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(65536).lstrip()
+    if head.startswith("["):
+        return "json"
+    if head.startswith("{"):
+        first_line = head.split("\n", 1)[0]
+        try:
+            json.loads(first_line)
+            return "jsonl"
+        except ValueError:
+            return "json"
+    return "csv" if "," in head.split("\n", 1)[0] else "yaml"
+
+def iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV file with a header row"""
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        yield from csv.DictReader(f)
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Objects of a JSON Lines file (blank and undecodable lines are skipped)"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.debug(f"Skipping undecodable line {line_number} of {path}")
+
+def iter_json(path: str, chunk_size: int = READ_CHUNK) -> Iterator[Any]:
+    """Elements of a JSON document's record array, decoded one at a time
+
+    The record array is the top-level array or the first array value of the
+    top-level object ({"results": [...]}). Each element is decoded by the C
+    decoder as soon as it is complete, and consumed text is dropped, so memory
+    stays at about one read chunk plus one record. A document without a record
+    array is returned whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        buffer = f.read(chunk_size)
+        position = 0
+        eof = not buffer
+
+        def fill(minimum_read: int = chunk_size) -> bool:
+            """Drop consumed text and read more; False at end of file"""
+            nonlocal buffer, position, eof
+            if eof:
+                return False
+            data = f.read(max(chunk_size, minimum_read))
+            buffer = buffer[position:] + data
+            position = 0
+            eof = not data
+            return not eof
+
+        def skip(pattern: "re.Pattern" = _SEPARATORS):
+            nonlocal position
+            while True:
+                position = pattern.match(buffer, position).end()
+                if position < len(buffer) or not fill():
+                    return
+
+        def decode() -> Any:
+            """Decode the value at the current position, reading more until it is complete"""
+            nonlocal position
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may continue in the next read ("8500." then "0")
+                    if eof or isinstance(value, (dict, list, str)) or (
+                            end < len(buffer) and buffer[end] not in _NUMBER_CHARS):
+                        position = end
+                        return value
+                    fill()
+                except ValueError:
+                    if len(buffer) - position > MAX_RECORD_BYTES:
+                        raise ValueError(f"Record larger than {MAX_RECORD_BYTES} bytes in {path}")
+                    # Grow reads so a large record does not cost quadratic re-decoding
+                    if not fill(len(buffer) - position):
+                        raise
+
+        skip()
+        if position >= len(buffer):
+            return
+        if buffer[position] == "{":
+            # Walk the top-level object's keys until the first array value
+            position += 1
+            document = {}
+            while True:
+                skip()
+                if position >= len(buffer) or buffer[position] == "}":
+                    # No record array: the object itself is the only record
+                    yield document
+                    return
+                key = decode()
+                skip(_KEY_SEPARATOR)
+                if position < len(buffer) and buffer[position] == "[":
+                    break
+                document[key] = decode()
+        elif buffer[position] != "[":
+            yield decode()
+            return
+        position += 1
+        while True:
+            skip()
+            if position >= len(buffer) or buffer[position] == "]":
+                return
+            yield decode()
+
+def iter_yaml(path: str) -> Iterator[Any]:
+    """Documents of a YAML file (lists are expanded into their items); needs PyYAML"""
+    if yaml is None:
+        raise ValueError("YAML ingestion needs PyYAML (pip install pyyaml)")
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for document in yaml.load_all(f, Loader=loader):
+            if isinstance(document, list):
+                yield from document
+            elif document is not None:
+                yield document
+
+_READERS = {'csv': iter_csv, 'jsonl': iter_jsonl, 'json': iter_json, 'yaml': iter_yaml}
+
+def iter_records(path: str, file_format: str = None) -> Iterator[Any]:
+    """Records of a file in any supported format"""
+    file_format = file_format or detect_format(path)
+    if file_format not in _READERS:
+        raise ValueError(f"Unsupported format {file_format}; use one of {', '.join(FORMATS)}")
+    return _READERS[file_format](path)
+
+def flatten(record: Any, prefix: str = "") -> Dict[str, Any]:
+    """Nested objects as dotted keys; lists of scalars are joined"""
+    if not isinstance(record, dict):
+        return {prefix or "value": record}
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        kind = type(value)
+        if kind is dict:
+            flat.update(flatten(value, name))
+        elif kind is list:
+            if all(not isinstance(item, (dict, list)) for item in value):
+                flat[name] = ", ".join(str(item) for item in value)
+            else:
+                for index, item in enumerate(value):
+                    flat.update(flatten(item, f"{name}.{index}"))
+        else:
+            flat[name] = value
+    return flat
+
+def _clean(value: Any) -> str:
+    """One-line, length-capped value"""
+    text = " ".join(value.split()) if type(value) is str else str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS] + "..."
+
+def file_hash(path: str) -> str:
+    """Content hash of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()[:24]
+
+def ingest_file(path: str,
+                use_case_key: str = None,
+                token_budget: int = 2500,
+                file_format: str = None,
+                name: str = None,
+                cache_dir: str = DEFAULT_INGEST_DIR) -> Dict[str, Any]:
+    """Parse a file into a token-budgeted digest for a prompt (cached by content hash)"""
+    file_format = file_format or detect_format(path)
+    name = name or os.path.basename(path)
+    key = f"{file_hash(path)}-{use_case_key or 'all'}-{token_budget}-{INGEST_VERSION}"
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return dict(json.load(f), name=name, cached=True)
+    except (OSError, ValueError):
+        pass
+
+    start_time = time.perf_counter()
+    pattern = field_pattern(use_case_key)
+    selected_cache: Dict[str, bool] = {}
+    record_budget = int(token_budget * (1 - AGGREGATE_RATIO))
+    lines: Dict[str, int] = {}
+    used_tokens = 0
+    records = omitted = 0
+    field_counts: Dict[str, int] = {}
+    values: Dict[str, Optional[Dict[str, int]]] = {}
+    for record in iter_records(path, file_format):
+        records += 1
+        flat = flatten(record)
+        fields = {}
+        for field, value in flat.items():
+            keep = selected_cache.get(field)
+            if keep is None:
+                keep = selected_cache[field] = pattern is None or bool(pattern.search(field))
+            if keep and value not in (None, ""):
+                fields[field] = value
+        if not fields:
+            # Nothing matched the use case; fall back to the whole record
+            fields = {field: value for field, value in flat.items() if value not in (None, "")}
+        cleaned = []
+        for field, value in fields.items():
+            text = _clean(value)
+            cleaned.append(f"{field}={text}")
+            field_counts[field] = field_counts.get(field, 0) + 1
+            counter = values.get(field, {})
+            if counter is not None:
+                counter[text] = counter.get(text, 0) + 1
+                # High-cardinality fields (IDs, timestamps) say nothing in aggregate
+                values[field] = counter if len(counter) <= MAX_DISTINCT_VALUES else None
+        line = "; ".join(cleaned)
+        if line in lines:
+            lines[line] += 1
+            continue
+        line_tokens = estimate_tokens(line) + 1
+        if used_tokens + line_tokens > record_budget:
+            omitted += 1
+            continue
+        lines[line] = 1
+        used_tokens += line_tokens
+
+    aggregates = []
+    aggregate_tokens = 0
+    for field in sorted(field_counts, key=field_counts.get, reverse=True):
+        counter = values.get(field)
+        if not counter or len(counter) < 2:
+            continue
+        top = sorted(counter.items(), key=lambda item: item[1], reverse=True)[:TOP_VALUES]
+        entry = f"- {field}: " + ", ".join(f"{value} ({count})" for value, count in top)
+        if aggregate_tokens + estimate_tokens(entry) > token_budget - used_tokens:
+            break
+        aggregates.append(entry)
+        aggregate_tokens += estimate_tokens(entry)
+
+    record_lines = [f"{line} (x{count})" if count > 1 else line for line, count in lines.items()]
+    shown = sum(lines.values())
+    header = f"{records} records ({file_format})"
+    if omitted:
+        header += f"; {shown} shown, {omitted} more not shown"
+    parts = [header]
+    if aggregates:
+        parts.append("Most common values across all records:\n" + "\n".join(aggregates))
+    parts.append("Records:\n" + "\n".join(record_lines))
+    text = "\n\n".join(parts)
+
+    elapsed = time.perf_counter() - start_time
+    size = os.path.getsize(path)
+    result = {
+        'name': name,
+        'format': file_format,
+        'records': records,
+        'shown': shown,
+        'omitted': omitted,
+        'fields': sorted(field_counts, key=field_counts.get, reverse=True)[:30],
+        'text': text,
+        'tokens': estimate_tokens(text),
+        'megabytes': round(size / (1024 * 1024), 2),
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(size / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+        'cached': False
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(temporary_path, cache_path)
+    return result
+
+def attachment_prompt(attachment: Dict[str, Any], question: str) -> str:
+    """The user's question with an ingested file in front of it"""
+    return f"Attached file `{attachment['name']}`: {attachment['text']}\n\n---\n\n{question}"
+
+def write_synthetic(path: str, megabytes: float, file_format: str = "jsonl", seed: int = 7) -> int:
+    """Write a SIEM-style alert export of about the given size (for benchmarking); returns records written"""
+    rng = random.Random(seed)
+    rules = [f"Rule {i}: {name}" for i, name in enumerate(
+        ["Suspicious PowerShell", "Brute force", "Beaconing", "Credential dumping", "Lateral movement",
+         "Ransomware note", "Unusual login location", "Disabled logging"])]
+    severities = ["Critical", "High", "Medium", "Low"]
+    target = int(megabytes * 1024 * 1024)
+    written = records = 0
+
+    def record() -> Dict[str, Any]:
+        return {
+            "id": f"ALRT-{records:09d}",
+            "timestamp": f"2026-10-{1 + records % 28:02d}T{records % 24:02d}:{records % 60:02d}:00Z",
+            "severity": rng.choice(severities),
+            "rule": {"name": rng.choice(rules), "mitre": {"technique": f"T{1000 + rng.randrange(600)}"}},
+            "host": {"name": f"ws-{rng.randrange(2000):04d}", "ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"},
+            "user": f"user{rng.randrange(5000)}",
+            "process": {"command_line": "powershell.exe -enc " + "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=60))},
+            "raw": "x" * rng.randrange(50, 200)
+        }
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if file_format == "json":
+            f.write('{"meta": {"source": "synthetic"}, "results": [\n')
+        while written < target:
+            item = record()
+            if file_format == "csv":
+                flat = flatten(item)
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(flat))
+                    writer.writeheader()
+                buffer = io.StringIO()
+                csv.DictWriter(buffer, fieldnames=list(flat)).writerow(flat)
+                line = buffer.getvalue()
+            elif file_format == "yaml":
+                line = "---\n" + "\n".join(f"{k}: {json.dumps(v)}" for k, v in flatten(item).items()) + "\n"
+            else:
+                line = json.dumps(item) + ("\n" if file_format == "jsonl" else ",\n")
+            f.write(line)
+            written += len(line)
+            records += 1
+        if file_format == "json":
+            f.write('{"id": "end"}\n]}\n')
+    return records
+
+def benchmark(megabytes: float = 1024.0, file_format: str = "jsonl", directory: str = None,
+              use_case_key: str = "alert_prioritization") -> Dict[str, Any]:
+    """Ingest rate and peak memory (POSIX only; None elsewhere) on a synthetic export of the given size"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    directory = directory or DEFAULT_INGEST_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"benchmark-{int(megabytes)}mb.{file_format}")
+    records = write_synthetic(path, megabytes, file_format)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    try:
+        result = ingest_file(path, use_case_key, cache_dir=os.path.join(directory, "benchmark-cache"))
+    finally:
+        os.remove(path)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    return {
+        'format': file_format,
+        'megabytes': result['megabytes'],
+        'records': records,
+        'seconds': result['seconds'],
+        'mb_per_second': result['mb_per_second'],
+        'peak_rss_mb': round(rss_after / 1024, 1) if resource else None,
+        'rss_growth_mb': round((rss_after - rss_before) / 1024, 1) if resource else None,
+        'digest_tokens': result['tokens']
+    }
+
+def main():
+    """Ingest a file from the command line, or benchmark ingestion"""
+    from log_setup import configure_logging
+    configure_logging("WARNING")
+    parser = argparse.ArgumentParser(description="Digest a CSV/JSONL/JSON/YAML export for a prompt")
+    parser.add_argument("file", nargs="?", help="File to ingest")
+    parser.add_argument("--use-case", help="Use case key whose fields are kept (default: all fields)")
+    parser.add_argument("--budget", type=int, default=2500, help="Token budget of the digest")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: detected)")
+    parser.add_argument("--benchmark", type=float, metavar="MB", help="Ingest a synthetic export of this size")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        stats = benchmark(args.benchmark, args.format or "jsonl", use_case_key=args.use_case or "alert_prioritization")
+        print(f"{stats['megabytes']} MB {stats['format']} ({stats['records']} records) in {stats['seconds']}s: "
+              f"{stats['mb_per_second']} MB/s"
+              + (f", peak RSS {stats['peak_rss_mb']} MB (+{stats['rss_growth_mb']} MB while ingesting)"
+                 if stats['peak_rss_mb'] is not None else ""))
+    if args.file:
+        result = ingest_file(args.file, args.use_case, args.budget, args.format)
+        print(result['text'])
+        print(f"\n{result['records']} records, {result['shown']} shown, ~{result['tokens']} tokens, "
+              f"{result['mb_per_second']} MB/s{' (cached)' if result['cached'] else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Health Monitor for Trend Cybertron App
+Probes configured Ollama/LM Studio endpoints in the background so the UI can
+render backend status from cached state without blocking on the network
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+from ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    def __init__(self,
+                 client: OllamaClient = None,
+                 interval: float = 15.0,
+                 history_size: int = 60,
+                 stale_after: float = None,
+                 probe_timeout: float = 5.0,
+                 idle_timeout: float = 1800.0):
+        """Initialize the health monitor"""
+        self.client = client or OllamaClient()
+        self.interval = interval
+        self.history_size = history_size
+        self.stale_after = stale_after if stale_after is not None else interval * 3
+        self.probe_timeout = probe_timeout
+        # Endpoints nobody asked about for this long stop being probed (persistent ones excepted)
+        self.idle_timeout = idle_timeout
+        self._endpoints: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-probe")
+        self._in_flight = set()
+
+    @staticmethod
+    def endpoint_key(provider: str, host: str, port: str) -> Tuple[str, str, str]:
+        """Build the key used to identify an endpoint"""
+        return (provider, str(host), str(port))
+
+    def _new_entry(self, provider: str, host: str, port: str) -> Dict[str, Any]:
+        """State of an endpoint that has not been probed yet"""
+        return {
+            'provider': provider,
+            'host': str(host),
+            'port': str(port),
+            'status': 'unknown',
+            'error': None,
+            'models': [],
+            'loaded_models': [],
+            'response_time': None,
+            'latency_history': deque(maxlen=self.history_size),
+            'last_checked': None,
+            'last_healthy': None,
+            'consecutive_failures': 0,
+            'persistent': False,
+            'last_used': time.time()
+        }
+
+    def add_endpoint(self, provider: str, host: str, port: str, persistent: bool = False) -> Tuple[str, str, str]:
+        """Register an endpoint for background probing (idempotent)
+
+        Endpoints are pruned once unused for idle_timeout unless `persistent`
+        (e.g. pool backends, which stay registered until released).
+        """
+        key = self.endpoint_key(provider, host, port)
+        with self._lock:
+            entry = self._endpoints.get(key)
+            if entry is None:
+                entry = self._endpoints[key] = self._new_entry(provider, host, port)
+                self._wakeup.set()
+            entry['last_used'] = time.time()
+            entry['persistent'] = entry['persistent'] or persistent
+        self.start()
+        return key
+
+    def release_endpoint(self, provider: str, host: str, port: str):
+        """Let a persistent endpoint be pruned once it goes unused"""
+        with self._lock:
+            entry = self._endpoints.get(self.endpoint_key(provider, host, port))
+            if entry is not None:
+                entry['persistent'] = False
+                entry['last_used'] = time.time()
+
+    def remove_endpoint(self, provider: str, host: str, port: str):
+        """Stop probing an endpoint"""
+        with self._lock:
+            self._endpoints.pop(self.endpoint_key(provider, host, port), None)
+
+    def prune(self) -> List[Tuple[str, str, str]]:
+        """Drop endpoints unused for idle_timeout (e.g. a host typed into the sidebar and abandoned)"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [key for key, entry in self._endpoints.items()
+                    if not entry['persistent'] and entry['last_used'] < cutoff]
+            for key in idle:
+                del self._endpoints[key]
+        for provider, host, port in idle:
+            logger.info(f"Stopped probing unused {provider} endpoint {host}:{port}")
+        return idle
+
+    def endpoints(self) -> List[Tuple[str, str, str]]:
+        """List registered endpoint keys"""
+        with self._lock:
+            return list(self._endpoints.keys())
+
+    def start(self):
+        """Start the background probe thread if it is not running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background probe thread"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.probe_timeout + 1)
+
+    def request_probe(self, provider: str = None, host: str = None, port: str = None):
+        """Ask for an immediate probe without waiting for the result"""
+        if provider is not None:
+            key = self.add_endpoint(provider, host, port)
+            self._submit_probe(key)
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        """Background loop probing every endpoint once per interval"""
+        while not self._stop.is_set():
+            self.prune()
+            for key in self.endpoints():
+                self._submit_probe(key)
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _submit_probe(self, key: Tuple[str, str, str]):
+        """Probe an endpoint on the worker pool unless a probe is already running"""
+        with self._lock:
+            if key in self._in_flight or key not in self._endpoints:
+                return
+            self._in_flight.add(key)
+        self._executor.submit(self._probe, key)
+
+    def _probe(self, key: Tuple[str, str, str]):
+        """Probe a single endpoint and record the outcome"""
+        provider, host, port = key
+        try:
+            health = self.client.get_health_status(host, port, provider=provider, timeout=self.probe_timeout)
+            loaded_models = []
+            if health['status'] == 'healthy' and provider == "Ollama":
+                loaded_models = [m.get('name') for m in
+                                 self.client.list_running_models(host, port, timeout=self.probe_timeout)]
+        except Exception as e:
+            health = {'status': 'unhealthy', 'error': str(e), 'response_time': None}
+            loaded_models = []
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+        now = time.time()
+        with self._lock:
+            entry = self._endpoints.get(key)
+            if entry is None:
+                return
+            entry['status'] = health['status']
+            entry['error'] = health.get('error')
+            entry['response_time'] = health.get('response_time')
+            entry['last_checked'] = now
+            entry['latency_history'].append((now, health.get('response_time')))
+            if health['status'] == 'healthy':
+                entry['models'] = health.get('models', [])
+                entry['loaded_models'] = loaded_models
+                entry['last_healthy'] = now
+                entry['consecutive_failures'] = 0
+            else:
+                entry['consecutive_failures'] += 1
+
+        if health['status'] != 'healthy':
+            logger.warning(f"{provider} endpoint {host}:{port} unhealthy: {health.get('error')}")
+
+    def get_status(self, provider: str, host: str, port: str, touch: bool = True) -> Dict[str, Any]:
+        """Get cached status for an endpoint; never touches the network
+
+        Unregistered endpoints report 'unknown' and are not registered: callers
+        that want one probed register it with add_endpoint. `touch` counts the
+        call as use, which keeps the endpoint from being pruned.
+        """
+        key = self.endpoint_key(provider, host, port)
+        with self._lock:
+            stored = self._endpoints.get(key)
+            if stored is not None and touch:
+                stored['last_used'] = time.time()
+            entry = dict(stored if stored is not None else self._new_entry(provider, host, port))
+            entry['latency_history'] = list(entry['latency_history'])
+            entry['models'] = list(entry['models'])
+            entry['loaded_models'] = list(entry['loaded_models'])
+
+        now = time.time()
+        if entry['last_checked'] is None:
+            entry['age_seconds'] = None
+            entry['stale'] = True
+        else:
+            entry['age_seconds'] = round(now - entry['last_checked'], 1)
+            entry['stale'] = entry['age_seconds'] > self.stale_after
+        return entry
+
+    def get_all_statuses(self) -> List[Dict[str, Any]]:
+        """Get cached status for every registered endpoint"""
+        return [self.get_status(*key, touch=False) for key in self.endpoints()]
+
+_default_monitor = None
+_default_lock = threading.Lock()
+
+def get_health_monitor() -> HealthMonitor:
+    """Get the process-wide health monitor, starting it on first use"""
+    global _default_monitor
+    if _default_monitor is None:
+        with _default_lock:
+            if _default_monitor is None:
+                _default_monitor = HealthMonitor()
+                _default_monitor.start()
+    return _default_monitor
@@ -0,0 +1,142 @@
+"""
+Request Hedging for Trend Cybertron App
+Decides when a pool request that has produced no first token yet should be
+duplicated to a second backend: after the observed p95 time to first token
+of its model, within a hedge budget, with hedge rate and tail telemetry
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional
+import logging
+
+from metrics import LATENCY_BUCKETS, get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = float(os.environ.get("TREND_CYBERTRON_HEDGE_BUDGET", "0.05"))
+DEFAULT_QUANTILE = 0.95
+
+OUTCOMES = ("fast", "warmup", "budget", "primary_won", "hedge_won", "failed")
+
+_metrics = get_registry()
+HEDGE_REQUESTS = _metrics.counter(
+    "trendcybertron_hedge_requests_total", "Hedge-eligible pool requests by outcome", ("outcome",))
+HEDGE_THRESHOLD = _metrics.gauge(
+    "trendcybertron_hedge_threshold_seconds", "Time to first token after which a request is hedged", ("model",))
+HEDGE_SAVED = _metrics.histogram(
+    "trendcybertron_hedge_saved_seconds", "Time to first token saved by hedges that won (lower bound)",
+    (), LATENCY_BUCKETS)
+
+def quantile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank quantile of a list of values, or None when it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class HedgePolicy:
+    def __init__(self,
+                 enabled: bool = False,
+                 budget: float = DEFAULT_BUDGET,
+                 quantile: float = DEFAULT_QUANTILE,
+                 min_samples: int = 20,
+                 window: int = 200,
+                 min_delay: float = 0.05,
+                 burst: float = 3.0):
+        """Initialize the hedging policy
+
+        `budget` is the largest fraction of requests that may be hedged: every
+        request earns `budget` hedge credits (up to `burst`) and a hedge spends one.
+        """
+        self.enabled = enabled
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._window = window
+        self._ttfts: Dict[str, deque] = {}
+        self._credits = burst
+        self._outcomes = dict.fromkeys(OUTCOMES, 0)
+        # Time to first token as served, and as the primary alone would have served it
+        self._served = deque(maxlen=window * 5)
+        self._unhedged = deque(maxlen=window * 5)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "HedgePolicy":
+        """Build a policy, enabled when TREND_CYBERTRON_HEDGING is set to 1/true/on"""
+        enabled = os.environ.get("TREND_CYBERTRON_HEDGING", "").strip().lower() in ("1", "true", "yes", "on")
+        return cls(enabled=enabled, **kwargs)
+
+    def threshold(self, model: str) -> Optional[float]:
+        """Seconds without a first token after which to hedge, or None while there are too few samples"""
+        with self._lock:
+            samples = list(self._ttfts.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        value = max(self.min_delay, quantile(samples, self.quantile))
+        HEDGE_THRESHOLD.set(value, model=model)
+        return value
+
+    def observe(self, model: str, ttft: float):
+        """Add a backend's time to first token to the model's window"""
+        with self._lock:
+            samples = self._ttfts.get(model)
+            if samples is None:
+                samples = self._ttfts[model] = deque(maxlen=self._window)
+            samples.append(ttft)
+
+    def start_request(self, budget: float = None):
+        """Earn the hedge credit of one request (`budget` overrides the policy's, e.g. per session)"""
+        with self._lock:
+            self._credits = min(self.burst, self._credits + (self.budget if budget is None else budget))
+
+    def try_hedge(self) -> bool:
+        """Spend a hedge credit; False when the budget is used up"""
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            return True
+
+    def record(self, outcome: str, served_ttft: float = None, unhedged_ttft: float = None):
+        """Count a finished request and its time to first token, with and without the hedge"""
+        HEDGE_REQUESTS.inc(outcome=outcome)
+        with self._lock:
+            self._outcomes[outcome] += 1
+            if served_ttft is not None:
+                self._served.append(served_ttft)
+                self._unhedged.append(max(served_ttft, unhedged_ttft or 0.0))
+        if outcome == "hedge_won" and unhedged_ttft is not None and served_ttft is not None:
+            HEDGE_SAVED.observe(max(0.0, unhedged_ttft - served_ttft))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hedge rate, win rate and time-to-first-token tails with and without hedging"""
+        with self._lock:
+            outcomes = dict(self._outcomes)
+            served = list(self._served)
+            unhedged = list(self._unhedged)
+            models = list(self._ttfts)
+        requests = sum(outcomes.values())
+        hedged = outcomes['primary_won'] + outcomes['hedge_won']
+        stats = {
+            'enabled': self.enabled,
+            'budget': self.budget,
+            'requests': requests,
+            'hedged': hedged,
+            'hedge_rate': round(hedged / requests, 4) if requests else 0.0,
+            'hedge_wins': outcomes['hedge_won'],
+            'hedge_win_rate': round(outcomes['hedge_won'] / hedged, 4) if hedged else 0.0,
+            'budget_skips': outcomes['budget'],
+            'outcomes': outcomes,
+            'thresholds': {model: self.threshold(model) for model in models}
+        }
+        for fraction, name in ((0.5, 'p50'), (0.95, 'p95'), (0.99, 'p99')):
+            stats[f'{name}_ttft'] = quantile(served, fraction)
+            # A cancelled primary's time to first token is only known to be at least
+            # the time it had waited, so this is a lower bound on the tail without hedging
+            stats[f'{name}_ttft_unhedged'] = quantile(unhedged, fraction)
+        return stats
@@ -0,0 +1,246 @@
+"""
+Load Generator for Trend Cybertron App
+Drives OllamaClient with concurrent requests against a backend (real or the
+mock server) and reports throughput, latency and time-to-first-token percentiles
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+import logging
+
+from admission import PRIORITIES, AdmissionController
+from log_setup import configure_logging
+from ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+MODES = ("generate", "chat", "stream")
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class LoadGenerator:
+    def __init__(self,
+                 host: str = "localhost",
+                 port: str = "11434",
+                 provider: str = "Ollama",
+                 model: str = "llama-trendcybertron-primus-merged",
+                 client_slots: int = None,
+                 max_queue: int = 1000):
+        """Initialize the load generator with its own client and admission controller"""
+        self.host = host
+        self.port = str(port)
+        self.provider = provider
+        self.model = model
+        admission = AdmissionController(max_queue=max_queue)
+        if client_slots:
+            admission.set_slots(host, self.port, client_slots)
+        self.client = OllamaClient(admission=admission)
+
+    def _one(self, index: int, mode: str, prompt: str, max_tokens: int, max_retries: int,
+             priority: str = "interactive") -> Dict[str, Any]:
+        """Send one request and time it"""
+        session_id = f"load-{index}"
+        start_time = time.perf_counter()
+        if mode == "stream":
+            first_token = None
+            chunks = 0
+            error = None
+            for chunk in self.client.stream_response(prompt, model=self.model, host=self.host, port=self.port,
+                                                     max_tokens=max_tokens, session_id=session_id,
+                                                     provider=self.provider, priority=priority):
+                if first_token is None:
+                    first_token = time.perf_counter() - start_time
+                if chunk.startswith("Error:"):
+                    error = chunk
+                    break
+                chunks += 1
+            return {
+                'ok': error is None,
+                'latency': time.perf_counter() - start_time,
+                'ttft': first_token,
+                'tokens': chunks,
+                'error': error
+            }
+
+        messages = None
+        if mode == "chat":
+            messages = [{"role": "system", "content": "You are a SOC analyst."}, {"role": "user", "content": prompt}]
+        result = self.client.generate_response(
+            prompt=prompt,
+            model=self.model,
+            host=self.host,
+            port=self.port,
+            max_tokens=max_tokens,
+            max_retries=max_retries,
+            provider=self.provider,
+            session_id=session_id,
+            messages=messages,
+            priority=priority
+        )
+        return {
+            'ok': 'error' not in result,
+            'latency': time.perf_counter() - start_time,
+            'ttft': None,
+            'tokens': result.get('eval_count', 0),
+            'queue_wait': result.get('queue_wait', 0.0),
+            'busy': result.get('busy', False),
+            'error': result.get('error')
+        }
+
+    def run(self,
+            total_requests: int = 100,
+            concurrency: int = 8,
+            mode: str = "generate",
+            prompt: str = "Triage this alert: powershell -enc from WS-01 contacting 203.0.113.7",
+            max_tokens: int = 64,
+            max_retries: int = 1,
+            priority: str = "interactive",
+            batch_concurrency: int = 0,
+            batch_max_tokens: int = 256) -> Dict[str, Any]:
+        """Send total_requests with up to `concurrency` in flight and summarize the results
+
+        With `batch_concurrency`, that many batch-priority workers keep sending
+        requests for the whole run, like a bulk triage job competing for the backend.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}; use one of {', '.join(MODES)}")
+
+        stop = threading.Event()
+        batch_done = []
+
+        def batch_worker(worker: int):
+            while not stop.is_set():
+                result = self._one(f"batch-{worker}", "generate", prompt, batch_max_tokens, 1, priority="batch")
+                batch_done.append(result['ok'])
+
+        batch_threads = [threading.Thread(target=batch_worker, args=(worker,), daemon=True)
+                         for worker in range(batch_concurrency)]
+        for thread in batch_threads:
+            thread.start()
+        if batch_threads:
+            # Let the batch load fill the backend before measuring
+            time.sleep(0.5)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(
+                lambda i: self._one(i, mode, prompt, max_tokens, max_retries, priority),
+                range(total_requests)
+            ))
+        wall_time = time.perf_counter() - start_time
+        stop.set()
+        for thread in batch_threads:
+            thread.join()
+
+        succeeded = [r for r in results if r['ok']]
+        latencies = [r['latency'] for r in succeeded]
+        ttfts = [r['ttft'] for r in succeeded if r['ttft'] is not None]
+        tokens = sum(r['tokens'] for r in succeeded)
+        errors: Dict[str, int] = {}
+        for r in results:
+            if not r['ok']:
+                key = (r['error'] or "unknown")[:80]
+                errors[key] = errors.get(key, 0) + 1
+
+        return {
+            'mode': mode,
+            'backend': f"{self.provider}@{self.host}:{self.port}",
+            'model': self.model,
+            'requests': total_requests,
+            'concurrency': concurrency,
+            'succeeded': len(succeeded),
+            'failed': total_requests - len(succeeded),
+            'busy_rejections': sum(1 for r in results if r.get('busy')),
+            'wall_time': round(wall_time, 3),
+            'requests_per_second': round(len(succeeded) / wall_time, 2) if wall_time else 0.0,
+            'tokens_per_second': round(tokens / wall_time, 1) if wall_time else 0.0,
+            'latency_p50': round(percentile(latencies, 0.50), 3),
+            'latency_p95': round(percentile(latencies, 0.95), 3),
+            'latency_p99': round(percentile(latencies, 0.99), 3),
+            'ttft_p50': round(percentile(ttfts, 0.50), 3) if ttfts else None,
+            'ttft_p95': round(percentile(ttfts, 0.95), 3) if ttfts else None,
+            'queue_wait_p95': round(percentile([r.get('queue_wait', 0.0) for r in succeeded], 0.95), 3),
+            'priority': priority,
+            'batch_concurrency': batch_concurrency,
+            'batch_completed': sum(batch_done),
+            'errors': errors
+        }
+
+def main():
+    """Run a load test from the command line, optionally against a bundled mock server"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test an Ollama / LM Studio backend through OllamaClient")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--provider", default="Ollama", choices=["Ollama", "LM Studio"])
+    parser.add_argument("--model", default="llama-trendcybertron-primus-merged")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", default="generate", choices=MODES)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--retries", type=int, default=1, help="Client attempts per request")
+    parser.add_argument("--client-slots", type=int, default=None, help="Client-side concurrency limit per backend")
+    parser.add_argument("--priority", default="interactive", choices=PRIORITIES, help="Admission class of the requests")
+    parser.add_argument("--batch-concurrency", type=int, default=0,
+                        help="Batch-priority workers competing for the backend during the run")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument("--mock", action="store_true", help="Start a mock server on --port for the run")
+    parser.add_argument("--mock-ttft", type=float, default=0.1)
+    parser.add_argument("--mock-tps", type=float, default=200.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-slots", type=int, default=4)
+    parser.add_argument("--mock-load-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    configure_logging("WARNING")
+    server = None
+    if args.mock:
+        from mock_server import MockInferenceServer, MockServerConfig
+
+        server = MockInferenceServer(MockServerConfig(
+            models=[args.model],
+            ttft=args.mock_ttft,
+            tokens_per_second=args.mock_tps,
+            error_rate=args.mock_error_rate,
+            slots=args.mock_slots,
+            max_queue=max(16, args.concurrency),
+            load_delay=args.mock_load_delay
+        ), args.host, args.port).start()
+
+    generator = LoadGenerator(args.host, args.port, args.provider, args.model, client_slots=args.client_slots)
+    summary = generator.run(args.requests, args.concurrency, args.mode, max_tokens=args.max_tokens,
+                            max_retries=args.retries, priority=args.priority,
+                            batch_concurrency=args.batch_concurrency)
+    if server is not None:
+        summary['server'] = server.get_stats()
+        server.stop()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{summary['mode']} x{summary['requests']} @ concurrency {summary['concurrency']} -> {summary['backend']}")
+    print(f"  ok {summary['succeeded']}  failed {summary['failed']}  busy {summary['busy_rejections']}  "
+          f"wall {summary['wall_time']}s")
+    print(f"  throughput {summary['requests_per_second']} req/s, {summary['tokens_per_second']} tok/s")
+    print(f"  latency p50 {summary['latency_p50']}s  p95 {summary['latency_p95']}s  p99 {summary['latency_p99']}s")
+    if summary['ttft_p50'] is not None:
+        print(f"  ttft p50 {summary['ttft_p50']}s  p95 {summary['ttft_p95']}s")
+    if summary['batch_concurrency']:
+        print(f"  {summary['batch_completed']} batch requests completed alongside "
+              f"({summary['batch_concurrency']} workers)")
+    for error, count in summary['errors'].items():
+        print(f"  {count} x {error}")
+    if 'server' in summary:
+        print(f"  server {summary['server']}")
+
+if __name__ == "__main__":
+    main()
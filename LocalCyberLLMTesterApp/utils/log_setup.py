@@ -0,0 +1,208 @@
+"""
+Logging Setup for Trend Cybertron App
+Non-blocking logging for entry points: records are filtered (per-event rate
+limits and sampling) on the calling thread, handed to a bounded queue and
+formatted as JSON and written by a background listener thread. Library
+modules only create loggers; the app and CLIs call configure_logging()
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional
+
+DEFAULT_MAX_FIELD_CHARS = 2000
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 50
+# Per-request chatter is sampled by default; warnings and errors are never sampled
+DEFAULT_SAMPLE_RATES = {
+    'inference.request': 0.1,
+    'inference.response': 0.1,
+    'inference.chat': 0.1
+}
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+_listener = None
+_lock = threading.Lock()
+
+def truncate(text: Any, limit: int = 500) -> str:
+    """Shorten a payload (e.g. an HTTP error body) for logs and error messages"""
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "event=rate,event=rate" into a dict"""
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            try:
+                rates[event.strip()] = max(0.0, min(1.0, float(rate)))
+            except ValueError:
+                continue
+    return rates
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 sample_rates: Dict[str, float] = None):
+        """Token bucket per message type plus sampling of chosen events"""
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_rates = dict(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates)
+        self._lock = threading.Lock()
+        self._buckets: Dict[Any, list] = {}
+        self._suppressed: Dict[Any, int] = {}
+
+    @staticmethod
+    def event_key(record: logging.LogRecord) -> Any:
+        """Message type: the `event` extra when given, else the logging call site"""
+        return getattr(record, "event", None) or (record.name, record.lineno)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide whether a record is emitted"""
+        key = self.event_key(record)
+        if record.levelno < logging.WARNING:
+            sample_rate = self.sample_rates.get(key, 1.0) if isinstance(key, str) else 1.0
+            if sample_rate < 1.0 and random.random() >= sample_rate:
+                return False
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            bucket[0] -= 1.0
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            # Reported on the next record that gets through
+            record.suppressed = suppressed
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_field_chars: int = DEFAULT_MAX_FIELD_CHARS):
+        """One JSON object per line with long fields truncated"""
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def _value(self, value: Any) -> Any:
+        """JSON-safe, truncated field value"""
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return truncate(value, self.max_field_chars)
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Render a record as JSON"""
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': truncate(record.getMessage(), self.max_field_chars),
+            'thread': record.threadName
+        }
+        if getattr(record, "suppressed", 0):
+            entry['suppressed'] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = self._value(value)
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc_text:
+            entry['exc'] = truncate(exc_text, self.max_field_chars)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, max_field_chars: int = DEFAULT_MAX_FIELD_CHARS):
+        """Plain text with long messages truncated"""
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Render a record as one text line"""
+        text = truncate(super().format(record), self.max_field_chars)
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} similar suppressed)"
+        return text
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        """Queue handler that drops records instead of blocking when the queue is full"""
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message on the calling thread but leave formatting to the listener"""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """Hand the record to the listener without waiting"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(level: str = None,
+                      json_format: bool = None,
+                      rate: float = None,
+                      sample_rates: Dict[str, float] = None,
+                      max_field_chars: int = None,
+                      stream=None,
+                      queue_size: int = 10000) -> Optional[logging.handlers.QueueListener]:
+    """Route the root logger through a rate-limited queue to a background writer (once per process)
+
+    Defaults come from TREND_CYBERTRON_LOG_LEVEL, TREND_CYBERTRON_LOG_FORMAT (json/text),
+    TREND_CYBERTRON_LOG_RATE (records/s per message type, 0 disables) and
+    TREND_CYBERTRON_LOG_SAMPLE ("event=rate,...").
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        level = (level or os.environ.get("TREND_CYBERTRON_LOG_LEVEL", "INFO")).upper()
+        if json_format is None:
+            json_format = os.environ.get("TREND_CYBERTRON_LOG_FORMAT", "json").lower() == "json"
+        if rate is None:
+            rate = float(os.environ.get("TREND_CYBERTRON_LOG_RATE", DEFAULT_RATE))
+        if sample_rates is None:
+            sample_rates = {**DEFAULT_SAMPLE_RATES,
+                            **parse_sample_rates(os.environ.get("TREND_CYBERTRON_LOG_SAMPLE", ""))}
+        max_field_chars = max_field_chars or DEFAULT_MAX_FIELD_CHARS
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter(max_field_chars) if json_format else TextFormatter(max_field_chars))
+        handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        handler.addFilter(RateLimitFilter(rate, DEFAULT_BURST, sample_rates))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        for existing in list(root.handlers):
+            # Replace basicConfig-style console handlers; leave file handlers alone
+            if type(existing) is logging.StreamHandler or isinstance(existing, logging.handlers.QueueHandler):
+                root.removeHandler(existing)
+        root.addHandler(handler)
+
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
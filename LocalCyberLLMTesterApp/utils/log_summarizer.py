@@ -0,0 +1,342 @@
+"""
+Log Summarizer for Trend Cybertron App
+Map-reduce summarization of incident logs and timelines too large for one
+prompt: the file is memory-mapped and cut into chunks on event boundaries
+under a token budget, chunks are summarized in parallel (through the backend
+pool when enabled), the notes are merged level by level and the result is
+written up for executive, technical and compliance readers. Every model call
+is cached by the hash of its input, so re-runs only pay for what changed
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Iterator, NamedTuple, Optional
+import logging
+
+from context_builder import CHARS_PER_TOKEN, estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+USE_CASE_KEY = "incident_summarization"
+DEFAULT_SUMMARY_DIR = os.environ.get("TREND_CYBERTRON_SUMMARY_DIR", "database/summaries")
+DEFAULT_CHUNK_TOKENS = 2500
+DEFAULT_WORKERS = 2
+MAP_SUMMARY_TOKENS = 400
+# Notes merged per reduce call; levels are added until one set of notes is left
+REDUCE_INPUT_TOKENS = 3000
+FINAL_SUMMARY_TOKENS = 700
+# Bump when the prompts change so cached summaries from older prompts are not reused
+PROMPT_VERSION = 1
+
+AUDIENCES = {
+    'executive': ("an executive summary for leadership: what happened, business impact, current status "
+                  "and decisions needed, in plain language without log details"),
+    'technical': ("a technical summary for responders: timeline with timestamps, attack techniques, "
+                  "affected hosts and accounts, every indicator (IPs, domains, hashes, CVEs) and recommended "
+                  "containment and remediation steps"),
+    'compliance': ("a compliance summary: data and systems affected, detection and response timestamps, "
+                   "evidence preserved, notification obligations to consider and control gaps observed")
+}
+
+MAP_INSTRUCTIONS = (
+    "You are summarizing one part of a larger security incident log. Write concise notes covering: "
+    "key events in time order (keep timestamps), hosts, accounts and processes involved, indicators "
+    "(IPs, domains, URLs, hashes, CVEs) exactly as written, errors or anomalies and anything that looks "
+    "like attacker activity. Skip routine noise. Notes only, no preamble."
+)
+
+REDUCE_INSTRUCTIONS = (
+    "Merge these notes on consecutive parts of one security incident log into a single set of notes. "
+    "Keep the time order, every timestamp that matters and every indicator exactly as written; drop "
+    "repetition. Notes only, no preamble."
+)
+
+# Lines that open a new event in common log and timeline formats: ISO dates,
+# syslog ("Jan  5 10:00:01"), US dates, [bracketed] prefixes, JSON lines,
+# syslog priorities and epoch timestamps
+_EVENT_START = re.compile(
+    rb"(?:\d{4}-\d{2}-\d{2}|[A-Z][a-z]{2} +\d{1,2} \d{2}:|\d{1,2}/\d{1,2}/\d{2,4}|\[|\{|<\d{1,3}>|\d{10})")
+_PROBE_LINES = 50
+
+class Chunk(NamedTuple):
+    """A run of whole events from the log"""
+    index: int
+    start: int
+    end: int
+    first_line: int
+    last_line: int
+    events: int
+
+def content_key(*parts: Any) -> str:
+    """Cache key for a model call: the hash of everything that determines its answer"""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()[:24]
+
+def _timestamped(data: mmap.mmap) -> bool:
+    """Whether most of the first lines start with a recognizable event prefix"""
+    matches = lines = 0
+    position = 0
+    while lines < _PROBE_LINES and position < len(data):
+        end = data.find(b"\n", position)
+        end = len(data) if end < 0 else end + 1
+        if data[position:end].strip():
+            lines += 1
+            matches += bool(_EVENT_START.match(data, position, end))
+        position = end
+    return lines > 0 and matches >= lines * 0.6
+
+def iter_chunks(data: mmap.mmap, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> Iterator[Chunk]:
+    """Cut a mapped log into chunks of whole events of at most about chunk_tokens each
+
+    An event is a line that starts with a timestamp-like prefix plus the lines
+    that follow it without one (stack traces, wrapped messages); logs without
+    such prefixes use indentation instead. Only byte offsets are produced, so
+    the file is paged in as chunks are read rather than loaded up front.
+    """
+    budget = int(chunk_tokens * CHARS_PER_TOKEN)
+    timestamped = _timestamped(data)
+    index = 0
+    chunk_start = event_start = position = 0
+    first_line = event_line = line = 1
+    events = 0
+    size = len(data)
+    while position < size:
+        end = data.find(b"\n", position)
+        end = size if end < 0 else end + 1
+        if position == 0 or (_EVENT_START.match(data, position, end) if timestamped
+                             else data[position:position + 1] not in b" \t\r\n"):
+            event_start = position
+            event_line = line
+            events += 1
+        # Over budget: end the chunk before the event in progress, which opens the next one
+        if end - chunk_start > budget and event_start > chunk_start:
+            yield Chunk(index, chunk_start, event_start, first_line, event_line - 1, events - 1)
+            index += 1
+            chunk_start = event_start
+            first_line = event_line
+            events = 1
+        position = end
+        line += 1
+    if size > chunk_start:
+        yield Chunk(index, chunk_start, size, first_line, line - 1, events)
+
+class LogSummarizer:
+    def __init__(self,
+                 input_path: str,
+                 generate: Callable[..., Dict[str, Any]],
+                 system_prompt: str = None,
+                 model: str = None,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                 workers: int = DEFAULT_WORKERS,
+                 cache_dir: str = None):
+        """Initialize a summarization job
+
+        `generate(prompt=..., system_prompt=..., max_tokens=...)` must be safe to
+        call from several threads and return a generate_response-style dict.
+        """
+        self.input_path = input_path
+        self.generate = generate
+        self.system_prompt = system_prompt or ""
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.workers = max(1, int(workers))
+        self.cache_dir = cache_dir or os.path.join(DEFAULT_SUMMARY_DIR, "cache")
+        self.stats: Dict[str, Any] = {}
+
+    def _cache_path(self, key: str) -> str:
+        """Path of a cached summary"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _summarize(self, key: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """One cached model call; failures are returned, not cached"""
+        path = self._cache_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return dict(json.load(f), cached=True)
+        except (OSError, ValueError):
+            pass
+        result = self.generate(prompt=prompt, system_prompt=self.system_prompt, max_tokens=max_tokens)
+        if 'error' in result:
+            return {'error': result['error'], 'cached': False}
+        entry = {'summary': result['response'].strip(), 'created_at': time.time()}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(temporary_path, path)
+        return dict(entry, cached=False)
+
+    def _key(self, stage: str, text: str) -> str:
+        """Cache key for a stage's input"""
+        return content_key(PROMPT_VERSION, stage, self.model, self.system_prompt, text)
+
+    def _map(self, data: mmap.mmap, chunk: Chunk, total: int) -> Dict[str, Any]:
+        """Summarize one chunk"""
+        text = data[chunk.start:chunk.end].decode("utf-8", errors="replace")
+        # A single event larger than the budget is cut rather than overflowing num_ctx
+        text = truncate_to_tokens(text, self.chunk_tokens * 2)
+        prompt = (f"{MAP_INSTRUCTIONS}\n\nPart {chunk.index + 1} of {total} "
+                  f"(lines {chunk.first_line}-{chunk.last_line}):\n\n{text}")
+        # The part number is left out of the key so chunks survive lines being appended to the log
+        return self._summarize(self._key("map", text), prompt, MAP_SUMMARY_TOKENS)
+
+    def _reduce(self, notes: List[str]) -> Dict[str, Any]:
+        """Merge consecutive notes into one"""
+        joined = "\n\n".join(f"--- Part {i + 1} ---\n{note}" for i, note in enumerate(notes))
+        prompt = f"{REDUCE_INSTRUCTIONS}\n\n{joined}"
+        return self._summarize(self._key("reduce", joined), prompt, MAP_SUMMARY_TOKENS * 2)
+
+    def _final(self, audience: str, notes: str) -> Dict[str, Any]:
+        """Write the summary for one audience from the merged notes"""
+        prompt = (f"Using these notes on a security incident log, write {AUDIENCES[audience]}.\n\n"
+                  f"Notes:\n{notes}")
+        return self._summarize(self._key(f"final-{audience}", notes), prompt, FINAL_SUMMARY_TOKENS)
+
+    @staticmethod
+    def _groups(notes: List[str]) -> List[List[str]]:
+        """Consecutive runs of notes that fit one reduce prompt (at least two per group)"""
+        groups = [[]]
+        tokens = 0
+        for note in notes:
+            note_tokens = estimate_tokens(note)
+            if len(groups[-1]) >= 2 and tokens + note_tokens > REDUCE_INPUT_TOKENS:
+                groups.append([])
+                tokens = 0
+            groups[-1].append(note)
+            tokens += note_tokens
+        return groups
+
+    def _run_stage(self, pool: ThreadPoolExecutor, calls: List[Callable[[], Dict[str, Any]]],
+                   progress: Optional[Callable[[Dict[str, Any]], None]]) -> List[Dict[str, Any]]:
+        """Run one stage's calls in parallel, keeping their order and reporting progress"""
+        futures = [pool.submit(call) for call in calls]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            self.stats['calls_done'] += 1
+            self.stats['cached_calls'] += bool(result.get('cached'))
+            self.stats['failed_calls'] += 'error' in result
+            self.stats['elapsed'] = round(time.perf_counter() - self._start_time, 2)
+            if progress:
+                progress(self.stats)
+        return results
+
+    def run(self, progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Summarize the whole file; returns the summaries per audience and the stats"""
+        self._start_time = time.perf_counter()
+        size = os.path.getsize(self.input_path)
+        self.stats = stats = {
+            'input': self.input_path,
+            'megabytes': round(size / (1024 * 1024), 2),
+            'stage': "chunking",
+            'chunks': 0,
+            'events': 0,
+            'levels': 0,
+            'calls_done': 0,
+            'cached_calls': 0,
+            'failed_calls': 0,
+            'elapsed': 0.0,
+            'finished': False
+        }
+        summaries: Dict[str, str] = {}
+        if size == 0:
+            stats['finished'] = True
+            return {'summaries': summaries, 'stats': stats}
+
+        with open(self.input_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summarize") as pool:
+            chunks = list(iter_chunks(data, self.chunk_tokens))
+            stats['chunks'] = len(chunks)
+            stats['events'] = sum(chunk.events for chunk in chunks)
+            stats['stage'] = "map"
+            if progress:
+                progress(stats)
+            results = self._run_stage(pool, [
+                (lambda chunk=chunk: self._map(data, chunk, len(chunks))) for chunk in chunks], progress)
+
+        notes = []
+        for chunk, result in zip(chunks, results):
+            if 'error' in result:
+                logger.warning(f"Summary of chunk {chunk.index + 1} failed: {result['error']}")
+                notes.append(f"[Lines {chunk.first_line}-{chunk.last_line} could not be summarized]")
+            else:
+                notes.append(result['summary'])
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summarize") as pool:
+            # Hierarchical merge: each level combines neighbouring notes until one is left
+            while len(notes) > 1:
+                stats['stage'] = "reduce"
+                stats['levels'] += 1
+                groups = self._groups(notes)
+                results = self._run_stage(pool, [
+                    (lambda group=group: self._reduce(group)) for group in groups], progress)
+                notes = [result.get('summary') or "\n\n".join(group) for group, result in zip(groups, results)]
+
+            stats['stage'] = "final"
+            audiences = list(AUDIENCES)
+            results = self._run_stage(pool, [
+                (lambda audience=audience: self._final(audience, notes[0])) for audience in audiences], progress)
+        for audience, result in zip(audiences, results):
+            summaries[audience] = result.get('summary') or f"Summary unavailable: {result.get('error')}"
+
+        stats['stage'] = "done"
+        stats['finished'] = stats['failed_calls'] == 0
+        stats['elapsed'] = round(time.perf_counter() - self._start_time, 2)
+        if progress:
+            progress(stats)
+        return {'summaries': summaries, 'notes': notes[0], 'stats': stats}
+
+def render_markdown(result: Dict[str, Any]) -> str:
+    """The summaries as one Markdown document"""
+    sections = [f"## {audience.title()} Summary\n\n{text}" for audience, text in result['summaries'].items()]
+    return "\n\n".join(sections) + "\n"
+
+def main():
+    """Summarize a log file from the command line"""
+    import argparse
+    import functools
+
+    from log_setup import configure_logging
+    from ollama_client import OllamaClient
+
+    parser = argparse.ArgumentParser(description="Map-reduce summary of a large incident log or timeline")
+    parser.add_argument("input", help="Log or timeline file (any size)")
+    parser.add_argument("-o", "--output", help="Markdown output (default: print)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="11434")
+    parser.add_argument("--provider", default="Ollama", choices=["Ollama", "LM Studio"])
+    parser.add_argument("--model", default="llama-trendcybertron-primus-merged")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Log tokens per chunk")
+    args = parser.parse_args()
+
+    configure_logging("WARNING")
+    client = OllamaClient()
+    generate = functools.partial(client.generate_response, model=args.model, host=args.host, port=args.port,
+                                 provider=args.provider, temperature=0.2, session_id="log-summary",
+                                 priority="batch")
+    summarizer = LogSummarizer(args.input, generate, model=args.model, chunk_tokens=args.chunk_tokens,
+                               workers=args.workers)
+
+    def progress(stats):
+        print(f"\r{stats['stage']}: {stats['calls_done']} calls ({stats['cached_calls']} cached, "
+              f"{stats['failed_calls']} failed) of {stats['chunks']} chunks, {stats['elapsed']}s", end="", flush=True)
+
+    result = summarizer.run(progress=progress)
+    print()
+    document = render_markdown(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document)
+    else:
+        print(document)
+    print(json.dumps(result['stats'], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Metrics for Trend Cybertron App
+Counters, gauges and histograms with Prometheus text exposition, served from
+a small local HTTP endpoint and/or written to a file for node_exporter's
+textfile collector
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Any, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Render {name="value",...}"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    """Render a sample value"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """Common metric state"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """Label values in declaration order"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        """Pair label names with values"""
+        return tuple(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        """(name, labels, value) samples for exposition"""
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the counter"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Current value"""
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        """Set the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """Decrease the gauge"""
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Histogram with cumulative buckets"""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        """Record an observation"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        """Bucket, sum and count samples"""
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                    samples.append((f"{self.name}_bucket", labels + (("le", le),), cumulative))
+                samples.append((f"{self.name}_sum", labels, state['sum']))
+                samples.append((f"{self.name}_count", labels, state['count']))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize the registry"""
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._server = None
+        self._writer = None
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames, **kwargs) -> _Metric:
+        """Return the metric registered under name, creating it on first use"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, tuple(labelnames), **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Get or create a gauge"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Run a callback before each exposition, e.g. to set gauges from live state"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_to_file(self, path: str):
+        """Write the exposition atomically (for node_exporter's textfile collector)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1") -> int:
+        """Serve /metrics on a local port (once per process); returns the bound port"""
+        with self._lock:
+            if self._server is not None:
+                return self._server.server_address[1]
+            registry = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/metrics", "/"):
+                        self.send_error(404)
+                        return
+                    body = registry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    logger.debug(format % args)
+
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+            return self._server.server_address[1]
+
+    def start_file_writer(self, path: str, interval: float = 15.0):
+        """Rewrite the metrics file periodically (once per process)"""
+        with self._lock:
+            if self._writer is not None:
+                return
+
+            def run():
+                while True:
+                    try:
+                        self.write_to_file(path)
+                    except Exception as e:
+                        logger.warning(f"Failed to write metrics to {path}: {e}")
+                    time.sleep(interval)
+
+            self._writer = threading.Thread(target=run, name="metrics-file", daemon=True)
+            self._writer.start()
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+def get_registry() -> MetricsRegistry:
+    """Get the process-wide metrics registry"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = MetricsRegistry()
+    return _default_registry
+
+def start_exporters_from_env():
+    """Start the exporters selected by TREND_CYBERTRON_METRICS_PORT / TREND_CYBERTRON_METRICS_FILE"""
+    registry = get_registry()
+    port = os.environ.get("TREND_CYBERTRON_METRICS_PORT")
+    if port:
+        try:
+            registry.start_http_server(int(port), os.environ.get("TREND_CYBERTRON_METRICS_HOST", "127.0.0.1"))
+        except OSError as e:
+            logger.warning(f"Could not serve metrics on port {port}: {e}")
+    path = os.environ.get("TREND_CYBERTRON_METRICS_FILE")
+    if path:
+        registry.start_file_writer(path, float(os.environ.get("TREND_CYBERTRON_METRICS_INTERVAL", "15")))
+
+def timed(histogram: Histogram, label: str = "method") -> Callable:
+    """Decorator observing a function's duration in a histogram labelled with its name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start_time, **{label: func.__name__})
+        return wrapper
+    return decorator
@@ -0,0 +1,558 @@
+"""
+Mock Inference Server for Trend Cybertron App
+Stand-in for Ollama and LM Studio with configurable time to first token,
+tokens/sec, error rate, parallel slots, model load delay and model pulls
+(download rate, dropped connections, resume), for load and regression
+testing without a GPU or a real model
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+import logging
+
+from embeddings import HashingEmbedder
+from log_setup import configure_logging
+from structured_output import example_document
+
+logger = logging.getLogger(__name__)
+
+WORDS = ("the alert indicates suspicious activity from host analyst should review process tree "
+         "network connections registry changes and lateral movement indicators before escalation").split()
+
+class MockServerConfig:
+    def __init__(self,
+                 models: List[str] = ("llama-trendcybertron-primus-merged",),
+                 ttft: float = 0.2,
+                 tokens_per_second: float = 50.0,
+                 response_tokens: int = 64,
+                 error_rate: float = 0.0,
+                 slots: int = 4,
+                 max_queue: int = 16,
+                 load_delay: float = 1.0,
+                 keep_alive: float = 300.0,
+                 context_length: int = 8192,
+                 embedding_dim: int = 768,
+                 pull_size: int = 2 * 1024 ** 3,
+                 pull_rate: float = 200 * 1024 ** 2,
+                 pull_drop_rate: float = 0.0,
+                 seed: int = None):
+        """Behaviour of the mock server"""
+        self.models = list(models)
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.slots = slots
+        self.max_queue = max_queue
+        self.load_delay = load_delay
+        self.keep_alive = keep_alive
+        self.context_length = context_length
+        self.embedding_dim = embedding_dim
+        # Pulls: bytes per model, bytes/s per pull, chance a pull's connection drops mid-layer
+        self.pull_size = pull_size
+        self.pull_rate = pull_rate
+        self.pull_drop_rate = pull_drop_rate
+        self.seed = seed
+
+def parse_keep_alive(value, default: float) -> float:
+    """Seconds a model stays loaded for an Ollama keep_alive value (negative: forever)"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+    if not match:
+        return default
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+class MockBackend:
+    def __init__(self, config: MockServerConfig):
+        """Shared state behind the HTTP handlers: slots, loaded models and counters"""
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(config.slots)
+        self._load_locks: Dict[str, threading.Lock] = {model: threading.Lock() for model in config.models}
+        self._expires: Dict[str, float] = {}
+        self._embedder = HashingEmbedder(config.embedding_dim)
+        # Bytes of each layer downloaded so far, kept across dropped pulls like Ollama's partial blobs
+        self._partial: Dict[str, int] = {}
+        self.waiting = 0
+        self.in_flight = 0
+        self.stats = {
+            'requests': 0,
+            'generations': 0,
+            'streams': 0,
+            'injected_errors': 0,
+            'rejected': 0,
+            'model_loads': 0,
+            'peak_in_flight': 0,
+            'tokens': 0,
+            'pulls': 0,
+            'pull_drops': 0,
+            'pulled_bytes': 0
+        }
+
+    def count(self, key: str, amount: int = 1):
+        """Increment a counter"""
+        with self._lock:
+            self.stats[key] += amount
+
+    def should_fail(self) -> bool:
+        """Draw an injected failure"""
+        with self._lock:
+            failed = self._random.random() < self.config.error_rate
+            if failed:
+                self.stats['injected_errors'] += 1
+        return failed
+
+    def acquire_slot(self) -> bool:
+        """Wait for a parallel slot like Ollama's scheduler; False when the queue is full"""
+        with self._lock:
+            # Only requests that find every slot busy count against the queue
+            queued = not self._slots.acquire(blocking=False)
+            if queued:
+                if self.waiting >= self.config.max_queue:
+                    self.stats['rejected'] += 1
+                    return False
+                self.waiting += 1
+        if queued:
+            self._slots.acquire()
+        with self._lock:
+            if queued:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        return True
+
+    def release_slot(self):
+        """Free a parallel slot"""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def pull_layers(self, model: str) -> List[Dict[str, Any]]:
+        """Layers of a model to pull: the weights plus small template and parameter blobs"""
+        sizes = [self.config.pull_size, 1536, 96]
+        return [{'digest': "sha256:" + hashlib.sha256(f"{model}/{i}".encode()).hexdigest(), 'total': size}
+                for i, size in enumerate(sizes)]
+
+    def advance_pull(self, digest: str, total: int, amount: int) -> int:
+        """Download part of a layer; returns the bytes downloaded so far"""
+        with self._lock:
+            completed = min(total, self._partial.get(digest, 0) + amount)
+            self.stats['pulled_bytes'] += completed - self._partial.get(digest, 0)
+            self._partial[digest] = completed
+        return completed
+
+    def should_drop_pull(self) -> bool:
+        """Draw a dropped pull connection"""
+        with self._lock:
+            dropped = self._random.random() < self.config.pull_drop_rate
+            if dropped:
+                self.stats['pull_drops'] += 1
+        return dropped
+
+    def add_model(self, model: str):
+        """Make a pulled model available"""
+        with self._lock:
+            if model not in self.config.models:
+                self.config.models.append(model)
+                self._load_locks[model] = threading.Lock()
+
+    def is_loaded(self, model: str) -> bool:
+        """Whether a model is resident"""
+        expires = self._expires.get(model)
+        return expires is not None and (expires < 0 or expires > time.time())
+
+    def ensure_loaded(self, model: str) -> float:
+        """Load a model if needed (concurrent requests wait for the same load); returns the load time"""
+        with self._load_locks[model]:
+            if self.is_loaded(model):
+                return 0.0
+            time.sleep(self.config.load_delay)
+            self._expires[model] = time.time() + self.config.keep_alive
+            self.count('model_loads')
+            return self.config.load_delay
+
+    def touch(self, model: str, keep_alive):
+        """Apply a request's keep_alive after it finishes"""
+        seconds = parse_keep_alive(keep_alive, self.config.keep_alive)
+        if seconds == 0:
+            self._expires.pop(model, None)
+        else:
+            self._expires[model] = -1 if seconds < 0 else time.time() + seconds
+
+    def tokens(self, max_tokens: Optional[int], schema: Dict[str, Any] = None) -> List[str]:
+        """Deterministic response tokens; with a JSON schema, a matching document in 4-character tokens"""
+        count = self.config.response_tokens
+        if max_tokens and max_tokens > 0:
+            count = min(count, max_tokens)
+        if isinstance(schema, dict):
+            text = json.dumps(example_document(schema, items=max(1, self.config.response_tokens // 32)))
+            # Only num_predict / max_tokens cuts a document short, as with a real model
+            return [text[i:i + 4] for i in range(0, len(text), 4)][:max_tokens if max_tokens and max_tokens > 0 else None]
+        if schema == "json":
+            return ['{"response": "', *(WORDS[i % len(WORDS)] + " " for i in range(max(0, count - 2))), '"}']
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+    def token_chunks(self, tokens: List[str]):
+        """Yield tokens paced at tokens_per_second after the time to first token"""
+        time.sleep(self.config.ttft)
+        interval = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        # Batch tokens when the rate is high so the server is not limited by sleep granularity
+        batch = max(1, int(0.01 / interval)) if interval else len(tokens) or 1
+        for start in range(0, len(tokens), batch):
+            if start:
+                time.sleep(interval * batch)
+            yield "".join(tokens[start:start + batch])
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Deterministic embeddings"""
+        return self._embedder.embed(texts).tolist()
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        """Resident models in /api/ps format"""
+        models = []
+        for model in self.config.models:
+            if self.is_loaded(model):
+                expires = self._expires[model]
+                expires_at = (datetime.now(timezone.utc) + timedelta(days=3650) if expires < 0
+                              else datetime.fromtimestamp(expires, timezone.utc))
+                models.append({'name': model, 'model': model, 'size': 4 * 1024 ** 3, 'size_vram': 4 * 1024 ** 3,
+                               'expires_at': expires_at.isoformat().replace('+00:00', 'Z')})
+        return models
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    backend: MockBackend = None
+
+    def log_message(self, format, *args):
+        """Route access logs through logging instead of stderr"""
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, data: Dict[str, Any]):
+        """Send a JSON response"""
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        """Start a streamed response (HTTP/1.0: the body ends when the connection closes)"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    def _write_line(self, text: str):
+        """Write and flush one line of a streamed response"""
+        self.wfile.write(text.encode("utf-8"))
+        self.wfile.flush()
+
+    def _read_json(self) -> Dict[str, Any]:
+        """Read the JSON request body"""
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_GET(self):
+        """GET endpoints"""
+        backend = self.backend
+        backend.count('requests')
+        if self.path == "/api/tags":
+            self._send_json(200, {'models': [{
+                'name': m, 'model': m, 'size': 4 * 1024 ** 3,
+                'modified_at': "2024-01-01T00:00:00Z",
+                'details': {'family': 'llama', 'parameter_size': '8B', 'quantization_level': 'Q4_K_M'}
+            } for m in backend.config.models]})
+        elif self.path == "/api/ps":
+            self._send_json(200, {'models': backend.running_models()})
+        elif self.path == "/api/version":
+            self._send_json(200, {'version': "0.0.0-mock"})
+        elif self.path == "/v1/models":
+            self._send_json(200, {'object': 'list', 'data': [{'id': m, 'object': 'model'} for m in backend.config.models]})
+        else:
+            self._send_json(404, {'error': f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        """POST endpoints"""
+        backend = self.backend
+        backend.count('requests')
+        try:
+            request = self._read_json()
+        except ValueError:
+            self._send_json(400, {'error': "invalid JSON body"})
+            return
+
+        if self.path in ("/api/embed", "/api/embeddings", "/v1/embeddings"):
+            self._embeddings(request)
+            return
+        if self.path == "/api/pull":
+            self._pull(request)
+            return
+        if self.path == "/api/show":
+            if request.get('model') not in backend.config.models:
+                self._send_json(404, {'error': f"model '{request.get('model')}' not found"})
+                return
+            self._send_json(200, {'model_info': {'llama.context_length': backend.config.context_length}})
+            return
+        if self.path not in ("/api/generate", "/api/chat", "/v1/chat/completions"):
+            self._send_json(404, {'error': f"unknown endpoint {self.path}"})
+            return
+
+        model = request.get('model')
+        if model not in backend.config.models:
+            self._send_json(404, {'error': f"model '{model}' not found"})
+            return
+        if not backend.acquire_slot():
+            self._send_json(503, {'error': "server busy, please try again.  maximum pending requests exceeded"})
+            return
+        try:
+            if backend.should_fail():
+                self._send_json(500, {'error': "mock injected failure"})
+                return
+            load_duration = backend.ensure_loaded(model)
+            if self.path == "/v1/chat/completions":
+                self._openai_chat(request, model)
+            else:
+                self._ollama_generate(request, model, load_duration)
+        finally:
+            backend.release_slot()
+
+    def _pull(self, request: Dict[str, Any]):
+        """Ollama /api/pull: layer download progress as NDJSON, resuming partially downloaded layers"""
+        backend = self.backend
+        model = request.get('model') or request.get('name') or ""
+        backend.count('pulls')
+        if not model or model.startswith("missing"):
+            self._send_json(500, {'error': "pull model manifest: file does not exist"})
+            return
+        stream = request.get('stream', True)
+        if stream:
+            self._start_stream("application/x-ndjson")
+            emit = lambda event: self._write_line(json.dumps(event) + "\n")
+        else:
+            emit = lambda event: None
+        try:
+            emit({'status': "pulling manifest"})
+            tick = 0.05
+            for layer in backend.pull_layers(model):
+                completed = backend.advance_pull(layer['digest'], layer['total'], 0)
+                emit({'status': f"pulling {layer['digest'][7:19]}", 'digest': layer['digest'],
+                      'total': layer['total'], 'completed': completed})
+                while completed < layer['total']:
+                    time.sleep(tick)
+                    completed = backend.advance_pull(layer['digest'], layer['total'],
+                                                     int(backend.config.pull_rate * tick))
+                    if stream and backend.should_drop_pull():
+                        # Close the connection mid-layer; the partial layer is kept for the next pull
+                        return
+                    emit({'status': f"pulling {layer['digest'][7:19]}", 'digest': layer['digest'],
+                          'total': layer['total'], 'completed': completed})
+            emit({'status': "verifying sha256 digest"})
+            emit({'status': "writing manifest"})
+            backend.add_model(model)
+            emit({'status': "success"})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled; like Ollama, keep the partial layers for the next pull
+            logger.debug(f"Pull of {model} cancelled by the client")
+            return
+        if not stream:
+            self._send_json(200, {'status': "success"})
+
+    def _embeddings(self, request: Dict[str, Any]):
+        """Ollama /api/embed, legacy /api/embeddings and OpenAI /v1/embeddings"""
+        if self.path == "/api/embeddings":
+            self._send_json(200, {'embedding': self.backend.embed([request.get('prompt', "")])[0]})
+            return
+        texts = request.get('input', "")
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        vectors = self.backend.embed(texts)
+        if self.path == "/api/embed":
+            self._send_json(200, {'model': request.get('model'), 'embeddings': vectors})
+        else:
+            self._send_json(200, {'object': 'list', 'data': [
+                {'object': 'embedding', 'index': i, 'embedding': v} for i, v in enumerate(vectors)
+            ]})
+
+    def _ollama_generate(self, request: Dict[str, Any], model: str, load_duration: float):
+        """Ollama /api/generate and /api/chat, streamed as NDJSON or as one JSON object"""
+        backend = self.backend
+        is_chat = self.path == "/api/chat"
+        prompt_text = (json.dumps(request.get('messages', [])) if is_chat else request.get('prompt', ""))
+        if not is_chat and not prompt_text:
+            # An empty prompt only loads (or with keep_alive 0 unloads) the model
+            backend.touch(model, request.get('keep_alive'))
+            reason = "unload" if parse_keep_alive(request.get('keep_alive'), 1) == 0 else "load"
+            self._send_json(200, {'model': model, 'response': "", 'done': True, 'done_reason': reason,
+                                  'load_duration': int(load_duration * 1e9)})
+            return
+
+        start_time = time.time()
+        num_predict = request.get('options', {}).get('num_predict')
+        tokens = backend.tokens(num_predict, request.get('format'))
+        prompt_tokens = max(1, len(prompt_text) // 4)
+        backend.count('generations')
+        backend.count('tokens', len(tokens))
+
+        def chunk(text: str, done: bool) -> Dict[str, Any]:
+            data = {'model': model, 'created_at': datetime.now(timezone.utc).isoformat(), 'done': done}
+            if is_chat:
+                data['message'] = {'role': 'assistant', 'content': text}
+            else:
+                data['response'] = text
+            if done:
+                elapsed = time.time() - start_time
+                data.update({
+                    'done_reason': 'length' if num_predict and len(tokens) >= num_predict else 'stop',
+                    'total_duration': int((elapsed + load_duration) * 1e9),
+                    'load_duration': int(load_duration * 1e9),
+                    'prompt_eval_count': prompt_tokens,
+                    'prompt_eval_duration': int(backend.config.ttft * 1e9),
+                    'eval_count': len(tokens),
+                    'eval_duration': int(max(0.0, elapsed - backend.config.ttft) * 1e9)
+                })
+            return data
+
+        if request.get('stream', True):
+            backend.count('streams')
+            self._start_stream("application/x-ndjson")
+            try:
+                for text in backend.token_chunks(tokens):
+                    self._write_line(json.dumps(chunk(text, False)) + "\n")
+                self._write_line(json.dumps(chunk("", True)) + "\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled (e.g. a hedge loser); like Ollama, stop generating
+                logger.debug(f"Generation with {model} cancelled by the client")
+        else:
+            text = "".join(backend.token_chunks(tokens))
+            self._send_json(200, chunk(text, True))
+        backend.touch(model, request.get('keep_alive'))
+
+    def _openai_chat(self, request: Dict[str, Any], model: str):
+        """OpenAI-compatible /v1/chat/completions (LM Studio), streamed as server-sent events"""
+        backend = self.backend
+        response_format = request.get('response_format') or {}
+        tokens = backend.tokens(request.get('max_tokens'), response_format.get('json_schema', {}).get('schema'))
+        prompt_tokens = max(1, len(json.dumps(request.get('messages', []))) // 4)
+        completion_id = f"chatcmpl-mock-{int(time.time() * 1000)}"
+        backend.count('generations')
+        backend.count('tokens', len(tokens))
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                 'total_tokens': prompt_tokens + len(tokens)}
+
+        if request.get('stream'):
+            backend.count('streams')
+            self._start_stream("text/event-stream")
+            try:
+                for text in backend.token_chunks(tokens):
+                    event = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                             'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]}
+                    self._write_line(f"data: {json.dumps(event)}\n\n")
+                event = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                         'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage}
+                self._write_line(f"data: {json.dumps(event)}\n\n")
+                self._write_line("data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug(f"Chat completion with {model} cancelled by the client")
+        else:
+            text = "".join(backend.token_chunks(tokens))
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': usage
+            })
+
+class MockInferenceServer:
+    def __init__(self, config: MockServerConfig = None, host: str = "127.0.0.1", port: int = 11434):
+        """Initialize the mock server"""
+        self.config = config or MockServerConfig()
+        self.backend = MockBackend(self.config)
+        handler = type("BoundMockRequestHandler", (MockRequestHandler,), {'backend': self.backend})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MockInferenceServer":
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-inference-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counters"""
+        return dict(self.backend.stats)
+
+def main():
+    """Run the mock server from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mock Ollama / LM Studio server for load and regression testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434, help="11434 to mimic Ollama, 1234 to mimic LM Studio")
+    parser.add_argument("--models", default="llama-trendcybertron-primus-merged", help="Comma-separated model names")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds to first token")
+    parser.add_argument("--tps", type=float, default=50.0, help="Tokens per second per request")
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generations that fail with HTTP 500")
+    parser.add_argument("--slots", type=int, default=4, help="Parallel generations (like OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--max-queue", type=int, default=16, help="Waiting requests before HTTP 503")
+    parser.add_argument("--load-delay", type=float, default=1.0, help="Seconds to load a model that is not resident")
+    parser.add_argument("--pull-size", type=float, default=2.0, help="GB downloaded by a model pull")
+    parser.add_argument("--pull-rate", type=float, default=200.0, help="MB/s per model pull")
+    parser.add_argument("--pull-drop-rate", type=float, default=0.0,
+                        help="Chance per progress tick that a pull's connection drops")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_logging("INFO")
+    config = MockServerConfig(
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        response_tokens=args.tokens,
+        error_rate=args.error_rate,
+        slots=args.slots,
+        max_queue=args.max_queue,
+        load_delay=args.load_delay,
+        pull_size=int(args.pull_size * 1024 ** 3),
+        pull_rate=args.pull_rate * 1024 ** 2,
+        pull_drop_rate=args.pull_drop_rate,
+        seed=args.seed
+    )
+    server = MockInferenceServer(config, args.host, args.port)
+    logger.info(f"Mock inference server listening on {server.url} (models: {', '.join(config.models)})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        logger.info(f"Stats: {server.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Model Pull for Trend Cybertron App
+Streams Ollama model pulls with byte, layer, rate and ETA progress, runs
+several pulls at once, resumes interrupted downloads (Ollama keeps partial
+layers, so a retried pull continues where it stopped) and refreshes the
+cached model catalog when a pull completes
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import logging
+
+import requests
+
+from metrics import get_registry
+from ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PULL_CONCURRENCY = int(os.environ.get("TREND_CYBERTRON_PULL_CONCURRENCY", "2"))
+DEFAULT_PULL_RETRIES = int(os.environ.get("TREND_CYBERTRON_PULL_RETRIES", "8"))
+MAX_BACKOFF = 30.0
+RATE_WINDOW = 10.0
+
+# Errors a retry cannot fix; anything else (dropped connection, stalled or truncated stream) is retried
+PERMANENT_ERRORS = ("file does not exist", "not found", "unauthorized", "invalid model name", "manifest unknown")
+
+STATUSES = ("queued", "pulling", "retrying", "verifying", "success", "failed", "cancelled")
+FINISHED = ("success", "failed", "cancelled")
+
+_metrics = get_registry()
+PULLS = _metrics.counter(
+    "trendcybertron_model_pulls_total", "Model pulls by outcome", ("outcome",))
+PULL_BYTES = _metrics.counter(
+    "trendcybertron_model_pull_bytes_total", "Bytes downloaded by model pulls (resumed bytes excluded)")
+PULL_RESUMES = _metrics.counter(
+    "trendcybertron_model_pull_retries_total", "Interrupted model pulls retried", ("reason",))
+PULL_DURATION = _metrics.histogram(
+    "trendcybertron_model_pull_seconds", "Model pull duration",
+    (), (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Compact duration such as 1h02m, 4m10s or 12s"""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+class PullProgress:
+    def __init__(self, model: str, host: str = "localhost", port: str = "11434"):
+        """Progress of one model pull, updated from Ollama's progress events"""
+        self.model = model
+        self.host = str(host)
+        self.port = str(port)
+        self.status = "queued"
+        self.message = ""
+        self.error = None
+        self.attempts = 0
+        self.layers: Dict[str, Dict[str, int]] = OrderedDict()
+        self.downloaded = 0
+        self.resumed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._seen: set = set()
+        self._samples = deque()
+
+    def start_attempt(self):
+        """Begin a (re)try: layers reported again continue from what is already on disk"""
+        with self._lock:
+            self.attempts += 1
+            self._seen = set()
+            if self.started_at is None:
+                self.started_at = time.time()
+            self.status = "pulling" if self.attempts == 1 else "retrying"
+
+    def update(self, event: Dict[str, Any]):
+        """Apply one progress event from /api/pull"""
+        now = time.time()
+        with self._lock:
+            self.message = event.get('status', self.message)
+            digest = event.get('digest')
+            if digest and event.get('total'):
+                completed = event.get('completed', 0)
+                layer = self.layers.get(digest)
+                if layer is None:
+                    # Bytes already on disk when a layer first shows up were downloaded by an earlier pull
+                    self.resumed += completed
+                    self.layers[digest] = {'total': event['total'], 'completed': completed}
+                else:
+                    if digest in self._seen:
+                        delta = max(0, completed - layer['completed'])
+                        self.downloaded += delta
+                        PULL_BYTES.inc(delta)
+                    layer['total'] = event['total']
+                    layer['completed'] = max(layer['completed'], completed)
+                self._seen.add(digest)
+                self.status = "pulling"
+            elif self.message.startswith(("verifying", "writing")):
+                self.status = "verifying"
+            self._samples.append((now, self.downloaded))
+            while self._samples and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+
+    def finish(self, status: str, error: str = None):
+        """Record the outcome"""
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+
+    @property
+    def completed(self) -> int:
+        return sum(layer['completed'] for layer in self.layers.values())
+
+    @property
+    def total(self) -> int:
+        return sum(layer['total'] for layer in self.layers.values())
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def rate(self) -> float:
+        """Download rate in bytes/s over the last few seconds"""
+        with self._lock:
+            if len(self._samples) < 2:
+                return 0.0
+            (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate, or None when unknown"""
+        rate = self.rate()
+        if self.status == "success":
+            return 0.0
+        if rate <= 0 or not self.total:
+            return None
+        return max(0, self.total - self.completed) / rate
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict view for rendering"""
+        total = self.total
+        completed = self.completed
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'model': self.model,
+            'host': self.host,
+            'port': self.port,
+            'status': self.status,
+            'message': self.message,
+            'error': self.error,
+            'attempts': self.attempts,
+            'layers': len(self.layers),
+            'layers_done': sum(1 for layer in self.layers.values() if layer['completed'] >= layer['total']),
+            'completed': completed,
+            'total': total,
+            'fraction': 1.0 if self.status == "success" else (completed / total if total else 0.0),
+            'downloaded': self.downloaded,
+            'resumed': self.resumed,
+            'rate': self.rate(),
+            'eta': self.eta(),
+            'elapsed': elapsed
+        }
+
+    def describe(self) -> str:
+        """One-line summary: layers, bytes, rate and ETA"""
+        s = self.snapshot()
+        if s['status'] == "success":
+            average = s['downloaded'] / s['elapsed'] if s['elapsed'] else 0.0
+            return (f"done · {format_bytes(s['total'])} in {format_duration(s['elapsed'])} "
+                    f"({format_bytes(average)}/s)"
+                    + (f" · {format_bytes(s['resumed'])} resumed" if s['resumed'] else "")
+                    + (f" · {s['attempts'] - 1} {'retry' if s['attempts'] == 2 else 'retries'}" if s['attempts'] > 1 else ""))
+        if s['status'] in ("failed", "cancelled"):
+            return f"{s['status']}" + (f": {s['error']}" if s['error'] else "")
+        if not s['total']:
+            return s['message'] or s['status']
+        text = (f"{s['fraction']:.0%} · layer {min(s['layers_done'] + 1, s['layers'])}/{s['layers']} · "
+                f"{format_bytes(s['completed'])} / {format_bytes(s['total'])} · "
+                f"{format_bytes(s['rate'])}/s · ETA {format_duration(s['eta'])}")
+        if s['status'] == "retrying":
+            text += f" · retry {s['attempts'] - 1}"
+        elif s['status'] == "verifying":
+            text = f"{s['message']} · {format_bytes(s['total'])}"
+        return text
+
+def invalidate_catalog(client: OllamaClient, model: str, host: str, port: str, monitor=None):
+    """Forget cached model facts after a pull so the new model shows up everywhere"""
+    client.context_sizer.forget_model(host, port, model)
+    client.residency.refresh_model_sizes(host, port)
+    if monitor is not None:
+        monitor.request_probe("Ollama", host, port)
+
+def pull_model(model: str,
+               host: str = "localhost",
+               port: str = "11434",
+               client: OllamaClient = None,
+               progress: PullProgress = None,
+               on_progress: Callable[[PullProgress], None] = None,
+               cancel: threading.Event = None,
+               max_retries: int = DEFAULT_PULL_RETRIES,
+               monitor=None) -> PullProgress:
+    """Pull a model, retrying with backoff after interruptions; returns its final progress"""
+    client = client or OllamaClient()
+    progress = progress or PullProgress(model, host, port)
+    cancel = cancel or threading.Event()
+    error = None
+    while progress.attempts <= max_retries:
+        if cancel.is_set():
+            break
+        progress.start_attempt()
+        if on_progress:
+            on_progress(progress)
+        try:
+            for event in client.stream_pull(model, host, port):
+                if cancel.is_set():
+                    # Leaving the stream closes the connection; Ollama keeps the partial layers
+                    break
+                if 'error' in event:
+                    error = event['error']
+                    break
+                progress.update(event)
+                if on_progress:
+                    on_progress(progress)
+                if event.get('status') == "success":
+                    progress.finish("success")
+                    PULLS.inc(outcome="success")
+                    PULL_DURATION.observe(progress.finished_at - progress.started_at)
+                    invalidate_catalog(client, model, host, port, monitor)
+                    logger.info(f"Pulled {model} on {host}:{port}: {progress.describe()}",
+                                extra={'event': 'model.pull', 'model': model, 'bytes': progress.total,
+                                       'attempts': progress.attempts})
+                    if on_progress:
+                        on_progress(progress)
+                    return progress
+            else:
+                error = error or "pull stream ended before completion"
+        except (requests.RequestException, ValueError) as e:
+            error = str(e)
+        if cancel.is_set():
+            break
+        if error and any(marker in error.lower() for marker in PERMANENT_ERRORS):
+            progress.finish("failed", error)
+            PULLS.inc(outcome="failed")
+            logger.error(f"Pull of {model} failed: {error}")
+            if on_progress:
+                on_progress(progress)
+            return progress
+        if progress.attempts > max_retries:
+            break
+        reason = "stalled" if "timed out" in (error or "").lower() else "interrupted"
+        PULL_RESUMES.inc(reason=reason)
+        delay = min(MAX_BACKOFF, 2.0 ** (progress.attempts - 1))
+        logger.warning(f"Pull of {model} interrupted ({error}); resuming in {delay:.0f}s")
+        error = None
+        cancel.wait(delay)
+
+    if cancel.is_set():
+        progress.finish("cancelled")
+        PULLS.inc(outcome="cancelled")
+    else:
+        progress.finish("failed", f"gave up after {progress.attempts} attempts: {error}")
+        PULLS.inc(outcome="failed")
+    if on_progress:
+        on_progress(progress)
+    return progress
+
+class PullManager:
+    def __init__(self,
+                 client: OllamaClient = None,
+                 concurrency: int = DEFAULT_PULL_CONCURRENCY,
+                 monitor=None,
+                 max_retries: int = DEFAULT_PULL_RETRIES,
+                 history: int = 20):
+        """Initialize the pull manager; at most `concurrency` pulls download at once"""
+        self.client = client or OllamaClient()
+        self.monitor = monitor
+        self.max_retries = max_retries
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="model-pull")
+        self._lock = threading.Lock()
+        self._jobs: Dict[Tuple[str, str, str], PullProgress] = OrderedDict()
+        self._cancels: Dict[Tuple[str, str, str], threading.Event] = {}
+
+    def pull(self, models: List[str], host: str = "localhost", port: str = "11434") -> List[PullProgress]:
+        """Queue pulls; a model already being pulled from the same host keeps its running job"""
+        jobs = []
+        for model in dict.fromkeys(m.strip() for m in models if m and m.strip()):
+            key = (str(host), str(port), model)
+            with self._lock:
+                progress = self._jobs.get(key)
+                if progress is not None and not progress.finished:
+                    jobs.append(progress)
+                    continue
+                progress = PullProgress(model, host, port)
+                cancel = threading.Event()
+                self._jobs.pop(key, None)
+                self._jobs[key] = progress
+                self._cancels[key] = cancel
+                self._trim()
+            self._executor.submit(pull_model, model, host, port, self.client, progress,
+                                  cancel=cancel, max_retries=self.max_retries, monitor=self.monitor)
+            jobs.append(progress)
+        return jobs
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond the history size (lock held)"""
+        finished = [key for key, progress in self._jobs.items() if progress.finished]
+        for key in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[key]
+            self._cancels.pop(key, None)
+
+    def cancel(self, model: str, host: str = "localhost", port: str = "11434") -> bool:
+        """Stop a queued or running pull; downloaded layers are kept for a later pull"""
+        with self._lock:
+            cancel = self._cancels.get((str(host), str(port), model))
+        if cancel is None:
+            return False
+        cancel.set()
+        return True
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Snapshots of current and recent pulls, oldest first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [dict(job.snapshot(), summary=job.describe()) for job in jobs]
+
+    def active(self) -> bool:
+        """Whether any pull is queued or running"""
+        with self._lock:
+            return any(not job.finished for job in self._jobs.values())
+
+    def clear_finished(self):
+        """Forget finished pulls"""
+        with self._lock:
+            for key in [key for key, job in self._jobs.items() if job.finished]:
+                del self._jobs[key]
+                self._cancels.pop(key, None)
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+def get_pull_manager(monitor=None) -> PullManager:
+    """Get the process-wide pull manager"""
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = PullManager(monitor=monitor)
+    return _default_manager
+
+def watch(jobs: List[PullProgress], interval: float = 1.0, stream=None) -> bool:
+    """Print a progress line per pull until all finish (redrawn in place on a terminal); True if all succeeded"""
+    stream = stream or sys.stdout
+    redraw = stream.isatty()
+    width = max(len(job.model) for job in jobs)
+    last = {}
+    drawn = False
+    while True:
+        done = all(job.finished for job in jobs)
+        lines = [f"  {job.model:<{width}}  {job.describe()}" for job in jobs]
+        if redraw:
+            if drawn:
+                stream.write(f"\x1b[{len(lines)}F")
+            stream.write("".join(f"\x1b[2K{line}\n" for line in lines))
+            drawn = True
+        else:
+            # Not a terminal: print a line only when a pull's status changes or every ~10 intervals
+            for job, line in zip(jobs, lines):
+                key = (job.status, int(job.snapshot()['fraction'] * 10))
+                if last.get(job.model) != key:
+                    last[job.model] = key
+                    stream.write(line + "\n")
+        stream.flush()
+        if done:
+            return all(job.status == "success" for job in jobs)
+        time.sleep(interval)
+
+def main():
+    """Pull one or more models with progress from the command line"""
+    import argparse
+
+    from log_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Pull Ollama models with progress, in parallel, resuming on failure")
+    parser.add_argument("models", nargs="+", help="Model names")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="11434")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_PULL_CONCURRENCY, help="Pulls at once")
+    parser.add_argument("--retries", type=int, default=DEFAULT_PULL_RETRIES, help="Retries per interrupted pull")
+    args = parser.parse_args()
+
+    configure_logging("WARNING")
+    manager = PullManager(concurrency=args.concurrency, max_retries=args.retries)
+    jobs = manager.pull(args.models, args.host, args.port)
+    try:
+        ok = watch(jobs)
+    except KeyboardInterrupt:
+        for job in jobs:
+            manager.cancel(job.model, args.host, args.port)
+        print("\nCancelled; run the same command again to resume.")
+        sys.exit(130)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
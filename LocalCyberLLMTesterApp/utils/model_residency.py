@@ -0,0 +1,299 @@
+"""
+Model Residency Manager for Trend Cybertron App
+Keeps the right models loaded in Ollama: preloads and warms up models ahead
+of use, pins or unpins them with keep_alive and unloads the least recently
+used ones when resident models exceed a memory budget
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+import requests
+
+from context_sizing import ContextSizer, get_context_sizer
+
+logger = logging.getLogger(__name__)
+
+# None leaves keep_alive to the server (OLLAMA_KEEP_ALIVE)
+DEFAULT_KEEP_ALIVE = os.environ.get("TREND_CYBERTRON_KEEP_ALIVE") or None
+PINNED_KEEP_ALIVE = -1
+UNLOAD_KEEP_ALIVE = 0
+
+def _memory_budget_from_env() -> Optional[int]:
+    """Memory budget for resident models in bytes, from TREND_CYBERTRON_MODEL_MEMORY_GB"""
+    value = os.environ.get("TREND_CYBERTRON_MODEL_MEMORY_GB")
+    return int(float(value) * 1024 ** 3) if value else None
+
+class ModelResidencyManager:
+    def __init__(self,
+                 memory_budget_bytes: int = None,
+                 default_keep_alive: str = DEFAULT_KEEP_ALIVE,
+                 refresh_interval: float = 15.0,
+                 load_timeout: float = 600,
+                 context_sizer: ContextSizer = None):
+        """Initialize the residency manager"""
+        self.memory_budget_bytes = memory_budget_bytes if memory_budget_bytes is not None else _memory_budget_from_env()
+        self.default_keep_alive = default_keep_alive
+        self.refresh_interval = refresh_interval
+        self.load_timeout = load_timeout
+        # Loads use the num_ctx requests will ask for; a different one makes Ollama reload the model
+        self.context_sizer = context_sizer or get_context_sizer()
+        self._lock = threading.Lock()
+        self._pinned = set()
+        self._loading = set()
+        self._preloaded = set()
+        self._resident: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._last_refresh: Dict[Tuple[str, str], float] = {}
+        self._model_sizes: Dict[Tuple[str, str, str], int] = {}
+        self.load_events: List[Dict[str, Any]] = []
+        self._endpoints: List[Tuple[str, str]] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def keep_alive_for(self, host: str, port: str, model: str):
+        """keep_alive to send with a request so it does not undo a pin"""
+        if (str(host), str(port), model) in self._pinned:
+            return PINNED_KEEP_ALIVE
+        return self.default_keep_alive
+
+    def keep_alive_fields(self, host: str, port: str, model: str) -> Dict[str, Any]:
+        """Request fields for keep_alive_for; empty when the server default applies"""
+        keep_alive = self.keep_alive_for(host, port, model)
+        return {} if keep_alive is None else {"keep_alive": keep_alive}
+
+    def is_pinned(self, host: str, port: str, model: str) -> bool:
+        """Whether a model is pinned in memory"""
+        return (str(host), str(port), model) in self._pinned
+
+    def _load(self, host: str, port: str, model: str, keep_alive) -> Dict[str, Any]:
+        """Send an empty generate request, which loads (or unloads) a model without generating"""
+        url = f"http://{host}:{port}/api/generate"
+        start_time = time.time()
+        payload = {"model": model, "prompt": "", "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        num_ctx = None
+        if keep_alive != UNLOAD_KEEP_ALIVE:
+            num_ctx = self.context_sizer.expected_num_ctx(host, port, model)
+            payload["options"] = {"num_ctx": num_ctx}
+        try:
+            response = requests.post(
+                url,
+                json=payload,
+                timeout=self.load_timeout,
+                headers={'Content-Type': 'application/json'}
+            )
+            if response.status_code != 200:
+                return {'success': False, 'error': f"HTTP {response.status_code}", 'model': model}
+            data = response.json()
+            if num_ctx is not None:
+                self.context_sizer.record_loaded(host, port, model, num_ctx)
+            return {
+                'success': True,
+                'model': model,
+                'num_ctx': num_ctx,
+                'load_duration': data.get('load_duration', 0) / 1e9,
+                'elapsed': time.time() - start_time
+            }
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'model': model}
+
+    def preload(self, model: str, host: str = "localhost", port: str = "11434", keep_alive=None) -> Dict[str, Any]:
+        """Load a model into memory now (blocking)"""
+        key = (str(host), str(port), model)
+        with self._lock:
+            self._loading.add(key)
+        try:
+            if keep_alive is None:
+                keep_alive = self.keep_alive_for(host, port, model)
+            result = self._load(host, port, model, keep_alive)
+        finally:
+            with self._lock:
+                self._loading.discard(key)
+        if result['success']:
+            logger.info(f"Model {model} resident on {host}:{port} (load {result['load_duration']:.1f}s)")
+            self.load_events.append({'time': time.time(), 'model': model, 'backend': f"{host}:{port}",
+                                     'load_duration': result['load_duration']})
+            self.refresh(host, port)
+            self.enforce_budget(host, port, protect=[model])
+        else:
+            logger.warning(f"Failed to preload {model} on {host}:{port}: {result['error']}")
+        return result
+
+    def preload_async(self, models: List[str], host: str = "localhost", port: str = "11434"):
+        """Warm up models in the background, skipping ones already resident or loading"""
+        resident = {m['name'] for m in self.resident_models(host, port)}
+        for model in models:
+            key = (str(host), str(port), model)
+            with self._lock:
+                if not model or model in resident or key in self._loading:
+                    continue
+                self._loading.add(key)
+            threading.Thread(target=self._preload_worker, args=(model, host, port),
+                             name=f"preload-{model}", daemon=True).start()
+
+    def _preload_worker(self, model: str, host: str, port: str):
+        """Background preload that clears the loading marker set by preload_async"""
+        try:
+            self.preload(model, host, port)
+        finally:
+            with self._lock:
+                self._loading.discard((str(host), str(port), model))
+
+    def ensure_preloaded(self, model: str, host: str = "localhost", port: str = "11434"):
+        """Preload a model once per process (e.g. the default model at startup)"""
+        key = (str(host), str(port), model)
+        with self._lock:
+            if key in self._preloaded:
+                return
+            self._preloaded.add(key)
+        self.preload_async([model], host, port)
+
+    def is_loading(self, host: str, port: str, model: str) -> bool:
+        """Whether a preload for this model is in progress"""
+        return (str(host), str(port), model) in self._loading
+
+    def pin(self, model: str, host: str = "localhost", port: str = "11434") -> Dict[str, Any]:
+        """Keep a model loaded indefinitely"""
+        with self._lock:
+            self._pinned.add((str(host), str(port), model))
+        return self.preload(model, host, port, keep_alive=PINNED_KEEP_ALIVE)
+
+    def unpin(self, model: str, host: str = "localhost", port: str = "11434") -> Dict[str, Any]:
+        """Return a pinned model to the default keep_alive (the server's unless one is configured)"""
+        with self._lock:
+            self._pinned.discard((str(host), str(port), model))
+        return self._load(host, port, model, self.default_keep_alive)
+
+    def unload(self, model: str, host: str = "localhost", port: str = "11434") -> Dict[str, Any]:
+        """Evict a model from memory now"""
+        with self._lock:
+            self._pinned.discard((str(host), str(port), model))
+        result = self._load(host, port, model, UNLOAD_KEEP_ALIVE)
+        if result['success']:
+            logger.info(f"Unloaded model {model} from {host}:{port}")
+        self.refresh(host, port)
+        return result
+
+    def refresh(self, host: str = "localhost", port: str = "11434") -> List[Dict[str, Any]]:
+        """Fetch resident models from /api/ps and cache them"""
+        key = (str(host), str(port))
+        try:
+            response = requests.get(f"http://{host}:{port}/api/ps", timeout=5)
+            models = response.json().get('models', []) if response.status_code == 200 else []
+        except Exception as e:
+            logger.debug(f"Could not refresh resident models on {host}:{port}: {e}")
+            models = self._resident.get(key, [])
+        with self._lock:
+            self._resident[key] = models
+            self._last_refresh[key] = time.time()
+        return models
+
+    def resident_models(self, host: str = "localhost", port: str = "11434") -> List[Dict[str, Any]]:
+        """Cached resident models with pin status; never touches the network"""
+        key = (str(host), str(port))
+        with self._lock:
+            models = list(self._resident.get(key, []))
+        return [{
+            'name': m.get('name'),
+            'size': m.get('size', 0),
+            'size_vram': m.get('size_vram', 0),
+            'expires_at': m.get('expires_at'),
+            'pinned': self.is_pinned(host, port, m.get('name'))
+        } for m in models]
+
+    def refresh_model_sizes(self, host: str = "localhost", port: str = "11434"):
+        """Cache each model's size on disk from /api/tags as an estimate of its memory needs"""
+        try:
+            response = requests.get(f"http://{host}:{port}/api/tags", timeout=5)
+            for m in response.json().get('models', []):
+                self._model_sizes[(str(host), str(port), m['name'])] = m.get('size', 0)
+        except Exception as e:
+            logger.debug(f"Could not read model sizes from {host}:{port}: {e}")
+
+    def model_size(self, model: str, host: str = "localhost", port: str = "11434") -> int:
+        """Approximate memory needed by a model (cached; 0 when unknown)"""
+        return self._model_sizes.get((str(host), str(port), model), 0)
+
+    def fits_budget(self, models: List[str], host: str = "localhost", port: str = "11434") -> bool:
+        """Whether a set of models can be resident together within the memory budget"""
+        if not self.memory_budget_bytes:
+            return True
+        return sum(self.model_size(m, host, port) for m in models) <= self.memory_budget_bytes
+
+    def enforce_budget(self, host: str = "localhost", port: str = "11434", protect: List[str] = None) -> List[str]:
+        """Unload least recently used, unpinned models until resident memory fits the budget"""
+        if not self.memory_budget_bytes:
+            return []
+        protect = set(protect or [])
+        resident = self.resident_models(host, port)
+        total = sum(m['size'] for m in resident)
+        # Ollama pushes expires_at forward on every use, so the earliest expiry is the LRU model
+        candidates = sorted(
+            (m for m in resident if not m['pinned'] and m['name'] not in protect),
+            key=lambda m: self._parse_time(m['expires_at'])
+        )
+        unloaded = []
+        for model in candidates:
+            if total <= self.memory_budget_bytes:
+                break
+            if self.unload(model['name'], host, port)['success']:
+                total -= model['size']
+                unloaded.append(model['name'])
+        return unloaded
+
+    @staticmethod
+    def _parse_time(value: str) -> float:
+        """Parse Ollama's RFC3339 expires_at (nanosecond precision) into a timestamp"""
+        if not value:
+            return 0.0
+        try:
+            trimmed = re.sub(r'(\.\d{6})\d+', r'\1', value)
+            return datetime.fromisoformat(trimmed.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return 0.0
+
+    def start(self):
+        """Periodically refresh resident models and enforce the budget in the background"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="model-residency", daemon=True)
+        self._thread.start()
+
+    def watch(self, host: str, port: str):
+        """Add an endpoint to the background refresh"""
+        endpoint = (str(host), str(port))
+        with self._lock:
+            if endpoint not in self._endpoints:
+                self._endpoints.append(endpoint)
+        self.start()
+
+    def _run(self):
+        """Background maintenance loop"""
+        while not self._stop.is_set():
+            for host, port in list(self._endpoints):
+                self.refresh(host, port)
+                self.refresh_model_sizes(host, port)
+                self.enforce_budget(host, port)
+            self._stop.wait(self.refresh_interval)
+
+    def stop(self):
+        """Stop background maintenance"""
+        self._stop.set()
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+def get_residency_manager() -> ModelResidencyManager:
+    """Get the process-wide residency manager"""
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = ModelResidencyManager()
+    return _default_manager
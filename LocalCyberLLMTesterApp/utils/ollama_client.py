@@ -5,19 +5,93 @@ Handles communication with Ollama API
 
 import requests
 import json
+import socket
+import threading
 import time
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterator, List, Any, Optional
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from admission import AdmissionController, BackendBusyError, get_admission_controller
+from context_builder import estimate_message_tokens, estimate_tokens
+from context_sizing import ContextSizer, get_context_sizer
+from model_residency import ModelResidencyManager, get_residency_manager
+from semantic_cache import SemanticCache
+from metrics import LATENCY_BUCKETS, RATE_BUCKETS, get_registry
+from tracing import get_tracer
+from log_setup import truncate
+from structured_output import IncrementalJSONParser, parse_json_response, records_key, request_options
+
 logger = logging.getLogger(__name__)
 
-class OllamaClient:
+_metrics = get_registry()
+INFERENCE_REQUESTS = _metrics.counter(
+    "trendcybertron_inference_requests_total", "Generation requests by outcome", ("provider", "model", "outcome"))
+INFERENCE_LATENCY = _metrics.histogram(
+    "trendcybertron_inference_latency_seconds", "Generation request latency", ("provider", "model"), LATENCY_BUCKETS)
+INFERENCE_TTFT = _metrics.histogram(
+    "trendcybertron_inference_ttft_seconds", "Time to first token", ("provider", "model"), LATENCY_BUCKETS)
+INFERENCE_TOKENS_PER_SECOND = _metrics.histogram(
+    "trendcybertron_inference_tokens_per_second", "Generation speed", ("provider", "model"), RATE_BUCKETS)
+INFERENCE_RETRIES = _metrics.counter(
+    "trendcybertron_inference_retries_total", "Generation attempts retried", ("provider", "reason"))
+INFERENCE_ERRORS = _metrics.counter(
+    "trendcybertron_inference_errors_total", "Failed generation attempts by error type", ("provider", "type"))
+
+class CancelToken(threading.Event):
     def __init__(self):
+        """A cancel flag that also aborts the streamed response attached to it"""
+        super().__init__()
+        self._response = None
+        self._response_lock = threading.Lock()
+
+    def attach(self, response: requests.Response) -> bool:
+        """Abort `response` when cancelled; returns False (after aborting it) if that already happened"""
+        with self._response_lock:
+            if not self.is_set():
+                self._response = response
+                return True
+        abort_response(response)
+        return False
+
+    def set(self):
+        """Cancel, aborting the attached response so its reader returns now instead of at the next line"""
+        super().set()
+        with self._response_lock:
+            response, self._response = self._response, None
+        if response is not None:
+            abort_response(response)
+
+def abort_response(response: requests.Response):
+    """Close a streamed response from another thread, waking a reader blocked on it"""
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        # http.client drops the connection's socket when the body ends with the connection; its reader keeps it
+        sock = getattr(getattr(getattr(getattr(response.raw, '_fp', None), 'fp', None), 'raw', None), '_sock', None)
+    if sock is not None:
+        # close() alone waits for the blocked read; shutdown wakes it and tells the backend to stop
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+class OllamaClient:
+    def __init__(self, admission: AdmissionController = None, context_sizer: ContextSizer = None,
+                 residency: ModelResidencyManager = None, semantic_cache: SemanticCache = None):
         """Initialize the Ollama client"""
         self.base_url = "http://localhost:11434"
         self.timeout = 300  # Increased timeout to 5 minutes for longer responses
+        # Shared across clients so per-backend limits hold for every session
+        self.admission = admission or get_admission_controller()
+        # Shared so the num_ctx bucket each backend has loaded is known to every session
+        self.context_sizer = context_sizer or get_context_sizer()
+        if self.context_sizer.limit_lookup is None:
+            self.context_sizer.limit_lookup = self.get_model_context_length
+        # Decides keep_alive per request so normal traffic does not unpin a pinned model
+        self.residency = residency or get_residency_manager()
+        # Opt-in: only consulted for requests that pass a cache_scope
+        self.semantic_cache = semantic_cache
     
     def set_base_url(self, host: str, port: str):
         """Set the base URL for Ollama API"""
@@ -75,6 +149,47 @@ class OllamaClient:
             logger.error(f"Error listing LM Studio models: {e}")
             return []
     
+    def _record_failure(self, provider: str, model: str, error_type: str, retrying: bool):
+        """Count a failed attempt, and the request itself when no retry follows"""
+        INFERENCE_ERRORS.inc(provider=provider, type=error_type)
+        if retrying:
+            INFERENCE_RETRIES.inc(provider=provider, reason=error_type)
+        else:
+            INFERENCE_REQUESTS.inc(provider=provider, model=model, outcome="error")
+    
+    def _record_success(self, provider: str, model: str, elapsed: float, eval_count: int,
+                        eval_seconds: float = None, ttft: float = None):
+        """Record latency, generation speed and time to first token of a successful request"""
+        INFERENCE_REQUESTS.inc(provider=provider, model=model, outcome="success")
+        INFERENCE_LATENCY.observe(elapsed, provider=provider, model=model)
+        eval_seconds = eval_seconds or elapsed
+        if eval_count and eval_seconds > 0:
+            INFERENCE_TOKENS_PER_SECOND.observe(eval_count / eval_seconds, provider=provider, model=model)
+        if ttft is not None:
+            INFERENCE_TTFT.observe(ttft, provider=provider, model=model)
+    
+    @staticmethod
+    def _error_type(error: Exception) -> str:
+        """Metric label for an exception"""
+        if isinstance(error, BackendBusyError):
+            return "busy"
+        if isinstance(error, requests.exceptions.Timeout):
+            return "timeout"
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return "connection"
+        return "unexpected"
+    
+    def _error_result(self, error_msg: str) -> Dict[str, Any]:
+        """Build the result returned when a generation request fails"""
+        return {
+            'response': f"Error: {error_msg}",
+            'tokens': 0,
+            'eval_count': 0,
+            'prompt_tokens': 0,
+            'inference_time': 0,
+            'error': error_msg
+        }
+    
     def generate_response(self, 
                          prompt: str, 
                          system_prompt: str = None,
@@ -85,12 +200,84 @@ class OllamaClient:
                          max_tokens: int = 2000,
                          stream: bool = False,
                          max_retries: int = 3,
-                         provider: str = "Ollama") -> str:
-        """Generate a response using Ollama or LM Studio API with retry logic"""
+                         provider: str = "Ollama",
+                         session_id: str = None,
+                         on_queued: Callable[[int], None] = None,
+                         messages: List[Dict[str, str]] = None,
+                         num_ctx: int = None,
+                         cache_scope: str = None,
+                         cache_embedder=None,
+                         cache_threshold: float = None,
+                         output_schema: Dict[str, Any] = None,
+                         on_first_token: Callable[[], None] = None,
+                         cancel: threading.Event = None,
+                         priority: str = "interactive") -> Dict[str, Any]:
+        """Generate a response using Ollama or LM Studio API with retry logic
+        
+        When `messages` is given it is sent as the full multi-turn conversation
+        (system prompt included) and `prompt`/`system_prompt` are only used for logging.
+        When `num_ctx` is None it is sized to the request (see ContextSizer).
+        When `cache_scope` (usually the tab name) is given and a semantic cache is
+        configured, near-duplicate single-turn prompts are answered from the cache;
+        `cache_embedder` and `cache_threshold` override the cache's defaults.
+        When `output_schema` (a JSON schema) is given the backend is constrained to
+        it and the parsed document is returned under 'structured'.
+        When `on_first_token` or `cancel` is given the response is streamed and
+        collected: `on_first_token` is called when the first token arrives, and
+        setting `cancel` closes the connection and returns a 'cancelled' result
+        (a CancelToken closes it at once, even while waiting for the next line).
+        `priority` is the admission class: interactive, batch or background.
+        """
+        incremental = on_first_token is not None or cancel is not None
+        cache_vector = None
+        use_cache = (self.semantic_cache is not None and cache_scope and output_schema is None
+                     and self._is_single_turn(messages))
+        if use_cache:
+            hit, cache_vector = self.semantic_cache.lookup(prompt, cache_scope, model, system_prompt,
+                                                           cache_embedder, cache_threshold)
+            if hit is not None:
+                logger.info(f"Semantic cache hit for {model} (similarity {hit['similarity']:.3f})")
+                INFERENCE_REQUESTS.inc(provider=provider, model=model, outcome="cached")
+                return {
+                    'response': hit['response'],
+                    'tokens': 0,
+                    'eval_count': 0,
+                    'prompt_tokens': 0,
+                    'inference_time': 0,
+                    'cached': True,
+                    'cache_similarity': hit['similarity'],
+                    'cached_prompt': hit['cached_prompt'],
+                    'latency_saved': hit['latency_saved']
+                }
+        
+        context_info = {'num_ctx': num_ctx, 'reload': False, 'overflow': False}
+        if provider == "Ollama" and num_ctx is None:
+            context_info = self.size_context(host, port, model, prompt, system_prompt, messages, max_tokens)
+            num_ctx = context_info['num_ctx']
+            if context_info['overflow']:
+                prompt, messages = self.fit_to_context(prompt, system_prompt, messages, num_ctx, max_tokens)
         
         for attempt in range(max_retries):
             try:
-                if provider == "Ollama":
+                if provider == "Ollama" and messages is not None:
+                    # Multi-turn conversations go through the chat endpoint
+                    url = f"http://{host}:{port}/api/chat"
+                    
+                    payload = {
+                        "model": model,
+                        "messages": messages,
+                        "stream": stream or incremental,
+                        **self.residency.keep_alive_fields(host, port, model),
+                        "options": {
+                            "temperature": temperature,
+                            "top_p": 0.9,
+                            "top_k": 40,
+                            "repeat_penalty": 1.1,
+                            "num_predict": max_tokens,
+                            "num_ctx": num_ctx
+                        }
+                    }
+                elif provider == "Ollama":
                     # Ollama API format
                     url = f"http://{host}:{port}/api/generate"
                     
@@ -102,14 +289,15 @@ class OllamaClient:
                     payload = {
                         "model": model,
                         "prompt": full_prompt,
-                        "stream": stream,
+                        "stream": stream or incremental,
+                        **self.residency.keep_alive_fields(host, port, model),
                         "options": {
                             "temperature": temperature,
                             "top_p": 0.9,
                             "top_k": 40,
                             "repeat_penalty": 1.1,
                             "num_predict": max_tokens,
-                            "num_ctx": 8192
+                            "num_ctx": num_ctx
                         }
                     }
                 else:  # LM Studio
@@ -117,15 +305,17 @@ class OllamaClient:
                     url = f"http://{host}:{port}/v1/chat/completions"
                     
                     # Prepare messages array
-                    messages = []
-                    if system_prompt:
-                        messages.append({"role": "system", "content": system_prompt})
-                    messages.append({"role": "user", "content": prompt})
+                    chat_messages = messages
+                    if chat_messages is None:
+                        chat_messages = []
+                        if system_prompt:
+                            chat_messages.append({"role": "system", "content": system_prompt})
+                        chat_messages.append({"role": "user", "content": prompt})
                     
                     payload = {
                         "model": model,
-                        "messages": messages,
-                        "stream": stream,
+                        "messages": chat_messages,
+                        "stream": stream or incremental,
                         "temperature": temperature,
                         "max_tokens": max_tokens,
                         "top_p": 0.9,
@@ -133,98 +323,251 @@ class OllamaClient:
                         "repeat_penalty": 1.1
                     }
                 
-                logger.info(f"Generating response with {provider} model: {model} (attempt {attempt + 1}/{max_retries})")
-                logger.info(f"Prompt length: {len(prompt)} characters")
+                if output_schema is not None:
+                    payload.update(request_options(provider, output_schema))
                 
-                response = requests.post(
-                    url, 
-                    json=payload, 
-                    timeout=self.timeout,
-                    headers={'Content-Type': 'application/json'}
-                )
+                logger.info(f"Generating response with {provider} model: {model} (attempt {attempt + 1}/{max_retries})",
+                            extra={'event': 'inference.request', 'provider': provider, 'model': model,
+                                   'attempt': attempt + 1, 'prompt_chars': len(prompt)})
+                
+                # A hedge loser may be cancelled before it even queues for a slot
+                if cancel is not None and cancel.is_set():
+                    return self._cancelled_result(provider, model, host, port)
+                with self.admission.slot(host, port, session_id, on_queued, priority=priority) as queue_wait:
+                    if cancel is not None and cancel.is_set():
+                        return self._cancelled_result(provider, model, host, port)
+                    start_time = time.time()
+                    response = requests.post(
+                        url, 
+                        json=payload, 
+                        timeout=self.timeout,
+                        headers={'Content-Type': 'application/json'},
+                        stream=incremental
+                    )
+                    attach = getattr(cancel, 'attach', None)
+                    if attach is not None and not attach(response):
+                        return self._cancelled_result(provider, model, host, port)
+                    data = None
+                    if incremental and response.status_code == 200:
+                        # Read inside the slot: the backend is busy until the stream ends
+                        data = self._collect_stream(response, provider, messages is not None,
+                                                    on_first_token, cancel)
+                        if data is None:
+                            return self._cancelled_result(provider, model, host, port)
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    if data is None:
+                        data = response.json()
+                    elapsed = time.time() - start_time
                     if provider == "Ollama":
-                        response_text = data.get('response', 'No response generated')
+                        if messages is not None:
+                            response_text = data.get('message', {}).get('content', 'No response generated')
+                        else:
+                            response_text = data.get('response', 'No response generated')
                         # Extract token information if available
                         eval_count = data.get('eval_count', 0)
                         prompt_eval_count = data.get('prompt_eval_count', 0)
                         total_tokens = eval_count + prompt_eval_count
+                        # Ollama reports its own timings (ns): TTFT is model load plus prompt evaluation
+                        ttft = None
+                        if 'prompt_eval_duration' in data:
+                            ttft = (data.get('load_duration', 0) + data['prompt_eval_duration']) / 1e9
+                        self._record_success(provider, model, elapsed, eval_count,
+                                             data.get('eval_duration', 0) / 1e9, ttft)
                     else:  # LM Studio
                         response_text = data.get('choices', [{}])[0].get('message', {}).get('content', 'No response generated')
                         # Extract token information if available
                         usage = data.get('usage', {})
                         total_tokens = usage.get('total_tokens', 0)
+                        eval_count = usage.get('completion_tokens', 0)
+                        prompt_eval_count = usage.get('prompt_tokens', 0)
+                        self._record_success(provider, model, elapsed, eval_count)
                     
-                    logger.info(f"Response generated successfully (length: {len(response_text)} characters)")
-                    return {
+                    logger.info(f"Response generated by {model} in {elapsed:.2f}s",
+                                extra={'event': 'inference.response', 'provider': provider, 'model': model,
+                                       'response_chars': len(response_text), 'eval_count': eval_count})
+                    result = {
                         'response': response_text,
                         'tokens': total_tokens,
-                        'eval_count': eval_count if provider == "Ollama" else usage.get('completion_tokens', 0),
-                        'prompt_tokens': prompt_eval_count if provider == "Ollama" else usage.get('prompt_tokens', 0)
+                        'eval_count': eval_count,
+                        'prompt_tokens': prompt_eval_count,
+                        'inference_time': elapsed,
+                        'queue_wait': queue_wait,
+                        'num_ctx': num_ctx,
+                        'ctx_reload': context_info['reload'],
+                        'context_trimmed': context_info['overflow']
                     }
+                    if output_schema is not None:
+                        try:
+                            result['structured'] = parse_json_response(response_text)
+                        except ValueError as e:
+                            result['structured_error'] = f"Response is not valid JSON: {e}"
+                    if use_cache and not context_info['overflow']:
+                        self._cache_store(prompt, response_text, cache_scope, model, system_prompt,
+                                          result['inference_time'], cache_vector, cache_embedder)
+                    return result
                 else:
-                    error_msg = f"API request failed with status {response.status_code}: {response.text}"
+                    error_msg = f"API request failed with status {response.status_code}: {truncate(response.text)}"
                     logger.error(error_msg)
+                    self._record_failure(provider, model, f"http_{response.status_code // 100}xx",
+                                         attempt < max_retries - 1)
                     if attempt < max_retries - 1:
                         logger.info(f"Retrying in 2 seconds... (attempt {attempt + 1}/{max_retries})")
                         time.sleep(2)
                         continue
-                    return {
-                        'response': f"Error: {error_msg}",
-                        'tokens': 0,
-                        'eval_count': 0,
-                        'prompt_tokens': 0
-                    }
+                    return self._error_result(error_msg)
                     
+            except BackendBusyError as e:
+                # Fail fast: retrying would only add to the queue we were rejected from
+                logger.warning(str(e))
+                self._record_failure(provider, model, "busy", False)
+                result = self._error_result(str(e))
+                result['busy'] = True
+                return result
             except requests.exceptions.Timeout:
                 error_msg = f"Request timed out (attempt {attempt + 1}/{max_retries}). The model might be taking too long to respond."
                 logger.error(error_msg)
+                self._record_failure(provider, model, "timeout", attempt < max_retries - 1)
                 if attempt < max_retries - 1:
                     logger.info(f"Retrying in 3 seconds...")
                     time.sleep(3)
                     continue
-                return {
-                    'response': f"Error: {error_msg}",
-                    'tokens': 0,
-                    'eval_count': 0,
-                    'prompt_tokens': 0
-                }
+                return self._error_result(error_msg)
             except requests.exceptions.ConnectionError:
                 provider_name = "Ollama" if provider == "Ollama" else "LM Studio"
                 error_msg = f"Connection error (attempt {attempt + 1}/{max_retries}). Please check if {provider_name} is running."
                 logger.error(error_msg)
+                self._record_failure(provider, model, "connection", attempt < max_retries - 1)
                 if attempt < max_retries - 1:
                     logger.info(f"Retrying in 5 seconds...")
                     time.sleep(5)
                     continue
-                return {
-                    'response': f"Error: {error_msg}",
-                    'tokens': 0,
-                    'eval_count': 0,
-                    'prompt_tokens': 0
-                }
+                return self._error_result(error_msg)
             except Exception as e:
                 error_msg = f"Unexpected error (attempt {attempt + 1}/{max_retries}): {str(e)}"
                 logger.error(error_msg)
+                self._record_failure(provider, model, "unexpected", attempt < max_retries - 1)
                 if attempt < max_retries - 1:
                     logger.info(f"Retrying in 2 seconds...")
                     time.sleep(2)
                     continue
-                return {
-                    'response': f"Error: {error_msg}",
-                    'tokens': 0,
-                    'eval_count': 0,
-                    'prompt_tokens': 0
-                }
+                return self._error_result(error_msg)
         
-            return {
-                'response': "Error: All retry attempts failed",
-                'tokens': 0,
-                'eval_count': 0,
-                'prompt_tokens': 0
-            }
+        return self._error_result("All retry attempts failed")
+    
+    def _cache_store(self, prompt: str, response_text: str, cache_scope: str, model: str, system_prompt: str,
+                     inference_time: float, vector, embedder):
+        """Cache an answer; a cache failure is logged, never turned into a retry of a good answer"""
+        try:
+            self.semantic_cache.store(prompt, response_text, cache_scope, model, system_prompt,
+                                      inference_time, vector, embedder)
+        except Exception as e:
+            logger.warning(f"Could not store the answer in the semantic cache: {e}")
+    
+    def _cancelled_result(self, provider: str, model: str, host: str, port: str) -> Dict[str, Any]:
+        """Build the result returned when a request is cancelled"""
+        logger.info(f"Request to {host}:{port} cancelled")
+        INFERENCE_REQUESTS.inc(provider=provider, model=model, outcome="cancelled")
+        result = self._error_result("Request cancelled")
+        result['cancelled'] = True
+        return result
+    
+    @staticmethod
+    def _collect_stream(response: requests.Response, provider: str, chat: bool,
+                        on_first_token: Callable[[], None] = None,
+                        cancel: threading.Event = None) -> Optional[Dict[str, Any]]:
+        """Read a streamed response into the shape of a non-streamed one, or None if cancelled"""
+        parts = []
+        final = {}
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                line = line.decode('utf-8')
+                if provider != "Ollama":
+                    if not line.startswith("data:"):
+                        continue
+                    line = line[5:].strip()
+                    if line == "[DONE]":
+                        break
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if provider == "Ollama":
+                    text = (data.get('message') or {}).get('content', '') if chat else data.get('response', '')
+                else:
+                    choices = data.get('choices') or [{}]
+                    text = choices[0].get('delta', {}).get('content') or ''
+                    if data.get('usage'):
+                        final['usage'] = data['usage']
+                if text:
+                    if not parts and on_first_token is not None:
+                        on_first_token()
+                    parts.append(text)
+                # Checked after the first token so a cancelled request still reports when it arrived
+                if cancel is not None and cancel.is_set():
+                    return None
+                if provider == "Ollama" and data.get('done', False):
+                    final = data
+                    break
+        except Exception:
+            # Aborting the response mid-read surfaces as whatever the read was doing
+            if cancel is not None and cancel.is_set():
+                return None
+            raise
+        finally:
+            response.close()
+        if cancel is not None and cancel.is_set():
+            return None
+        text = "".join(parts)
+        if provider != "Ollama":
+            final['choices'] = [{'message': {'content': text}}]
+        elif chat:
+            final['message'] = {'role': 'assistant', 'content': text}
+        else:
+            final['response'] = text
+        return final
+    
+    @staticmethod
+    def _is_single_turn(messages: List[Dict[str, str]] = None) -> bool:
+        """A cached answer is only valid when no earlier turns shaped it"""
+        if messages is None:
+            return True
+        # The pinned system prompt plus the new question; a summary or earlier turns rule it out
+        return len(messages) <= 2 and not any(m.get('role') == 'assistant' for m in messages)
+    
+    def size_context(self, host: str, port: str, model: str, prompt: str, system_prompt: str = None,
+                     messages: List[Dict[str, str]] = None, max_tokens: int = 2000) -> Dict[str, Any]:
+        """Choose a num_ctx bucket that fits the prompt plus the response"""
+        if messages is not None:
+            prompt_tokens = estimate_message_tokens(messages)
+        else:
+            prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_prompt or "")
+        return self.context_sizer.choose(host, port, model, prompt_tokens, max_tokens)
+    
+    def fit_to_context(self, prompt: str, system_prompt: str, messages: List[Dict[str, str]],
+                       num_ctx: int, max_tokens: int):
+        """Trim the input so prompt plus response fit in num_ctx"""
+        # Never let a huge max_tokens squeeze the prompt to nothing
+        prompt_budget = max(num_ctx // 2, num_ctx - max_tokens)
+        if messages is not None:
+            return prompt, self.context_sizer.fit_messages(messages, prompt_budget)
+        prompt_budget -= estimate_tokens(system_prompt or "")
+        return self.context_sizer.fit_text(prompt, prompt_budget), None
+    
+    def get_model_context_length(self, host: str, port: str, model: str, timeout: float = 10) -> Optional[int]:
+        """Get a model's maximum context length from Ollama's /api/show"""
+        url = f"http://{host}:{port}/api/show"
+        response = requests.post(url, json={"model": model}, timeout=timeout)
+        if response.status_code != 200:
+            logger.warning(f"Failed to show model {model}: {response.status_code}")
+            return None
+        model_info = response.json().get('model_info', {})
+        for key, value in model_info.items():
+            if key.endswith('.context_length'):
+                return int(value)
+        return None
     
     def chat_completion(self, 
                        messages: List[Dict[str, str]], 
@@ -232,88 +575,58 @@ class OllamaClient:
                        host: str = "localhost",
                        port: str = "11434",
                        temperature: float = 0.7,
-                       max_tokens: int = 1000) -> str:
+                       max_tokens: int = 1000,
+                       num_ctx: int = None,
+                       provider: str = "Ollama",
+                       session_id: str = None) -> Dict[str, Any]:
         """Generate a response using chat completion format"""
-        try:
-            url = f"http://{host}:{port}/api/chat"
-            
-            payload = {
-                "model": model,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "repeat_penalty": 1.1,
-                    "num_predict": max_tokens,
-                    "num_ctx": 2048
-                }
-            }
-            
-            logger.info(f"Chat completion with model: {model}")
-            logger.info(f"Messages count: {len(messages)}")
-            
-            response = requests.post(
-                url, 
-                json=payload, 
-                timeout=self.timeout,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('message', {}).get('content', 'No response generated')
-            else:
-                error_msg = f"Chat API request failed with status {response.status_code}: {response.text}"
-                logger.error(error_msg)
-                return {
-                    'response': f"Error: {error_msg}",
-                    'tokens': 0,
-                    'eval_count': 0,
-                    'prompt_tokens': 0
-                }
-                
-        except Exception as e:
-            error_msg = f"Chat completion error: {str(e)}"
-            logger.error(error_msg)
-            return {
-                'response': f"Error: {error_msg}",
-                'tokens': 0,
-                'eval_count': 0,
-                'prompt_tokens': 0,
-                'inference_time': 0
-            }
+        logger.info(f"Chat completion with model: {model}",
+                    extra={'event': 'inference.chat', 'model': model, 'messages': len(messages)})
+        
+        last_user = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), "")
+        return self.generate_response(
+            prompt=last_user,
+            model=model,
+            host=host,
+            port=port,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            provider=provider,
+            session_id=session_id,
+            messages=messages,
+            num_ctx=num_ctx
+        )
     
-    def pull_model(self, model_name: str, host: str = "localhost", port: str = "11434") -> bool:
-        """Pull a model from Ollama registry"""
-        try:
-            url = f"http://{host}:{port}/api/pull"
-            
-            payload = {
-                "name": model_name,
-                "stream": False
-            }
-            
-            logger.info(f"Pulling model: {model_name}")
-            
-            response = requests.post(
-                url, 
-                json=payload, 
-                timeout=300,  # 5 minutes timeout for model pulling
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully pulled model: {model_name}")
-                return True
-            else:
-                logger.error(f"Failed to pull model: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error pulling model: {e}")
-            return False
+    def stream_pull(self, model_name: str, host: str = "localhost", port: str = "11434",
+                    insecure: bool = False, read_timeout: float = 120.0) -> Iterator[Dict[str, Any]]:
+        """Stream the progress events of an Ollama model pull ({"status", "digest", "total", "completed"})"""
+        url = f"http://{host}:{port}/api/pull"
+        payload = {"model": model_name, "insecure": insecure, "stream": True}
+        # No total timeout: a multi-GB pull takes as long as it takes, but a stalled one fails
+        with requests.post(url, json=payload, stream=True, timeout=(10, read_timeout)) as response:
+            if response.status_code != 200:
+                try:
+                    error = response.json().get('error', response.text)
+                except ValueError:
+                    error = response.text
+                yield {'error': truncate(error), 'status_code': response.status_code}
+                return
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def pull_model(self, model_name: str, host: str = "localhost", port: str = "11434",
+                   on_progress: Callable[[Any], None] = None) -> bool:
+        """Pull a model from Ollama registry, streaming progress and resuming after interruptions"""
+        from model_pull import pull_model
+
+        logger.info(f"Pulling model: {model_name}")
+        progress = pull_model(model_name, host, port, client=self, on_progress=on_progress)
+        if progress.status == "success":
+            logger.info(f"Successfully pulled model: {model_name}")
+            return True
+        logger.error(f"Failed to pull model {model_name}: {progress.error}")
+        return False
     
     def get_model_info(self, model_name: str, host: str = "localhost", port: str = "11434") -> Dict[str, Any]:
         """Get information about a specific model"""
@@ -336,20 +649,42 @@ class OllamaClient:
             logger.error(f"Error checking model availability: {e}")
             return False
     
-    def get_health_status(self, host: str = "localhost", port: str = "11434") -> Dict[str, Any]:
-        """Get Ollama health status"""
+    def list_running_models(self, host: str = "localhost", port: str = "11434", timeout: float = 5) -> List[Dict[str, Any]]:
+        """List models currently loaded in Ollama memory"""
         try:
-            url = f"http://{host}:{port}/api/tags"
-            response = requests.get(url, timeout=5)
+            url = f"http://{host}:{port}/api/ps"
+            response = requests.get(url, timeout=timeout)
+            
+            if response.status_code == 200:
+                return response.json().get('models', [])
+            else:
+                logger.error(f"Failed to list running models: {response.status_code}")
+                return []
+        except Exception as e:
+            logger.error(f"Error listing running models: {e}")
+            return []
+    
+    def get_health_status(self, host: str = "localhost", port: str = "11434",
+                          provider: str = "Ollama", timeout: float = 5) -> Dict[str, Any]:
+        """Get Ollama or LM Studio health status"""
+        try:
+            if provider == "Ollama":
+                url = f"http://{host}:{port}/api/tags"
+            else:  # LM Studio
+                url = f"http://{host}:{port}/v1/models"
+            response = requests.get(url, timeout=timeout)
             
             if response.status_code == 200:
                 data = response.json()
-                models = data.get('models', [])
+                if provider == "Ollama":
+                    models = [model['name'] for model in data.get('models', [])]
+                else:  # LM Studio
+                    models = [model['id'] for model in data.get('data', [])]
                 
                 return {
                     'status': 'healthy',
                     'models_count': len(models),
-                    'models': [model['name'] for model in models],
+                    'models': models,
                     'response_time': response.elapsed.total_seconds()
                 }
             else:
@@ -372,51 +707,145 @@ class OllamaClient:
                        host: str = "localhost",
                        port: str = "11434",
                        temperature: float = 0.7,
-                       max_tokens: int = 1000):
-        """Stream response from Ollama API"""
+                       max_tokens: int = 1000,
+                       session_id: str = None,
+                       num_ctx: int = None,
+                       provider: str = "Ollama",
+                       output_schema: Dict[str, Any] = None,
+                       priority: str = "interactive",
+                       messages: List[Dict[str, str]] = None):
+        """Stream a response from Ollama (NDJSON) or LM Studio (server-sent events)
+
+        When `messages` is given it is sent as the full multi-turn conversation,
+        as in generate_response.
+        """
         try:
-            url = f"http://{host}:{port}/api/generate"
-            
-            # Prepare the full prompt
-            full_prompt = prompt
-            if system_prompt:
-                full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
-            
-            payload = {
-                "model": model,
-                "prompt": full_prompt,
-                "stream": True,
-                "options": {
+            if provider == "Ollama":
+                url = f"http://{host}:{port}/api/generate" if messages is None else f"http://{host}:{port}/api/chat"
+                
+                if num_ctx is None:
+                    context_info = self.size_context(host, port, model, prompt, system_prompt, messages, max_tokens)
+                    num_ctx = context_info['num_ctx']
+                    if context_info['overflow']:
+                        prompt, messages = self.fit_to_context(prompt, system_prompt, messages, num_ctx, max_tokens)
+                
+                # Prepare the full prompt
+                full_prompt = prompt
+                if system_prompt:
+                    full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
+                
+                payload = {
+                    "model": model,
+                    "stream": True,
+                    **self.residency.keep_alive_fields(host, port, model),
+                    "options": {
+                        "temperature": temperature,
+                        "top_p": 0.9,
+                        "top_k": 40,
+                        "repeat_penalty": 1.1,
+                        "num_predict": max_tokens,
+                        "num_ctx": num_ctx
+                    }
+                }
+                if messages is None:
+                    payload["prompt"] = full_prompt
+                else:
+                    payload["messages"] = messages
+            else:  # LM Studio
+                url = f"http://{host}:{port}/v1/chat/completions"
+                chat_messages = messages
+                if chat_messages is None:
+                    chat_messages = []
+                    if system_prompt:
+                        chat_messages.append({"role": "system", "content": system_prompt})
+                    chat_messages.append({"role": "user", "content": prompt})
+                payload = {
+                    "model": model,
+                    "messages": chat_messages,
+                    "stream": True,
                     "temperature": temperature,
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "repeat_penalty": 1.1,
-                    "num_predict": max_tokens,
-                    "num_ctx": 2048
+                    "max_tokens": max_tokens,
+                    "top_p": 0.9
                 }
-            }
+            if output_schema is not None:
+                payload.update(request_options(provider, output_schema))
             
-            response = requests.post(
-                url, 
-                json=payload, 
-                timeout=self.timeout,
-                headers={'Content-Type': 'application/json'},
-                stream=True
-            )
-            
-            if response.status_code == 200:
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line.decode('utf-8'))
-                            if 'response' in data:
-                                yield data['response']
-                            if data.get('done', False):
+            with self.admission.slot(host, port, session_id, priority=priority):
+                start_time = time.time()
+                response = requests.post(
+                    url, 
+                    json=payload, 
+                    timeout=self.timeout,
+                    headers={'Content-Type': 'application/json'},
+                    stream=True
+                )
+                
+                if response.status_code == 200:
+                    ttft = None
+                    eval_count = 0
+                    eval_seconds = None
+                    chunks = 0
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        line = line.decode('utf-8')
+                        if provider != "Ollama":
+                            # Server-sent events: "data: {...}" lines ending with "data: [DONE]"
+                            if not line.startswith("data:"):
+                                continue
+                            line = line[5:].strip()
+                            if line == "[DONE]":
                                 break
+                        try:
+                            data = json.loads(line)
                         except json.JSONDecodeError:
                             continue
-            else:
-                yield f"Error: HTTP {response.status_code} - {response.text}"
+                        if provider == "Ollama":
+                            if messages is None:
+                                text = data.get('response', '')
+                            else:
+                                text = (data.get('message') or {}).get('content', '')
+                            if data.get('done', False):
+                                eval_count = data.get('eval_count', 0)
+                                eval_seconds = data.get('eval_duration', 0) / 1e9
+                        else:
+                            choices = data.get('choices') or [{}]
+                            text = choices[0].get('delta', {}).get('content') or ''
+                            if data.get('usage'):
+                                eval_count = data['usage'].get('completion_tokens', 0)
+                        if text:
+                            if ttft is None:
+                                ttft = time.time() - start_time
+                            chunks += 1
+                            yield text
+                        if provider == "Ollama" and data.get('done', False):
+                            break
+                    self._record_success(provider, model, time.time() - start_time, eval_count or chunks,
+                                         eval_seconds, ttft)
+                else:
+                    self._record_failure(provider, model, f"http_{response.status_code // 100}xx", False)
+                    yield f"Error: HTTP {response.status_code} - {truncate(response.text)}"
                 
         except Exception as e:
+            self._record_failure(provider, model, self._error_type(e), False)
             yield f"Error: {str(e)}"
+    
+    def stream_records(self, prompt: str, output_schema: Dict[str, Any],
+                       parser: IncrementalJSONParser = None, **kwargs):
+        """Stream a structured response, yielding each record (e.g. one triaged alert) as soon as it is complete
+
+        Takes the same keyword arguments as stream_response. A failed request,
+        including one that fails after some records, ends with a single
+        {'error': ...} dict. Pass `parser` to read the whole answer afterwards
+        (parser.buffer, parser.close()).
+        """
+        if parser is None:
+            parser = IncrementalJSONParser(records_key(output_schema))
+        for chunk in self.stream_response(prompt, output_schema=output_schema, **kwargs):
+            if chunk.startswith("Error:"):
+                yield {'error': chunk[len("Error:"):].strip()}
+                return
+            for record in parser.feed(chunk):
+                yield record
+
+get_tracer().instrument(OllamaClient, "model")
@@ -0,0 +1,147 @@
+"""
+Prompt Registry for Trend Cybertron App
+Loads use cases, system prompts and test prompts from a data file into an
+immutable, indexed registry that reloads itself when the file changes
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts", "use_cases.json"
+)
+
+class UseCase(NamedTuple):
+    """A single use case as loaded from the prompt pack"""
+    key: str
+    tab_name: Optional[str]
+    category: str
+    system_prompt: str
+    system_prompt_hash: str
+    test_prompts: Tuple[str, ...]
+    test_prompt_hashes: Tuple[str, ...]
+    metadata: Any
+
+def content_hash(text: str) -> str:
+    """Return a short, stable content hash for a prompt"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+class RegistrySnapshot:
+    """Immutable, indexed view of one version of the prompt pack"""
+
+    def __init__(self, use_cases: List[UseCase], version: Any, mtime: float, path: str):
+        self.version = version
+        self.mtime = mtime
+        self.path = path
+        self.use_cases = tuple(use_cases)
+        self.by_key = MappingProxyType({uc.key: uc for uc in self.use_cases})
+        self.by_tab = MappingProxyType({uc.tab_name: uc for uc in self.use_cases if uc.tab_name})
+        self.tab_names = tuple(uc.tab_name for uc in self.use_cases if uc.tab_name)
+        self.by_hash = MappingProxyType({uc.system_prompt_hash: uc for uc in self.use_cases})
+        self.pack_hash = content_hash("".join(uc.system_prompt_hash for uc in self.use_cases))
+
+class PromptRegistry:
+    def __init__(self, path: str = None, check_interval: float = 1.0):
+        """Initialize the registry and load the prompt pack"""
+        self.path = path or os.environ.get("TREND_CYBERTRON_PROMPTS_PATH", DEFAULT_REGISTRY_PATH)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._snapshot = self._load()
+
+    def _load(self) -> RegistrySnapshot:
+        """Parse the prompt pack file into a snapshot"""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        use_cases = []
+        seen = set()
+        for entry in data.get("use_cases", []):
+            key = entry["key"]
+            if key in seen:
+                raise ValueError(f"Duplicate use case key in prompt pack: {key}")
+            seen.add(key)
+
+            system_prompt = entry["system_prompt"]
+            test_prompts = tuple(entry.get("test_prompts", []))
+            extra = {k: v for k, v in entry.items()
+                     if k not in ("key", "tab_name", "category", "system_prompt", "test_prompts")}
+            use_cases.append(UseCase(
+                key=key,
+                tab_name=entry.get("tab_name"),
+                category=entry.get("category", "general"),
+                system_prompt=system_prompt,
+                system_prompt_hash=content_hash(system_prompt),
+                test_prompts=test_prompts,
+                test_prompt_hashes=tuple(content_hash(p) for p in test_prompts),
+                metadata=MappingProxyType(extra)
+            ))
+
+        logger.info(f"Loaded {len(use_cases)} use cases from {self.path}")
+        return RegistrySnapshot(use_cases, data.get("version"), mtime, self.path)
+
+    def reload_if_changed(self) -> bool:
+        """Reload the prompt pack if the file's mtime changed; returns True on reload"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            logger.error(f"Prompt pack not accessible: {e}")
+            return False
+
+        if mtime == self._snapshot.mtime:
+            return False
+
+        with self._lock:
+            if mtime == self._snapshot.mtime:
+                return False
+            try:
+                self._snapshot = self._load()
+                return True
+            except Exception as e:
+                # Keep serving the last good snapshot if the new file is broken
+                logger.error(f"Failed to reload prompt pack, keeping previous version: {e}")
+                self._snapshot = RegistrySnapshot(
+                    list(self._snapshot.use_cases), self._snapshot.version, mtime, self.path
+                )
+                return False
+
+    def snapshot(self) -> RegistrySnapshot:
+        """Get the current snapshot, checking for file changes at most once per interval"""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.reload_if_changed()
+        return self._snapshot
+
+    def get(self, key: str) -> Optional[UseCase]:
+        """Get a use case by key"""
+        return self.snapshot().by_key.get(key)
+
+    def get_by_tab(self, tab_name: str) -> Optional[UseCase]:
+        """Get a use case by its tab name"""
+        return self.snapshot().by_tab.get(tab_name)
+
+    def tab_names(self) -> Tuple[str, ...]:
+        """Get the tab names in display order"""
+        return self.snapshot().tab_names
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+def get_default_registry() -> PromptRegistry:
+    """Get the process-wide registry, loading it on first use"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = PromptRegistry()
+    return _default_registry
@@ -0,0 +1,256 @@
+"""
+Semantic Cache for Trend Cybertron App
+Serves answers for near-duplicate prompts from a vector index keyed by
+(tab, model, system prompt hash) instead of calling the model again
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+from embeddings import HashingEmbedder
+from metrics import get_registry
+from prompt_registry import content_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get("TREND_CYBERTRON_SEMANTIC_CACHE_DIR", "database/semantic_cache")
+DEFAULT_THRESHOLD = 0.92
+
+CACHE_LOOKUPS = get_registry().counter(
+    "trendcybertron_semantic_cache_lookups_total", "Semantic cache lookups by result", ("result",))
+CACHE_LATENCY_SAVED = get_registry().counter(
+    "trendcybertron_semantic_cache_saved_seconds_total", "Inference time avoided by semantic cache hits")
+
+class _NamespaceIndex:
+    def __init__(self, capacity: int):
+        """Vectors and entries for one (tab, model, system prompt) namespace"""
+        self.capacity = capacity
+        self.vectors = None
+        self.entries: List[Dict[str, Any]] = []
+        self.dirty = False
+
+    def search(self, vector: np.ndarray) -> Tuple[int, float]:
+        """Index and cosine similarity of the closest entry"""
+        if not self.entries:
+            return -1, 0.0
+        scores = self.vectors[:len(self.entries)] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def add(self, vector: np.ndarray, entry: Dict[str, Any]) -> int:
+        """Insert an entry, evicting the least recently used one when full"""
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        if len(self.entries) < self.capacity:
+            slot = len(self.entries)
+            self.entries.append(entry)
+        else:
+            slot = min(range(len(self.entries)), key=lambda i: self.entries[i]['last_used'])
+            self.entries[slot] = entry
+        self.vectors[slot] = vector
+        self.dirty = True
+        return slot
+
+class SemanticCache:
+    def __init__(self,
+                 embedder,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = 500,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 save_interval: float = 30.0):
+        """Initialize the semantic cache"""
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.save_interval = save_interval
+        self._indexes: Dict[str, _NamespaceIndex] = {}
+        self._lock = threading.Lock()
+        self._last_save = time.time()
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'errors': 0,
+            'stores': 0,
+            'evictions': 0,
+            'latency_saved_seconds': 0.0,
+            'embed_seconds': 0.0
+        }
+
+    def set_embedder(self, embedder):
+        """Switch the default embedder; vectors from different embedders live in separate namespaces"""
+        self.embedder = embedder
+
+    def namespace(self, tab_name: str, model: str, system_prompt: str, embedder=None) -> str:
+        """Cache namespace: answers are only reused for the same embedder, tab, model and system prompt"""
+        embedder = embedder or self.embedder
+        key = f"{embedder.name}\x00{tab_name}\x00{model}\x00{content_hash(system_prompt or '')}"
+        return content_hash(key)
+
+    def _index(self, namespace: str) -> _NamespaceIndex:
+        """Get a namespace index, loading it from disk on first use"""
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = _NamespaceIndex(self.max_entries)
+            self._load(namespace, index)
+            self._indexes[namespace] = index
+        return index
+
+    def _embed(self, text: str, embedder) -> Optional[np.ndarray]:
+        """Embed one prompt; None when the embedder is unavailable"""
+        start_time = time.time()
+        try:
+            vector = embedder.embed([text])[0]
+        except Exception as e:
+            self.stats['errors'] += 1
+            CACHE_LOOKUPS.inc(result="error")
+            logger.warning(f"Semantic cache embedding failed, bypassing cache: {e}")
+            return None
+        finally:
+            self.stats['embed_seconds'] += time.time() - start_time
+        return vector
+
+    def lookup(self, prompt: str, tab_name: str, model: str, system_prompt: str = None, embedder=None,
+               threshold: float = None) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Find a cached answer for a similar prompt; returns (hit, embedding) so a miss can be stored without re-embedding
+
+        `embedder` and `threshold` override the cache defaults for this call (e.g. one session's settings);
+        store the miss with the same embedder.
+        """
+        embedder = embedder or self.embedder
+        threshold = self.threshold if threshold is None else threshold
+        vector = self._embed(prompt, embedder)
+        if vector is None:
+            return None, None
+
+        namespace = self.namespace(tab_name, model, system_prompt, embedder)
+        with self._lock:
+            self.stats['lookups'] += 1
+            index = self._index(namespace)
+            slot, similarity = index.search(vector)
+            if slot < 0 or similarity < threshold:
+                self.stats['misses'] += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None, vector
+            entry = index.entries[slot]
+            entry['last_used'] = time.time()
+            entry['hits'] += 1
+            index.dirty = True
+            self.stats['hits'] += 1
+            self.stats['latency_saved_seconds'] += entry['inference_time']
+            CACHE_LOOKUPS.inc(result="hit")
+            CACHE_LATENCY_SAVED.inc(entry['inference_time'])
+            return {
+                'response': entry['response'],
+                'cached_prompt': entry['prompt'],
+                'similarity': similarity,
+                'latency_saved': entry['inference_time']
+            }, vector
+
+    def store(self, prompt: str, response: str, tab_name: str, model: str,
+              system_prompt: str = None, inference_time: float = 0.0, vector: np.ndarray = None, embedder=None):
+        """Cache an answer (`vector` must come from `embedder`, e.g. the one returned by lookup)"""
+        embedder = embedder or self.embedder
+        if vector is None:
+            vector = self._embed(prompt, embedder)
+            if vector is None:
+                return
+        namespace = self.namespace(tab_name, model, system_prompt, embedder)
+        now = time.time()
+        with self._lock:
+            index = self._index(namespace)
+            if len(index.entries) >= index.capacity:
+                self.stats['evictions'] += 1
+            index.add(vector, {
+                'prompt': prompt,
+                'response': response,
+                'tab_name': tab_name,
+                'model': model,
+                'inference_time': inference_time,
+                'created': now,
+                'last_used': now,
+                'hits': 0
+            })
+            self.stats['stores'] += 1
+            should_save = now - self._last_save >= self.save_interval
+            if should_save:
+                self._last_save = now
+        if should_save:
+            threading.Thread(target=self.save, name="semantic-cache-save", daemon=True).start()
+
+    def _paths(self, namespace: str) -> Tuple[str, str]:
+        """Vector and entry file paths for a namespace"""
+        base = os.path.join(self.cache_dir, namespace)
+        return base + ".npy", base + ".json"
+
+    def _load(self, namespace: str, index: _NamespaceIndex):
+        """Load a persisted namespace index if it exists"""
+        vectors_path, entries_path = self._paths(namespace)
+        if not (os.path.exists(vectors_path) and os.path.exists(entries_path)):
+            return
+        try:
+            with open(entries_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            vectors = np.load(vectors_path)
+            index.vectors = np.zeros((index.capacity, vectors.shape[1]), dtype=np.float32)
+            count = min(len(entries), len(vectors), index.capacity)
+            index.vectors[:count] = vectors[:count]
+            index.entries = entries[:count]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable semantic cache namespace {namespace}: {e}")
+
+    def save(self):
+        """Persist namespaces that changed since the last save"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            dirty = [(ns, idx.vectors[:len(idx.entries)].copy(), list(idx.entries))
+                     for ns, idx in self._indexes.items() if idx.dirty and idx.vectors is not None]
+            for ns, idx in self._indexes.items():
+                idx.dirty = False
+        for namespace, vectors, entries in dirty:
+            vectors_path, entries_path = self._paths(namespace)
+            # Write to temp files first so a crash never leaves a half-written index
+            np.save(vectors_path + ".tmp.npy", vectors)
+            with open(entries_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(vectors_path + ".tmp.npy", vectors_path)
+            os.replace(entries_path + ".tmp", entries_path)
+
+    def clear(self):
+        """Drop every cached answer, in memory and on disk"""
+        with self._lock:
+            self._indexes = {}
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".npy", ".json")):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate and latency saved"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = sum(len(idx.entries) for idx in self._indexes.values())
+            stats['namespaces'] = len(self._indexes)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else 0.0
+        return stats
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the process-wide semantic cache (uses the local hashing embedder until one is set)"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = SemanticCache(HashingEmbedder())
+                atexit.register(_default_cache.save)
+    return _default_cache
@@ -0,0 +1,239 @@
+"""
+Structured Output for Trend Cybertron App
+JSON schemas for use cases whose answers feed automation (alert priorities,
+IOC lists, CREM findings), request options that make Ollama and LM Studio
+follow them, and an incremental parser that yields each record of a streamed
+JSON answer as soon as its closing brace arrives
+"""
+
+import json
+import re
+from typing import Dict, List, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_LEVELS = ["Critical", "High", "Medium", "Low"]
+
+ALERT_PRIORITY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "alerts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "alert_id": {"type": "string"},
+                    "priority": {"type": "string", "enum": PRIORITY_LEVELS},
+                    "reasoning": {"type": "string"},
+                    "recommended_actions": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["alert_id", "priority", "reasoning", "recommended_actions"]
+            }
+        }
+    },
+    "required": ["alerts"]
+}
+
+IOC_LIST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "iocs": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["ip", "domain", "url", "hash", "email", "file", "registry", "other"]},
+                    "value": {"type": "string"},
+                    "context": {"type": "string"},
+                    "confidence": {"type": "string", "enum": ["High", "Medium", "Low"]}
+                },
+                "required": ["type", "value", "context", "confidence"]
+            }
+        }
+    },
+    "required": ["iocs"]
+}
+
+CREM_FINDINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "asset": {"type": "string"},
+                    "finding": {"type": "string"},
+                    "severity": {"type": "string", "enum": PRIORITY_LEVELS},
+                    "risk_score": {"type": "number"},
+                    "remediation": {"type": "string"}
+                },
+                "required": ["asset", "finding", "severity", "risk_score", "remediation"]
+            }
+        }
+    },
+    "required": ["findings"]
+}
+
+SCHEMAS = {
+    'alert_priority': ALERT_PRIORITY_SCHEMA,
+    'ioc_list': IOC_LIST_SCHEMA,
+    'crem_findings': CREM_FINDINGS_SCHEMA
+}
+
+# Use cases with a structured answer; CREM use cases share the findings schema
+USE_CASE_SCHEMAS = {
+    'alert_prioritization': 'alert_priority',
+    'threat_intelligence': 'ioc_list',
+    'osint_reporting': 'ioc_list',
+    'incident_summarization': 'ioc_list'
+}
+
+def schema_name_for_use_case(use_case_key: str) -> Optional[str]:
+    """Name of the schema used for a use case, if it has one"""
+    if use_case_key in USE_CASE_SCHEMAS:
+        return USE_CASE_SCHEMAS[use_case_key]
+    if use_case_key and use_case_key.startswith("crem_"):
+        return 'crem_findings'
+    return None
+
+def get_schema(name: str) -> Dict[str, Any]:
+    """Schema by name"""
+    if name not in SCHEMAS:
+        raise ValueError(f"Unknown output schema {name}; use one of {', '.join(SCHEMAS)}")
+    return SCHEMAS[name]
+
+def schema_instructions(schema: Dict[str, Any]) -> str:
+    """System prompt suffix; models follow a schema more closely when it is also spelled out"""
+    return ("\n\nRespond only with a JSON document that matches this JSON schema, with no markdown or other text:\n"
+            + json.dumps(schema, separators=(",", ":")))
+
+def request_options(provider: str, schema: Dict[str, Any], name: str = "response") -> Dict[str, Any]:
+    """Payload fields that constrain the backend's output to the schema"""
+    if provider == "Ollama":
+        return {"format": schema}
+    return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}}
+
+def records_key(schema: Dict[str, Any]) -> Optional[str]:
+    """Property holding the record array (e.g. "alerts"), or None for a top-level array"""
+    if schema.get("type") == "array":
+        return None
+    for key, spec in schema.get("properties", {}).items():
+        if spec.get("type") == "array":
+            return key
+    return None
+
+def parse_json_response(text: str) -> Any:
+    """Parse a JSON answer, tolerating markdown fences and surrounding prose"""
+    text = (text or "").strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+        if start < 0:
+            raise
+        return json.JSONDecoder().raw_decode(text[start:])[0]
+
+def example_document(schema: Dict[str, Any], items: int = 3, _index: int = 0) -> Any:
+    """A document that satisfies the schema (used by the mock server and in docs)"""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][_index % len(schema["enum"])]
+    if kind == "object":
+        return {key: example_document(spec, items, _index) for key, spec in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_document(schema.get("items", {}), items, i) for i in range(items)]
+    if kind in ("number", "integer"):
+        return round(9.5 - _index * 1.5, 1) if kind == "number" else _index + 1
+    if kind == "boolean":
+        return _index % 2 == 0
+    return f"example {_index + 1}"
+
+class IncrementalJSONParser:
+    def __init__(self, records_path: Optional[str] = None):
+        """Parse a JSON document fed in chunks, emitting the elements of its record array as they complete
+
+        The record array is the top-level array, or the value of `records_path`
+        in the top-level object (the first array property when not given).
+        Records are the objects or arrays in it; scalars are left to close().
+        """
+        self.records_path = records_path
+        self.buffer = ""
+        self._position = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._last_key = None
+        self._key_start = None
+        self._records_depth = None
+        self._record_start = None
+        self.records_emitted = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add text; returns the records completed by it"""
+        self.buffer += chunk
+        records = []
+        buffer = self.buffer
+        for position in range(self._position, len(buffer)):
+            char = buffer[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._last_key = buffer[self._key_start:position]
+                        self._key_start = None
+                continue
+            if char == '"':
+                self._in_string = True
+                # Strings directly inside the top-level object are candidate keys
+                if len(self._stack) == 1 and self._stack[0] == "{" and self._records_depth is None:
+                    self._key_start = position + 1
+            elif char in "{[":
+                self._stack.append(char)
+                depth = len(self._stack)
+                if char == "[" and self._records_depth is None and self._is_records_array(depth):
+                    self._records_depth = depth
+                elif self._records_depth is not None and depth == self._records_depth + 1:
+                    self._record_start = position
+            elif char in "}]":
+                depth = len(self._stack)
+                if self._stack:
+                    self._stack.pop()
+                if self._record_start is not None and depth == self._records_depth + 1:
+                    records.append(self._decode(buffer[self._record_start:position + 1]))
+                    self._record_start = None
+                elif self._records_depth is not None and depth == self._records_depth:
+                    self._records_depth = -1  # the record array has closed
+        self._position = len(buffer)
+        records = [record for record in records if record is not None]
+        self.records_emitted += len(records)
+        return records
+
+    def _is_records_array(self, depth: int) -> bool:
+        """Whether the array just opened is the record array"""
+        if depth == 1:
+            return True
+        if depth == 2 and self._stack[0] == "{":
+            return self.records_path is None or self._last_key == self.records_path
+        return False
+
+    @staticmethod
+    def _decode(text: str) -> Any:
+        """Decode one record"""
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.debug(f"Skipping undecodable streamed record: {e}")
+            return None
+
+    def close(self) -> Any:
+        """Parse the whole document once the stream has ended"""
+        return parse_json_response(self.buffer)
@@ -0,0 +1,221 @@
+"""
+Tracing for Trend Cybertron App
+Opt-in span tracing of Streamlit reruns: render methods, model calls and
+database calls are timed into a span tree per rerun, exportable as JSON or
+Chrome trace, with optional cProfile on a sample of reruns. When tracing is
+off every instrumented call costs one attribute check
+"""
+
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    __slots__ = ("name", "category", "start", "end", "thread_id", "attributes", "children")
+
+    def __init__(self, name: str, category: str = "app", attributes: Dict[str, Any] = None):
+        """A timed operation with child spans"""
+        self.name = name
+        self.category = category
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end (up to now while open)"""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    @property
+    def self_time(self) -> float:
+        """Duration not covered by child spans"""
+        return max(0.0, self.duration - sum(child.duration for child in self.children))
+
+    def walk(self, depth: int = 0):
+        """Yield (depth, span) for this span and its descendants"""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self, origin: float = None) -> Dict[str, Any]:
+        """Nested JSON-friendly representation (times in ms relative to the trace start)"""
+        origin = self.start if origin is None else origin
+        return {
+            'name': self.name,
+            'category': self.category,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'children': [child.to_dict(origin) for child in self.children]
+        }
+
+class Trace:
+    def __init__(self, name: str):
+        """Span tree for one rerun"""
+        self.name = name
+        self.wall_time = time.time()
+        self.root = Span(name, "rerun")
+        self.profile: Optional[str] = None
+
+    def breakdown(self) -> Dict[str, float]:
+        """Self time in seconds per category"""
+        totals: Dict[str, float] = {}
+        for _, span in self.root.walk():
+            totals[span.category] = totals.get(span.category, 0.0) + span.self_time
+        return totals
+
+    def slowest(self, limit: int = 15) -> List[Dict[str, Any]]:
+        """Slowest spans below the root"""
+        spans = [span for _, span in self.root.walk() if span is not self.root]
+        spans.sort(key=lambda span: span.duration, reverse=True)
+        return [{'span': span.name, 'category': span.category, 'ms': round(span.duration * 1000, 1),
+                 'self_ms': round(span.self_time * 1000, 1)} for span in spans[:limit]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON export"""
+        return {'name': self.name, 'wall_time': self.wall_time, 'root': self.root.to_dict(), 'profile': self.profile}
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Chrome trace event format (open in chrome://tracing or Perfetto)"""
+        origin = self.root.start
+        events = [{
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': round((span.start - origin) * 1e6, 1),
+            'dur': round(span.duration * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': span.thread_id,
+            'args': {key: str(value) for key, value in span.attributes.items()}
+        } for _, span in self.root.walk()]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+class Tracer:
+    def __init__(self, enabled: bool = False, profile_rate: float = 0.0):
+        """Initialize the tracer"""
+        # Process defaults; trace() can override both per call (e.g. per Streamlit session)
+        self.enabled = enabled
+        # Fraction of traced reruns that also run under cProfile
+        self.profile_rate = profile_rate
+        self._local = threading.local()
+
+    def _stack(self) -> Optional[List[Span]]:
+        """Open spans of the trace active on this thread (None when no trace is active)"""
+        return getattr(self._local, "stack", None)
+
+    @contextmanager
+    def trace(self, name: str = "rerun", enabled: bool = None, profile_rate: float = None):
+        """Trace a block (a Streamlit rerun); yields the Trace, or None when tracing is off"""
+        enabled = self.enabled if enabled is None else enabled
+        profile_rate = self.profile_rate if profile_rate is None else profile_rate
+        if not enabled or self._stack() is not None:
+            yield None
+            return
+        trace = Trace(name)
+        self._local.stack = [trace.root]
+        profiler = None
+        if profile_rate and random.random() < profile_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active in this process
+                profiler = None
+        try:
+            yield trace
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+                trace.profile = output.getvalue()
+            trace.root.end = time.perf_counter()
+            self._local.stack = None
+
+    @contextmanager
+    def span(self, name: str, category: str = "app", **attributes):
+        """Time a block as a child of the current span (no-op outside a trace)"""
+        stack = self._stack()
+        if stack is None:
+            yield None
+            return
+        span = Span(name, category, attributes)
+        stack[-1].children.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+
+    def wrap(self, func: Callable, name: str, category: str) -> Callable:
+        """Wrap a function so calls become spans while tracing"""
+        tracer = self
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                stack = tracer._stack()
+                if stack is None:
+                    yield from func(*args, **kwargs)
+                    return
+                # The consumer runs between yields, so the span is attached but never made current
+                span = Span(name, category)
+                stack[-1].children.append(span)
+                try:
+                    yield from func(*args, **kwargs)
+                finally:
+                    span.end = time.perf_counter()
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Only a trace on this thread turns spans on, whatever the process default says
+            stack = tracer._stack()
+            if stack is None:
+                return func(*args, **kwargs)
+            span = Span(name, category)
+            stack[-1].children.append(span)
+            stack.append(span)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                span.end = time.perf_counter()
+                stack.pop()
+        return wrapper
+
+    def instrument(self, cls, category: str, prefix: str = None):
+        """Wrap a class's public methods (or those starting with prefix) in spans"""
+        for attr, value in list(vars(cls).items()):
+            if not inspect.isfunction(value) or getattr(value, "_traced", False):
+                continue
+            if prefix is not None and not attr.startswith(prefix):
+                continue
+            if prefix is None and attr.startswith("_"):
+                continue
+            wrapped = self.wrap(value, f"{cls.__name__}.{attr}", category)
+            wrapped._traced = True
+            setattr(cls, attr, wrapped)
+        return cls
+
+_default_tracer = Tracer(
+    enabled=os.environ.get("TREND_CYBERTRON_TRACE", "").lower() in ("1", "true", "yes"),
+    profile_rate=float(os.environ.get("TREND_CYBERTRON_PROFILE_RATE", "0") or 0)
+)
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer"""
+    return _default_tracer
@@ -0,0 +1,308 @@
+"""
+Vector Index for Trend Cybertron App
+Embedding index over stored conversations for similar-case retrieval: vectors
+live in a memory-mapped float32 file with a row-id mapping and are searched
+with a single vectorized matrix-vector product
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+from embeddings import HashingEmbedder, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.environ.get("TREND_CYBERTRON_VECTOR_INDEX_DIR", "database/vector_index")
+# 128 dimensions keeps a brute-force scan of a million rows under ~60 ms on one CPU core
+DEFAULT_DIM = 128
+RESPONSE_CHARS = 1000
+
+def conversation_text(user_message: str, assistant_response: str) -> str:
+    """Text embedded for a conversation: the question plus the start of the answer"""
+    return f"{user_message}\n{(assistant_response or '')[:RESPONSE_CHARS]}"
+
+class ConversationIndex:
+    def __init__(self,
+                 index_dir: str = DEFAULT_INDEX_DIR,
+                 embedder=None,
+                 dim: int = DEFAULT_DIM,
+                 initial_capacity: int = 1024):
+        """Initialize the conversation index"""
+        self.index_dir = index_dir
+        self.dim = dim
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._projections: Dict[int, np.ndarray] = {}
+        self._queue = queue.Queue()
+        self._worker = None
+        self._synced = False
+        self.count = 0
+        self.capacity = 0
+        self.last_id = 0
+        self.tab_names: List[str] = []
+        self.vectors = None
+        self.row_ids = None
+        self.tab_codes = None
+        self.query_times = []
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._open()
+
+    def _path(self, name: str) -> str:
+        """Path of an index file"""
+        return os.path.join(self.index_dir, name)
+
+    def _open(self):
+        """Open the index files, starting fresh if they belong to another embedder or dimension"""
+        meta = {}
+        if os.path.exists(self._path("meta.json")):
+            try:
+                with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                logger.warning(f"Unreadable vector index metadata, rebuilding: {e}")
+        if meta.get('embedder') != self.embedder.name or meta.get('dim') != self.dim:
+            if meta:
+                logger.info(f"Vector index was built with {meta.get('embedder')}/{meta.get('dim')}, rebuilding")
+            meta = {}
+        self.count = meta.get('count', 0)
+        self.last_id = meta.get('last_id', 0)
+        self.tab_names = meta.get('tab_names', [])
+        self._map(max(meta.get('capacity', 0), self.initial_capacity), reset=not meta)
+
+    def _map(self, capacity: int, reset: bool = False):
+        """(Re)create the memory maps at a given row capacity; existing rows are kept"""
+        self.vectors = self.row_ids = self.tab_codes = None
+        for name, width in (("vectors.f32", self.dim * 4), ("row_ids.i64", 8), ("tab_codes.i16", 2)):
+            path = self._path(name)
+            with open(path, "r+b" if os.path.exists(path) and not reset else "w+b") as f:
+                f.truncate(capacity * width)
+        self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.row_ids = np.memmap(self._path("row_ids.i64"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self.tab_codes = np.memmap(self._path("tab_codes.i16"), dtype=np.int16, mode="r+", shape=(capacity,))
+        self.capacity = capacity
+
+    def _ensure_capacity(self, rows: int):
+        """Grow the files (doubling) so `rows` more rows fit"""
+        needed = self.count + rows
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.flush()
+        self._map(capacity)
+
+    def _write_meta(self):
+        """Persist counters; written after the rows so a crash never exposes unwritten rows"""
+        meta = {
+            'embedder': self.embedder.name,
+            'dim': self.dim,
+            'count': self.count,
+            'capacity': self.capacity,
+            'last_id': self.last_id,
+            'tab_names': self.tab_names
+        }
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def flush(self):
+        """Flush memory maps and metadata to disk"""
+        with self._lock:
+            for array in (self.vectors, self.row_ids, self.tab_codes):
+                if array is not None:
+                    array.flush()
+            self._write_meta()
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Bring embeddings to the index dimension with a fixed random projection (cosine is roughly preserved)"""
+        vectors = normalize_rows(vectors)
+        source_dim = vectors.shape[1]
+        if source_dim == self.dim:
+            return vectors
+        projection = self._projections.get(source_dim)
+        if projection is None:
+            rng = np.random.default_rng(source_dim)
+            projection = rng.standard_normal((source_dim, self.dim)).astype(np.float32)
+            self._projections[source_dim] = projection
+        return normalize_rows(vectors @ projection)
+
+    def _tab_code(self, tab_name: str) -> int:
+        """Small integer code for a tab name"""
+        if tab_name not in self.tab_names:
+            self.tab_names.append(tab_name)
+        return self.tab_names.index(tab_name)
+
+    def add_vectors(self, conversation_ids: List[int], tab_names: List[str], vectors: np.ndarray):
+        """Append a batch of already-embedded conversations (ids already indexed are skipped)"""
+        vectors = self.project(vectors)
+        with self._lock:
+            # Ids only grow, so anything at or below last_id is already in the index
+            new = [i for i, conversation_id in enumerate(conversation_ids) if conversation_id > self.last_id]
+            if not new:
+                return
+            if len(new) < len(conversation_ids):
+                conversation_ids = [conversation_ids[i] for i in new]
+                tab_names = [tab_names[i] for i in new]
+                vectors = vectors[new]
+            self._ensure_capacity(len(conversation_ids))
+            start, end = self.count, self.count + len(conversation_ids)
+            self.vectors[start:end] = vectors
+            self.row_ids[start:end] = conversation_ids
+            self.tab_codes[start:end] = [self._tab_code(t) for t in tab_names]
+            self.count = end
+            self.last_id = max(self.last_id, int(max(conversation_ids)))
+            self.flush()
+
+    def add(self, conversation_id: int, tab_name: str, user_message: str, assistant_response: str):
+        """Embed and index one conversation"""
+        vector = self.embedder.embed([conversation_text(user_message, assistant_response)])
+        self.add_vectors([conversation_id], [tab_name], vector)
+
+    def enqueue(self, conversation_id: int, tab_name: str, user_message: str, assistant_response: str):
+        """Index a conversation in the background so saving it is not slowed by embedding"""
+        self._submit(self.add, conversation_id, tab_name, user_message, assistant_response)
+
+    def sync_async(self, db_manager):
+        """Catch up with the database once per process, on the indexing thread"""
+        with self._lock:
+            if self._synced:
+                return
+            self._synced = True
+        self._submit(self.sync, db_manager)
+
+    def _submit(self, func, *args):
+        """Queue work for the background indexing thread"""
+        self._queue.put((func, args))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="vector-index", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """Background indexing loop"""
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.warning(f"Vector index {func.__name__} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def sync(self, db_manager, batch_size: int = 256) -> int:
+        """Index conversations saved since the last indexed id (startup catch-up and rebuilds)"""
+        indexed = 0
+        while True:
+            rows = db_manager.get_conversations_after(self.last_id, batch_size)
+            if not rows:
+                return indexed
+            texts = [conversation_text(r['user_message'], r['assistant_response']) for r in rows]
+            self.add_vectors([r['id'] for r in rows], [r['tab_name'] for r in rows], self.embedder.embed(texts))
+            indexed += len(rows)
+
+    def search_vector(self, vector: np.ndarray, k: int = 5, tab_name: str = None) -> List[Tuple[int, float]]:
+        """Top-k conversation ids by cosine similarity to a query vector"""
+        query = self.project(vector)[0]
+        with self._lock:
+            count = self.count
+            if count == 0:
+                return []
+            scores = self.vectors[:count] @ query
+            if tab_name is not None:
+                if tab_name not in self.tab_names:
+                    return []
+                scores[self.tab_codes[:count] != self.tab_names.index(tab_name)] = -np.inf
+            k = min(k, count)
+            top = np.argpartition(scores, count - k)[count - k:]
+            top = top[np.argsort(scores[top])[::-1]]
+            return [(int(self.row_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def search(self, query: str, k: int = 5, tab_name: str = None) -> List[Tuple[int, float]]:
+        """Top-k conversation ids most similar to a query text"""
+        start_time = time.perf_counter()
+        results = self.search_vector(self.embedder.embed([query]), k, tab_name)
+        self.query_times = (self.query_times + [time.perf_counter() - start_time])[-100:]
+        return results
+
+    def clear(self):
+        """Drop every indexed conversation"""
+        with self._lock:
+            self.count = 0
+            self.last_id = 0
+            self.tab_names = []
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index size and query latency"""
+        times = sorted(self.query_times)
+        return {
+            'rows': self.count,
+            'dim': self.dim,
+            'embedder': self.embedder.name,
+            'size_mb': round(self.capacity * (self.dim * 4 + 10) / 1024 ** 2, 1),
+            'pending': self._queue.qsize(),
+            'queries': len(times),
+            'p50_query_ms': round(times[len(times) // 2] * 1000, 2) if times else 0.0,
+            'max_query_ms': round(times[-1] * 1000, 2) if times else 0.0
+        }
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_conversation_index() -> ConversationIndex:
+    """Get the process-wide conversation index"""
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                _default_index = ConversationIndex()
+    return _default_index
+
+def benchmark(rows: int = 1_000_000, dim: int = DEFAULT_DIM, queries: int = 50, k: int = 5):
+    """Build a synthetic index and report query latency"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = ConversationIndex(index_dir=index_dir, dim=dim, initial_capacity=rows)
+        rng = np.random.default_rng(0)
+        batch = 100_000
+        start_time = time.perf_counter()
+        for offset in range(0, rows, batch):
+            size = min(batch, rows - offset)
+            vectors = rng.standard_normal((size, dim), dtype=np.float32)
+            index.add_vectors(list(range(offset + 1, offset + size + 1)), ["Benchmark"] * size, vectors)
+        build_time = time.perf_counter() - start_time
+
+        query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+        index.search_vector(query_vectors[:1], k)  # warm the page cache
+        timings = []
+        for vector in query_vectors:
+            start_time = time.perf_counter()
+            index.search_vector(vector[None, :], k)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        timings.sort()
+
+        print(f"rows={rows:,} dim={dim} build={build_time:.1f}s ({rows / build_time:,.0f} rows/s)")
+        print(f"query p50={timings[len(timings) // 2]:.1f} ms  p95={timings[int(len(timings) * 0.95)]:.1f} ms  "
+              f"max={timings[-1]:.1f} ms  (k={k}, {queries} queries)")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the conversation vector index")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.rows, args.dim, args.queries, args.k)
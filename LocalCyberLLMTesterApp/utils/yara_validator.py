@@ -0,0 +1,345 @@
+"""
+YARA Validator for Trend Cybertron App
+Checks the rules in YARA Patterns answers before anyone deploys them: rule
+blocks are pulled out of the response, compiled and scanned over a local
+sample corpus in a process pool, with compile errors, match counts, per-rule
+scan time and static performance warnings reported and cached by rule hash
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+import logging
+
+try:
+    import yara
+except ImportError:
+    yara = None
+
+logger = logging.getLogger(__name__)
+
+USE_CASE_KEY = "yara_patterns"
+DEFAULT_CORPUS_DIR = os.environ.get("TREND_CYBERTRON_YARA_CORPUS", "database/yara_corpus")
+DEFAULT_CACHE_DIR = os.environ.get("TREND_CYBERTRON_YARA_CACHE_DIR", "database/yara_cache")
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+DEFAULT_TIMEOUT = 10
+MAX_CORPUS_FILES = 500
+MAX_CORPUS_BYTES = 256 * 1024 * 1024
+# A rule is flagged as slow above this scan cost, or at 5x the median of the rules checked with it
+SLOW_MS_PER_MB = 50.0
+SLOW_MEDIAN_FACTOR = 5.0
+MIN_ATOM_BYTES = 3
+MAX_JUMP = 64
+
+_RULE_START = re.compile(r"^[ \t]*(?:(?:private|global)\s+)*rule\s+(\w+)\b[^{]*\{", re.MULTILINE)
+_IMPORT = re.compile(r'^[ \t]*import\s+"[^"]+"', re.MULTILINE)
+_TEXT_STRING = re.compile(r'(\$\w*)\s*=\s*"((?:[^"\\\n]|\\.)*)"([^\n]*)')
+_HEX_STRING = re.compile(r"(\$\w*)\s*=\s*\{([^}]*)\}")
+_REGEX_STRING = re.compile(r"(\$\w*)\s*=\s*/((?:[^/\\\n]|\\.)+)/([is]*)")
+_HEX_JUMP = re.compile(r"\[\s*(\d*)\s*-\s*(\d*)\s*\]")
+_UNBOUNDED_REGEX = re.compile(r"(?<!\\)(?:\.\*|\.\+|\.\{\d+,\}|\[\^[^\]]*\][*+])")
+_REGEX_LITERAL = re.compile(r"(?:[A-Za-z0-9_-]|\\x[0-9a-fA-F]{2}|\\[./\\-]){3,}")
+_REGEX_CLASS_OR_COUNT = re.compile(r"\[(?:\\.|[^\]])*\]|\{[\d,]*\}")
+_FILESIZE_LOOP = re.compile(r"\bfor\s+(?:any|all|\d+)\s+\w+\s+in\s*\(\s*0\s*\.\.\s*filesize", re.IGNORECASE)
+
+class RuleBlock(NamedTuple):
+    """One rule pulled out of a response"""
+    name: str
+    source: str
+    imports: Tuple[str, ...]
+
+def _rule_end(text: str, start: int) -> int:
+    """Index just past the brace closing the rule body that opens at `start`"""
+    depth = 0
+    position = start
+    while position < len(text):
+        char = text[position]
+        if char == '"':
+            # Skip text strings, which may contain braces
+            position += 1
+            while position < len(text) and text[position] != '"':
+                position += 2 if text[position] == "\\" else 1
+        elif char == "/" and text[position:position + 2] == "//":
+            newline = text.find("\n", position)
+            position = len(text) if newline < 0 else newline
+            continue
+        elif char == "/" and text[position:position + 2] == "/*":
+            close = text.find("*/", position + 2)
+            position = len(text) if close < 0 else close + 2
+            continue
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return -1
+
+def extract_rules(text: str) -> List[RuleBlock]:
+    """Rule blocks in a response (fenced or inline), with the imports stated in the response"""
+    imports = tuple(dict.fromkeys(match.group().strip() for match in _IMPORT.finditer(text or "")))
+    rules = []
+    seen = set()
+    for match in _RULE_START.finditer(text or ""):
+        end = _rule_end(text, match.end() - 1)
+        if end < 0:
+            continue
+        source = text[match.start():end].strip()
+        if source in seen:
+            continue
+        seen.add(source)
+        rules.append(RuleBlock(match.group(1), source, imports))
+    return rules
+
+def compile_unit(rule: RuleBlock, rules: List[RuleBlock]) -> str:
+    """Source compiled for a rule: its imports, any rules its condition references, then the rule"""
+    condition = rule.source.split("condition:", 1)[-1]
+    referenced = [other.source for other in rules
+                  if other.name != rule.name and re.search(rf"\b{re.escape(other.name)}\b", condition)]
+    return "\n\n".join(list(rule.imports) + referenced + [rule.source]) + "\n"
+
+def rule_hash(source: str) -> str:
+    """Content hash of a compile unit"""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+def performance_warnings(source: str) -> List[str]:
+    """Static checks for patterns that make scanners slow"""
+    warnings = []
+    for name, value, modifiers in _TEXT_STRING.findall(source):
+        length = len(value.encode("utf-8").decode("unicode_escape", errors="ignore"))
+        if length < MIN_ATOM_BYTES:
+            warnings.append(f"{name}: {length}-byte string gives a weak atom and many candidate matches")
+    for name, body in _HEX_STRING.findall(source):
+        tokens = re.findall(r"\[[^\]]*\]|\?\?|[0-9A-Fa-f?]{2}|[()|]", body)
+        fixed_run = longest_run = 0
+        for token in tokens:
+            fixed_run = fixed_run + 1 if re.fullmatch(r"[0-9A-Fa-f]{2}", token) else 0
+            longest_run = max(longest_run, fixed_run)
+        if tokens and "?" in tokens[0]:
+            warnings.append(f"{name}: hex string starts with a wildcard")
+        if longest_run < 3:
+            warnings.append(f"{name}: hex string has no run of 3 fixed bytes to anchor on")
+        for low, high in _HEX_JUMP.findall(body):
+            if not high or int(high) - int(low or 0) > MAX_JUMP:
+                warnings.append(f"{name}: jump [{low}-{high}] spans more than {MAX_JUMP} bytes")
+    for name, pattern, _ in _REGEX_STRING.findall(source):
+        if _UNBOUNDED_REGEX.search(pattern):
+            warnings.append(f"{name}: regex has an unbounded quantifier (.*, .+ or [^...]*)")
+        # Character classes and repeat counts are not literals
+        if not _REGEX_LITERAL.search(_REGEX_CLASS_OR_COUNT.sub(" ", pattern)):
+            warnings.append(f"{name}: regex has no literal of 3+ bytes to anchor on")
+    if _FILESIZE_LOOP.search(source):
+        warnings.append("condition loops over every offset up to filesize")
+    return warnings
+
+def corpus_files(corpus_dir: str, max_files: int = MAX_CORPUS_FILES,
+                 max_bytes: int = MAX_CORPUS_BYTES) -> List[Tuple[str, int, float]]:
+    """(path, size, mtime) of the sample files to scan, in a stable order"""
+    files = []
+    total = 0
+    if not corpus_dir or not os.path.isdir(corpus_dir):
+        return files
+    for root, dirs, names in os.walk(corpus_dir):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if len(files) >= max_files or total + stat.st_size > max_bytes:
+                return files
+            files.append((path, stat.st_size, stat.st_mtime))
+            total += stat.st_size
+    return files
+
+def _check_rule(source: str, paths: List[str], timeout: int) -> Dict[str, Any]:
+    """Compile one rule and scan the corpus with it (runs in a worker process)"""
+    result = {
+        'compiled': False,
+        'error': None,
+        'compiler_warnings': [],
+        'compile_ms': 0.0,
+        'scan_ms': 0.0,
+        'files_scanned': 0,
+        'bytes_scanned': 0,
+        'matches': 0,
+        'matched_files': [],
+        'timeouts': 0
+    }
+    start_time = time.perf_counter()
+    try:
+        rules = yara.compile(source=source)
+    except yara.Error as e:
+        result['error'] = str(e)
+        return result
+    result['compile_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+    result['compiled'] = True
+    result['compiler_warnings'] = list(getattr(rules, "warnings", []) or [])
+
+    scan_seconds = 0.0
+    for path in paths:
+        start_time = time.perf_counter()
+        try:
+            matches = rules.match(path, timeout=timeout)
+        except yara.TimeoutError:
+            result['timeouts'] += 1
+            matches = []
+        except yara.Error as e:
+            logger.debug(f"Could not scan {path}: {e}")
+            continue
+        scan_seconds += time.perf_counter() - start_time
+        result['files_scanned'] += 1
+        result['bytes_scanned'] += os.path.getsize(path)
+        if matches:
+            result['matches'] += 1
+            if len(result['matched_files']) < 10:
+                result['matched_files'].append(path)
+    result['scan_ms'] = round(scan_seconds * 1000, 2)
+    return result
+
+class YaraValidator:
+    def __init__(self,
+                 corpus_dir: str = DEFAULT_CORPUS_DIR,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 workers: int = DEFAULT_WORKERS,
+                 timeout: int = DEFAULT_TIMEOUT,
+                 slow_ms_per_mb: float = SLOW_MS_PER_MB):
+        """Initialize the YARA validator"""
+        self.corpus_dir = corpus_dir
+        self.cache_dir = cache_dir
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.slow_ms_per_mb = slow_ms_per_mb
+
+    @staticmethod
+    def available() -> bool:
+        """Whether yara-python is installed (without it only static checks run)"""
+        return yara is not None
+
+    def _cache_path(self, key: str) -> str:
+        """Path of a cached result"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for a rule and corpus, if any"""
+        try:
+            with open(self._cache_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cached(self, key: str, result: Dict[str, Any]):
+        """Persist a result atomically"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = self._cache_path(key) + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(temporary_path, self._cache_path(key))
+
+    def validate(self, text: str) -> Dict[str, Any]:
+        """Validate every rule in a response; returns per-rule results and a summary"""
+        start_time = time.perf_counter()
+        rules = extract_rules(text)
+        files = corpus_files(self.corpus_dir)
+        paths = [path for path, _, _ in files]
+        # Results depend on the corpus as much as on the rule
+        corpus_key = rule_hash(json.dumps([files, self.timeout]))
+
+        results = []
+        pending = []
+        for rule in rules:
+            source = compile_unit(rule, rules)
+            result = {
+                'rule': rule.name,
+                'hash': rule_hash(source),
+                'performance_warnings': performance_warnings(rule.source),
+                'cached': False
+            }
+            results.append(result)
+            if yara is None:
+                result.update(compiled=None, error="yara-python is not installed; only static checks ran")
+                continue
+            cached = self._load_cached(f"{result['hash']}-{corpus_key}")
+            if cached is not None:
+                result.update(cached, cached=True)
+            else:
+                pending.append((result, source))
+
+        if pending:
+            if self.workers == 1 or len(pending) == 1:
+                outcomes = [_check_rule(source, paths, self.timeout) for _, source in pending]
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                    outcomes = list(pool.map(_check_rule, [source for _, source in pending],
+                                             [paths] * len(pending), [self.timeout] * len(pending)))
+            for (result, _), outcome in zip(pending, outcomes):
+                result.update(outcome)
+                self._save_cached(f"{result['hash']}-{corpus_key}", outcome)
+
+        self._flag_slow(results)
+        return {
+            'rules': results,
+            'yara_available': yara is not None,
+            'corpus_dir': self.corpus_dir,
+            'corpus_files': len(files),
+            'corpus_mb': round(sum(size for _, size, _ in files) / (1024 * 1024), 2),
+            'compile_errors': sum(1 for r in results if r.get('compiled') is False),
+            'slow_rules': sum(1 for r in results if r.get('slow')),
+            'elapsed': round(time.perf_counter() - start_time, 3)
+        }
+
+    def _flag_slow(self, results: List[Dict[str, Any]]):
+        """Mark rules whose scan cost is high in absolute terms or against the others checked"""
+        costs = []
+        for result in results:
+            megabytes = result.get('bytes_scanned', 0) / (1024 * 1024)
+            result['ms_per_mb'] = round(result.get('scan_ms', 0.0) / megabytes, 2) if megabytes else None
+            if result['ms_per_mb'] is not None:
+                costs.append(result['ms_per_mb'])
+        median = statistics.median(costs) if len(costs) >= 3 else None
+        for result in results:
+            cost = result['ms_per_mb']
+            result['slow'] = bool(result.get('timeouts')) or (cost is not None and (
+                cost > self.slow_ms_per_mb or (median is not None and median > 0 and cost > median * SLOW_MEDIAN_FACTOR)))
+
+def main():
+    """Command line entry point: validate the rules in a file"""
+    from log_setup import configure_logging
+    configure_logging("WARNING")
+    parser = argparse.ArgumentParser(description="Compile YARA rules and time them over a sample corpus")
+    parser.add_argument("rules", help="File with YARA rules (a .yar file or a saved model answer)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="Directory of sample files to scan")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Scan timeout per file in seconds")
+    args = parser.parse_args()
+
+    with open(args.rules, encoding="utf-8", errors="replace") as f:
+        report = YaraValidator(args.corpus, workers=args.workers, timeout=args.timeout).validate(f.read())
+    if not report['yara_available']:
+        print("yara-python is not installed (pip install yara-python); only static checks ran")
+    print(f"{len(report['rules'])} rules, {report['corpus_files']} corpus files ({report['corpus_mb']} MB), "
+          f"{report['compile_errors']} compile errors, {report['slow_rules']} slow rules in {report['elapsed']}s")
+    for result in report['rules']:
+        status = {True: "ok", False: "ERROR", None: "not compiled"}[result.get('compiled')]
+        line = f"{result['rule']}: {status}"
+        if result.get('compiled'):
+            line += (f", {result['matches']}/{result['files_scanned']} files matched, "
+                     f"{result['scan_ms']} ms scan ({result['ms_per_mb']} ms/MB)")
+        if result.get('slow'):
+            line += " [SLOW]"
+        print(line)
+        if result.get('compiled') is False:
+            print(f"    {result['error']}")
+        for warning in result.get('compiler_warnings', []) + result['performance_warnings']:
+            print(f"    warning: {warning}")
+
+if __name__ == "__main__":
+    main()